@@ -14,9 +14,15 @@ class DataFlowsConfig(PluginConfig):
     default_settings = {
         "top_level_menu": True,
         "application_custom_field": None,
+        "policy_cache_timeout": 3600,
     }
     min_version = "4.6.0"
     max_version = "4.6.99"
 
+    def ready(self):
+        super().ready()
+
+        from . import signals  # noqa: F401
+
 
 config = DataFlowsConfig
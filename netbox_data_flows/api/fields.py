@@ -0,0 +1,52 @@
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from rest_framework.exceptions import ValidationError
+
+from netbox.api.fields import IntegerRangeSerializer, SerializedPKRelatedField
+
+from netbox_data_flows.utils.ports import get_port_bounds, parse_port_range
+
+__all__ = (
+    "PortRangeSerializer",
+    "PrefetchedPKRelatedField",
+)
+
+
+class PortRangeSerializer(IntegerRangeSerializer):
+    """
+    A range of ports, represented as [first, last].
+
+    A single port (80) or a "first-last" string is accepted as well.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, (bool, float)):
+            raise ValidationError(f"Invalid port range: {data}")
+
+        try:
+            first, last = parse_port_range(data)
+        except ValueError as e:
+            raise ValidationError(str(e))
+
+        return NumericRange(first, last + 1, bounds="[)")
+
+    def to_representation(self, instance):
+        return list(get_port_bounds(instance))
+
+
+class PrefetchedPKRelatedField(SerializedPKRelatedField):
+    """
+    A SerializedPKRelatedField looking the objects up in the "prefetched_objects" of the serializer context first.
+
+    The context maps the related model to its objects by primary key, so that a whole batch can be resolved in
+    one query rather than one query per object. The other objects are looked up in the database as usual.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get("prefetched_objects", {}).get(self.queryset.model)
+        if prefetched is not None and not isinstance(data, bool):
+            try:
+                return prefetched[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+
+        return super().to_internal_value(data)
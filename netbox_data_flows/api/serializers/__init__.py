@@ -3,3 +3,4 @@ from .applications import *
 from .dataflows import *
 from .groups import *
 from .objectaliases import *
+from .reachability import *
@@ -1,11 +1,12 @@
 from rest_framework import serializers
 
-from netbox.api.fields import ChoiceField, SerializedPKRelatedField
+from netbox.api.fields import ChoiceField
 from netbox.api.serializers import NestedTagSerializer, PrimaryModelSerializer
 
 from tenancy.api.serializers import TenantSerializer
 
 from netbox_data_flows import choices, models
+from netbox_data_flows.api.fields import PortRangeSerializer, PrefetchedPKRelatedField
 
 from .applications import ApplicationSerializer
 from .groups import DataFlowGroupSerializer
@@ -28,15 +29,17 @@ class DataFlowSerializer(PrimaryModelSerializer):
         read_only=True,
     )
     protocol = ChoiceField(choices=choices.DataFlowProtocolChoices, required=False)
+    source_ports = PortRangeSerializer(many=True, required=False, allow_null=True)
+    destination_ports = PortRangeSerializer(many=True, required=False, allow_null=True)
 
-    sources = SerializedPKRelatedField(
+    sources = PrefetchedPKRelatedField(
         queryset=models.ObjectAlias.objects.all(),
         serializer=ObjectAliasSerializer,
         nested=True,
         required=False,
         many=True,
     )
-    destinations = SerializedPKRelatedField(
+    destinations = PrefetchedPKRelatedField(
         queryset=models.ObjectAlias.objects.all(),
         serializer=ObjectAliasSerializer,
         nested=True,
@@ -44,6 +47,10 @@ class DataFlowSerializer(PrimaryModelSerializer):
         many=True,
     )
 
+    # Only the IDs of the targets, for clients selecting their fields with ?fields=
+    source_ids = serializers.PrimaryKeyRelatedField(source="sources", many=True, read_only=True)
+    destination_ids = serializers.PrimaryKeyRelatedField(source="destinations", many=True, read_only=True)
+
     inherited_tags = NestedTagSerializer(many=True, required=False, read_only=True)
 
     class Meta:
@@ -54,6 +61,7 @@ class DataFlowSerializer(PrimaryModelSerializer):
             "created",
             "custom_fields",
             "description",
+            "destination_ids",
             "destination_ports",
             "destinations",
             "display",
@@ -64,6 +72,7 @@ class DataFlowSerializer(PrimaryModelSerializer):
             "last_updated",
             "name",
             "protocol",
+            "source_ids",
             "source_ports",
             "sources",
             "status",
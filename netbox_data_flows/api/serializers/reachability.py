@@ -0,0 +1,33 @@
+from rest_framework import serializers
+
+from netbox_data_flows import choices
+from netbox_data_flows.constants import DATAFLOW_PORT_MAX, DATAFLOW_PORT_MIN, REACHABILITY_BATCH_MAX_SIZE
+
+__all__ = (
+    "ReachabilityBatchSerializer",
+    "ReachabilityQuerySerializer",
+)
+
+
+class ReachabilityQuerySerializer(serializers.Serializer):
+    """Traffic to check against the enabled data flows. The port is the destination port, or the ICMP type."""
+
+    src = serializers.IPAddressField()
+    dst = serializers.IPAddressField()
+    protocol = serializers.ChoiceField(
+        choices=[
+            (value, label)
+            for value, label in choices.DataFlowProtocolChoices.CHOICES
+            if value
+            not in (choices.DataFlowProtocolChoices.PROTOCOL_ANY, choices.DataFlowProtocolChoices.PROTOCOL_TCP_UDP)
+        ],
+        required=False,
+    )
+    port = serializers.IntegerField(min_value=DATAFLOW_PORT_MIN, max_value=DATAFLOW_PORT_MAX, required=False)
+    src_port = serializers.IntegerField(min_value=DATAFLOW_PORT_MIN, max_value=DATAFLOW_PORT_MAX, required=False)
+
+
+class ReachabilityBatchSerializer(serializers.Serializer):
+    """Connections to check against the enabled data flows, e.g. from a connection log."""
+
+    connections = ReachabilityQuerySerializer(many=True, allow_empty=False, max_length=REACHABILITY_BATCH_MAX_SIZE)
@@ -1,3 +1,5 @@
+from django.urls import path
+
 from netbox.api.routers import NetBoxRouter
 
 from . import views
@@ -13,4 +15,8 @@ router.register("dataflows", views.DataFlowViewSet)
 router.register("dataflow-groups", views.DataFlowGroupViewSet)
 router.register("objectalias", views.ObjectAliasViewSet)
 
-urlpatterns = router.urls
+urlpatterns = [
+    path("export/", views.FirewallExportView.as_view(), name="export"),
+    path("reachability/", views.ReachabilityView.as_view(), name="reachability"),
+    *router.urls,
+]
@@ -1,9 +1,23 @@
+from django.db import router, transaction
 from django.db.models import Count
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from rest_framework.routers import APIRootView
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
+from core.signals import clear_events
+from netbox.api.authentication import IsAuthenticatedOrLoginNotRequired
 from netbox.api.viewsets import NetBoxModelViewSet
+from netbox.api.viewsets.mixins import PERMISSION_DENIED_MESSAGE
+from utilities.api import get_fields_for_serializer
 
-from netbox_data_flows import filtersets, models
+from netbox_data_flows import choices, filtersets, models
+from netbox_data_flows.utils.bulk import DATAFLOW_TARGET_FIELDS, bulk_save_dataflows
+from netbox_data_flows.utils.export import export_dataflows
+from netbox_data_flows.utils.reachability import get_reachability_index
 
 from . import serializers
 
@@ -29,15 +43,162 @@ class ApplicationViewSet(NetBoxModelViewSet):
     filterset_class = filtersets.ApplicationFilterSet
 
 
-class DataFlowViewSet(NetBoxModelViewSet):
+class InheritedTagsViewSetMixin:
+    """
+    Join the nested objects and resolve the inherited tags only if the response renders them.
+
+    With `?fields=` (or `?brief=1`), the unused relations cost nothing.
+    """
+
+    select_related_fields = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = get_fields_for_serializer(self.get_serializer_class(), **self.field_kwargs)
+
+        # Join the nested objects rather than prefetching them, one query less per relation
+        if select_related := [field for field in self.select_related_fields if field in fields]:
+            queryset = queryset.select_related(*select_related)
+        if "inherited_tags" in fields:
+            queryset = queryset.prefetch_inherited_tags()
+        return queryset
+
+
+class DataFlowViewSet(InheritedTagsViewSetMixin, NetBoxModelViewSet):
+    """
+    The bulk creations and updates are validated as a whole, then written with set-based queries
+    (see bulk_save_dataflows()) rather than saved one data flow at a time.
+    """
+
     queryset = models.DataFlow.objects.all()
+    select_related_fields = ("application", "group", "owner", "tenant")
 
     serializer_class = serializers.DataFlowSerializer
     filterset_class = filtersets.DataFlowFilterSet
 
+    def _get_bulk_serializer_context(self, items):
+        """Fetch all the object aliases referenced by the items in one query, for PrefetchedPKRelatedField."""
+        pks = set()
+        for item in items:
+            for field_name in DATAFLOW_TARGET_FIELDS:
+                values = item.get(field_name) if isinstance(item, dict) else None
+                for value in values if isinstance(values, list) else ():
+                    if isinstance(value, (int, str)) and str(value).isdigit():
+                        pks.add(int(value))
+
+        aliases = models.ObjectAlias.objects.in_bulk(pks)
+        return {**self.get_serializer_context(), "prefetched_objects": {models.ObjectAlias: aliases}}
+
+    @staticmethod
+    def _split_validated_data(validated_data, dataflow=None):
+        """
+        Return the attributes of the data flow and its many-to-many relations, set separately.
+
+        The tags added or removed (add_tags and remove_tags) are applied to the current tags of the data flow,
+        prefetched, as TaggableModelSerializer does.
+        """
+        attrs = dict(validated_data)
+        attrs.pop("changelog_message", None)
+        add_tags = attrs.pop("add_tags", None)
+        remove_tags = attrs.pop("remove_tags", None)
+        related = {
+            field_name: attrs.pop(field_name) for field_name in (*DATAFLOW_TARGET_FIELDS, "tags") if field_name in attrs
+        }
+
+        if "tags" not in related and (add_tags is not None or remove_tags is not None):
+            tags = {tag.pk: tag for tag in (dataflow.tags.all() if dataflow is not None else ())}
+            tags.update((tag.pk, tag) for tag in add_tags or ())
+            for tag in remove_tags or ():
+                tags.pop(tag.pk, None)
+            related["tags"] = list(tags.values())
+
+        return attrs, related
+
+    def _bulk_save(self, dataflows, related):
+        """
+        Save the validated data flows and return their primary keys.
+
+        If any of them is outside of the permitted queryset, nothing is saved and the positions of the denied
+        data flows are returned instead.
+        """
+        using = router.db_for_write(models.DataFlow)
+        with transaction.atomic(using=using):
+            saved = bulk_save_dataflows(dataflows, related, request=self.request)
+
+            # Check that the saved data flows are permitted, like perform_create() and perform_update()
+            pks = [dataflow.pk for dataflow in saved]
+            permitted = set(self.queryset.filter(pk__in=pks).values_list("pk", flat=True))
+            if len(permitted) != len(pks):
+                transaction.set_rollback(True, using=using)
+                clear_events.send(sender=self)
+                return None, [i for i, pk in enumerate(pks) if pk not in permitted]
+
+        return pks, None
+
+    def perform_bulk_create(self, data):
+        context = self._get_bulk_serializer_context(data)
+        dataflows, related, errors = [], [], []
+        for i, item in enumerate(data):
+            if not isinstance(item, dict):
+                message = f"Invalid data. Expected a dictionary, but got {type(item).__name__}."
+                errors.append({"index": i, "errors": {api_settings.NON_FIELD_ERRORS_KEY: [message]}})
+                continue
+
+            serializer = self.get_serializer(data=item, context=context)
+            if not serializer.is_valid():
+                errors.append({"index": i, "errors": serializer.errors})
+                continue
+
+            attrs, objs = self._split_validated_data(serializer.validated_data)
+            dataflow = models.DataFlow(**attrs)
+            dataflow._changelog_message = serializer.validated_data.get("changelog_message")
+            dataflows.append(dataflow)
+            related.append(objs)
+
+        if errors:
+            return [], errors, status.HTTP_400_BAD_REQUEST
+
+        pks, denied = self._bulk_save(dataflows, related)
+        if denied:
+            errors = [{"index": i, "errors": {"__all__": [PERMISSION_DENIED_MESSAGE]}} for i in denied]
+            return [], errors, status.HTTP_403_FORBIDDEN
+
+        return pks, [], None
+
+    def perform_bulk_update(self, objects, update_data, partial):
+        # The targets and tags are prefetched for the snapshots of the change log
+        objects = list(objects.prefetch_related(*DATAFLOW_TARGET_FIELDS, "tags"))
+        context = self._get_bulk_serializer_context(update_data.values())
+        related, errors = [], []
+        for dataflow in objects:
+            dataflow.snapshot()
+            serializer = self.get_serializer(
+                dataflow, data=update_data.get(dataflow.pk), partial=partial, context=context
+            )
+            if not serializer.is_valid():
+                errors.append({"id": dataflow.pk, "errors": serializer.errors})
+                continue
+
+            attrs, objs = self._split_validated_data(serializer.validated_data, dataflow)
+            for name, value in attrs.items():
+                setattr(dataflow, name, value)
+            dataflow._changelog_message = serializer.validated_data.get("changelog_message")
+            related.append(objs)
+
+        if errors:
+            return [], errors, status.HTTP_400_BAD_REQUEST
+
+        pks, denied = self._bulk_save(objects, related)
+        if denied:
+            errors = [{"id": objects[i].pk, "errors": {"__all__": [PERMISSION_DENIED_MESSAGE]}} for i in denied]
+            return [], errors, status.HTTP_403_FORBIDDEN
 
-class DataFlowGroupViewSet(NetBoxModelViewSet):
+        return pks, [], None
+
+
+class DataFlowGroupViewSet(InheritedTagsViewSetMixin, NetBoxModelViewSet):
     queryset = models.DataFlowGroup.objects.all()
+    select_related_fields = ("application", "owner", "parent", "tenant")
 
     serializer_class = serializers.DataFlowGroupSerializer
     filterset_class = filtersets.DataFlowGroupFilterSet
@@ -48,3 +209,110 @@ class ObjectAliasViewSet(NetBoxModelViewSet):
 
     serializer_class = serializers.ObjectAliasSerializer
     filterset_class = filtersets.ObjectAliasFilterSet
+
+
+class ReachabilityView(APIView):
+    """
+    Find the enabled data flows permitting some traffic.
+
+    GET query parameters: src, dst, protocol (optional), port (optional, destination port or ICMP type)
+    and src_port (optional).
+    POST: a list of connections with the same fields, to get the IDs of the data flows permitting each one.
+    """
+
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+
+    def get_view_name(self):
+        return "Reachability"
+
+    def get(self, request):
+        query = serializers.ReachabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        dataflow_ids = get_reachability_index().lookup(
+            params["src"],
+            params["dst"],
+            protocol=params.get("protocol"),
+            port=params.get("port"),
+            source_port=params.get("src_port"),
+        )
+        # Only reveal the traffic permitted by the data flows visible to the user
+        dataflows = list(models.DataFlow.objects.restrict(request.user, "view").filter(pk__in=dataflow_ids))
+
+        return Response(
+            {
+                "allowed": bool(dataflows),
+                "dataflows": serializers.DataFlowSerializer(
+                    dataflows, many=True, nested=True, context={"request": request}
+                ).data,
+            }
+        )
+
+    def post(self, request):
+        batch = serializers.ReachabilityBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+
+        results = get_reachability_index().lookup_many(
+            (c["src"], c["dst"], c.get("protocol"), c.get("port"), c.get("src_port"))
+            for c in batch.validated_data["connections"]
+        )
+
+        # Only return the data flows visible to the user, and only reveal the traffic they permit
+        visible = set(
+            models.DataFlow.objects.restrict(request.user, "view")
+            .filter(pk__in={pk for dataflow_ids in results for pk in dataflow_ids})
+            .values_list("pk", flat=True)
+        )
+
+        return Response(
+            {
+                "results": [
+                    {
+                        "allowed": bool(dataflows),
+                        "dataflows": dataflows,
+                    }
+                    for dataflows in ([pk for pk in dataflow_ids if pk in visible] for dataflow_ids in results)
+                ]
+            }
+        )
+
+
+class FirewallExportView(APIView):
+    """
+    Stream the firewall rules of the enabled data flows.
+
+    Query parameters: output (nftables, iptables, ip6tables or json), and any filter of the data flows list.
+    """
+
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+
+    content_types = {
+        choices.FirewallExportFormatChoices.FORMAT_JSON: "application/x-ndjson",
+    }
+    extensions = {
+        choices.FirewallExportFormatChoices.FORMAT_NFTABLES: "nft",
+        choices.FirewallExportFormatChoices.FORMAT_JSON: "ndjson",
+    }
+
+    def get_view_name(self):
+        return "Firewall Export"
+
+    def get(self, request):
+        export_format = request.query_params.get("output", choices.FirewallExportFormatChoices.FORMAT_NFTABLES)
+        if export_format not in choices.FirewallExportFormatChoices.values():
+            raise ValidationError({"output": f"Invalid output format: {export_format}"})
+
+        filterset = filtersets.DataFlowFilterSet(
+            request.query_params, models.DataFlow.objects.restrict(request.user, "view")
+        )
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        response = StreamingHttpResponse(
+            export_dataflows(export_format, filterset.qs),
+            content_type=self.content_types.get(export_format, "text/plain"),
+        )
+        filename = f"dataflows.{self.extensions.get(export_format, 'rules')}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
@@ -1,11 +1,15 @@
 from utilities.choices import ChoiceSet
 
 __all__ = (
+    "DataFlowImportFormatChoices",
     "DataFlowInheritedStatusChoices",
     "DataFlowProtocolChoices",
+    "DataFlowRuleDirectionChoices",
     "DataFlowStatusChoices",
+    "FirewallExportFormatChoices",
     "ICMPv4TypeChoices",
     "ICMPv6TypeChoices",
+    "PortRangeMatchChoices",
     "TargetIsEmptyChoice",
 )
 
@@ -146,6 +150,60 @@ class DataFlowInheritedStatusChoices(DataFlowStatusChoices):
     )
 
 
+class DataFlowRuleDirectionChoices(ChoiceSet):
+    """Side of a data flow an expanded rule applies to."""
+
+    DIRECTION_SOURCE = "source"
+    DIRECTION_DESTINATION = "destination"
+
+    CHOICES = (
+        (DIRECTION_SOURCE, "Source"),
+        (DIRECTION_DESTINATION, "Destination"),
+    )
+
+
+class FirewallExportFormatChoices(ChoiceSet):
+    """Formats of the firewall rules exported from the enabled data flows."""
+
+    FORMAT_NFTABLES = "nftables"
+    FORMAT_IPTABLES = "iptables"
+    FORMAT_IP6TABLES = "ip6tables"
+    FORMAT_JSON = "json"
+
+    CHOICES = (
+        (FORMAT_NFTABLES, "nftables"),
+        (FORMAT_IPTABLES, "iptables-restore (IPv4)"),
+        (FORMAT_IP6TABLES, "ip6tables-restore (IPv6)"),
+        (FORMAT_JSON, "JSON (one data flow per line)"),
+    )
+
+
+class DataFlowImportFormatChoices(ChoiceSet):
+    """Formats of the files imported by the import_dataflows command."""
+
+    FORMAT_CSV = "csv"
+    FORMAT_JSON = "json"
+    FORMAT_YAML = "yaml"
+
+    CHOICES = (
+        (FORMAT_CSV, "CSV"),
+        (FORMAT_JSON, "JSON (a list, or one data flow per line)"),
+        (FORMAT_YAML, "YAML"),
+    )
+
+
+class PortRangeMatchChoices(ChoiceSet):
+    """How the port ranges of the filters are matched against the ports of the data flows."""
+
+    MATCH_ANY = "any"
+    MATCH_ALL = "all"
+
+    CHOICES = (
+        (MATCH_ANY, "Any port of the ranges is allowed"),
+        (MATCH_ALL, "All the ports of a range are allowed"),
+    )
+
+
 class TargetIsEmptyChoice(ChoiceSet):
     """List of statuses for null target, for forms."""
 
@@ -1,3 +1,6 @@
 # 0 must be allowed for compatibility with ICMP types
 DATAFLOW_PORT_MIN = 0
 DATAFLOW_PORT_MAX = 65535
+
+# Maximum number of connections checked by one batch reachability request
+REACHABILITY_BATCH_MAX_SIZE = 10000
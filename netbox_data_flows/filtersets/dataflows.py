@@ -1,3 +1,4 @@
+from django.contrib.postgres.lookups import DataContains, Overlap
 from django.db.models import Q
 
 from extras.filters import TagFilter, TagIDFilter
@@ -10,14 +11,18 @@ from tenancy.filtersets import TenancyFilterSet
 from virtualization.models import VirtualMachine
 
 from netbox_data_flows import choices, models
+from netbox_data_flows.utils.helpers import m2m_exists
+from netbox_data_flows.utils.ports import AllowedPorts, port_range_value
 
 from .addins import ApplicationFilterSetAddin, InheritedStatusFilterSetAddin
 from .filters import (
+    BooleanFilter,
     ChoiceFilter,
     ModelMultipleChoiceFilter,
     MultipleChoiceFilter,
     MultiValueNumberFilter,
     MultiValueNumericArrayFilter,
+    MultiValuePortRangeFilter,
 )
 
 __all__ = ("DataFlowFilterSet",)
@@ -72,6 +77,24 @@ class DataFlowFilterSet(
     destination_ports = MultiValueNumberFilter(
         method="filter_ports",
     )
+    source_port_range = MultiValuePortRangeFilter(
+        label="Source port ranges, such as 8000-9000. Data flows allowing any source port match too.",
+        method="filter_port_range",
+    )
+    destination_port_range = MultiValuePortRangeFilter(
+        label="Destination port ranges, such as 8000-9000. Data flows allowing any destination port match too.",
+        method="filter_port_range",
+    )
+    port_range_match = ChoiceFilter(
+        choices=choices.PortRangeMatchChoices,
+        label="Whether any or all the ports of the port ranges must be allowed",
+        method="filter_port_range_match",
+    )
+
+    containment = BooleanFilter(
+        label="Match the source and destination objects covered by the aliases, not only their members",
+        method="filter_containment",
+    )
 
     source_is_null = ChoiceFilter(
         choices=choices.TargetIsEmptyChoice,
@@ -173,27 +196,31 @@ class DataFlowFilterSet(
         if not value:
             return queryset
 
-        for tag in value:
-            groups = models.DataFlowGroup.objects.filter(tags=tag).get_descendants(include_self=True)
-            queryset = queryset.filter(Q(tags=tag) | Q(group__in=groups))
-
-        return queryset
+        # Perform a AND search - like regular tags
+        return queryset.filter(pk__in=models.DataFlowEffectiveTag.objects.having_all(value))
 
     # OR(source_ports) AND OR(destination_ports)
     def filter_ports(self, queryset, field_name, value):
         if not value:
             return queryset
 
-        if field_name == "source_ports":
-            field_db = "source_ports__contains"
-        else:
-            field_db = "destination_ports__contains"
-
+        # Use the same expression as the GiST indexes on the port ranges,
+        # but only match the ports listed explicitly, not "Any"
+        ports = f"_{field_name}"
         query = Q()
         for port in value:
-            query |= Q(**{field_db: [port]})
+            query |= Q(**{f"{ports}__contains": port})
 
-        return queryset.filter(query)
+        return queryset.alias(**{ports: AllowedPorts(field_name)}).filter(query, **{f"{field_name}__len__gt": 0})
+
+    def filter_port_range(self, queryset, field_name, value):
+        if value:
+            setattr(self, f"_{field_name}", value)
+        return queryset
+
+    def filter_port_range_match(self, queryset, field_name, value):
+        self._port_range_match = value
+        return queryset
 
     # OR all the targets
     def filter_target_is_null(self, queryset, field_name, value):
@@ -212,6 +239,10 @@ class DataFlowFilterSet(
 
         return queryset
 
+    def filter_containment(self, queryset, field_name, value):
+        self._containment = bool(value)
+        return queryset
+
     def filter_sources(self, queryset, field_name, value):
         self._filter_targets("_sources", field_name, value)
         return queryset
@@ -236,28 +267,43 @@ class DataFlowFilterSet(
     @property
     def qs(self):
         # OR(sources) AND OR(destinations)
+        # Each target is matched with an EXISTS predicate, so that no join
+        # can duplicate the data flows and no DISTINCT is needed.
         qs = super().qs
+        containment = getattr(self, "_containment", False)
+
+        for field_name, set_name in (("sources", "_sources"), ("destinations", "_destinations")):
+            targets = Q()
+            if hasattr(self, f"{set_name}_is_null"):
+                if getattr(self, f"{set_name}_is_null"):
+                    targets |= ~m2m_exists(self._meta.model, field_name)
+                else:
+                    targets |= m2m_exists(self._meta.model, field_name)
+            if hasattr(self, f"{set_name}_pk"):
+                targets |= m2m_exists(self._meta.model, field_name, getattr(self, f"{set_name}_pk"))
+            if hasattr(self, set_name):
+                aliases = models.ObjectAlias.objects.contains(*getattr(self, set_name), containment=containment)
+                targets |= m2m_exists(self._meta.model, field_name, aliases.values("pk"))
+
+            if targets:
+                qs = qs.filter(targets)
+
+        # The allowed ports of the data flows must overlap or contain any of the port ranges
+        if getattr(self, "_port_range_match", None) == choices.PortRangeMatchChoices.MATCH_ALL:
+            lookup = DataContains
+        else:
+            lookup = Overlap
+
+        for filter_name, field_name in (
+            ("source_port_range", "source_ports"),
+            ("destination_port_range", "destination_ports"),
+        ):
+            if not hasattr(self, f"_{filter_name}"):
+                continue
+
+            query = Q()
+            for port_range in getattr(self, f"_{filter_name}"):
+                query |= lookup(AllowedPorts(field_name), port_range_value(port_range))
+            qs = qs.filter(query)
 
-        sources = Q()
-        if hasattr(self, "_sources_is_null"):
-            if self._sources_is_null:
-                sources |= Q(sources__exact=None)
-            else:
-                sources |= ~Q(sources__exact=None)
-        if hasattr(self, "_sources_pk"):
-            sources |= Q(sources__in=self._sources_pk)
-        if hasattr(self, "_sources"):
-            sources |= Q(sources__in=models.ObjectAlias.objects.contains(*self._sources))
-
-        destinations = Q()
-        if hasattr(self, "_destinations_is_null"):
-            if self._destinations_is_null:
-                destinations |= Q(destinations__exact=None)
-            else:
-                destinations |= ~Q(destinations__exact=None)
-        if hasattr(self, "_destinations_pk"):
-            destinations |= Q(destinations__in=self._destinations_pk)
-        if hasattr(self, "_destinations"):
-            destinations |= Q(destinations__in=models.ObjectAlias.objects.contains(*self._destinations))
-
-        return qs.filter(sources).filter(destinations).distinct()
+        return qs
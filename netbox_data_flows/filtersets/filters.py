@@ -1,17 +1,25 @@
 from django.forms import IntegerField
-from django_filters import ChoiceFilter, ModelMultipleChoiceFilter, MultipleChoiceFilter
+from django_filters import BooleanFilter, ChoiceFilter, ModelMultipleChoiceFilter, MultipleChoiceFilter
 
 from utilities.filters import MultiValueNumberFilter, TreeNodeMultipleChoiceFilter, multivalue_field_factory
 
+from netbox_data_flows.forms.fields import PortRangeField
+
 __all__ = (
+    "BooleanFilter",
     "ChoiceFilter",
     "ModelMultipleChoiceFilter",
     "MultipleChoiceFilter",
     "MultiValueNumberFilter",
     "MultiValueNumericArrayFilter",
+    "MultiValuePortRangeFilter",
     "TreeNodeMultipleChoiceFilter",
 )
 
 
 class MultiValueNumericArrayFilter(MultipleChoiceFilter):
     field_class = multivalue_field_factory(IntegerField)
+
+
+class MultiValuePortRangeFilter(MultipleChoiceFilter):
+    field_class = multivalue_field_factory(PortRangeField)
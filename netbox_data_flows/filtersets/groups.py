@@ -58,19 +58,11 @@ class DataFlowGroupFilterSet(
         if not value:
             return queryset
 
-        ancestors = [getattr(dfg, "pk", dfg) for dfg in value]
-        descendants = (
-            models.DataFlowGroup.objects.filter(pk__in=ancestors).get_descendants(include_self=True).only("pk")
-        )
-        return queryset.filter(pk__in=descendants)
+        return queryset.filter(pk__in=models.DataFlowGroupClosure.objects.descendants(*value))
 
     def filter_inherited_tags(self, queryset, name, value):
         if not value:
             return queryset
 
         # Perform a AND search - like regular tags
-        # based on conjoined queries
-        for tag in value:
-            queryset = queryset.filter(tags=tag).get_descendants(include_self=True)
-
-        return queryset
+        return queryset.filter(pk__in=models.DataFlowGroupEffectiveTag.objects.having_all(value))
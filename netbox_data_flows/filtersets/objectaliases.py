@@ -10,7 +10,7 @@ from virtualization.models import VirtualMachine
 from netbox_data_flows import models
 from netbox_data_flows.utils.helpers import get_device_ipaddresses
 
-from .filters import ModelMultipleChoiceFilter
+from .filters import BooleanFilter, ModelMultipleChoiceFilter
 
 __all__ = ("ObjectAliasFilterSet",)
 
@@ -42,6 +42,10 @@ class ObjectAliasFilterSet(PrimaryModelFilterSet):
         label="Virtual Machine (any IP address) (ID)",
         method="filter_devices",
     )
+    containment = BooleanFilter(
+        label="Match the objects covered by the aliases, not only their members",
+        method="filter_containment",
+    )
 
     class Meta:
         model = models.ObjectAlias
@@ -58,6 +62,10 @@ class ObjectAliasFilterSet(PrimaryModelFilterSet):
         qs_filter = Q(name__icontains=value) | Q(description__icontains=value)
         return queryset.filter(qs_filter)
 
+    def filter_containment(self, queryset, name, value):
+        self._containment = bool(value)
+        return queryset
+
     # OR all the targets
     # First, build a list
     def filter_targets(self, queryset, name, value):
@@ -78,7 +86,7 @@ class ObjectAliasFilterSet(PrimaryModelFilterSet):
         qs = super().qs
 
         if hasattr(self, "_targets"):
-            qs = qs.contains(*self._targets)
+            qs = qs.contains(*self._targets, containment=getattr(self, "_containment", False))
 
         return qs
 
@@ -86,8 +94,8 @@ class ObjectAliasFilterSet(PrimaryModelFilterSet):
         if not value:
             return queryset
 
-        ip_addresses = get_device_ipaddresses(*value)
-        if not ip_addresses.exists():
+        ip_addresses = get_device_ipaddresses(*value, memoize=True)
+        if not ip_addresses:
             return queryset.none()
 
         return self.filter_targets(queryset, name, ip_addresses)
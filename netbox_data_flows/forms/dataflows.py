@@ -1,7 +1,7 @@
 from django import forms
 
 from netbox.forms import PrimaryModelBulkEditForm, PrimaryModelFilterSetForm, PrimaryModelForm, PrimaryModelImportForm
-from utilities.forms import add_blank_choice
+from utilities.forms import BOOLEAN_WITH_BLANK_CHOICES, add_blank_choice
 from utilities.forms.fields import (
     CSVChoiceField,
     CSVModelChoiceField,
@@ -20,8 +20,9 @@ from virtualization.models import VirtualMachine
 
 from netbox_data_flows import choices, models
 from netbox_data_flows.constants import DATAFLOW_PORT_MAX, DATAFLOW_PORT_MIN
+from netbox_data_flows.utils.ports import iter_ports, normalize_port_ranges
 
-from .fields import IcmpTypeChoiceField, NumericArrayField, PlaceholderModelMultipleChoiceField
+from .fields import IcmpTypeChoiceField, PlaceholderModelMultipleChoiceField, PortRangeArrayField, PortRangeField
 
 __all__ = (
     "DataFlowForm",
@@ -78,13 +79,11 @@ class DataFlowForm(TenancyForm, PrimaryModelForm):
         required=True,
     )
 
-    source_ports = NumericArrayField(
-        base_field=forms.IntegerField(min_value=DATAFLOW_PORT_MIN, max_value=DATAFLOW_PORT_MAX),
+    source_ports = PortRangeArrayField(
         help_text="Comma-separated list of one or more port numbers. A range may be specified using a hyphen.",
         required=False,
     )
-    destination_ports = NumericArrayField(
-        base_field=forms.IntegerField(min_value=DATAFLOW_PORT_MIN, max_value=DATAFLOW_PORT_MAX),
+    destination_ports = PortRangeArrayField(
         help_text="Comma-separated list of one or more port numbers. A range may be specified using a hyphen.",
         required=False,
     )
@@ -158,9 +157,9 @@ class DataFlowForm(TenancyForm, PrimaryModelForm):
                 initial = dict()
 
             if instance.protocol == choices.DataFlowProtocolChoices.PROTOCOL_ICMPv4:
-                initial["icmpv4_types"] = instance.destination_ports or []
+                initial["icmpv4_types"] = list(iter_ports(instance.destination_ports))
             elif instance.protocol == choices.DataFlowProtocolChoices.PROTOCOL_ICMPv6:
-                initial["icmpv6_types"] = instance.destination_ports or []
+                initial["icmpv6_types"] = list(iter_ports(instance.destination_ports))
 
         super().__init__(instance=instance, initial=initial, *args, **kwargs)
 
@@ -176,10 +175,10 @@ class DataFlowForm(TenancyForm, PrimaryModelForm):
 
         if protocol == choices.DataFlowProtocolChoices.PROTOCOL_ICMPv4:
             source_ports = []
-            destination_ports = cleaned_data.get("icmpv4_types")
+            destination_ports = normalize_port_ranges(cleaned_data.get("icmpv4_types"))
         elif protocol == choices.DataFlowProtocolChoices.PROTOCOL_ICMPv6:
             source_ports = []
-            destination_ports = cleaned_data.get("icmpv6_types")
+            destination_ports = normalize_port_ranges(cleaned_data.get("icmpv6_types"))
         else:
             source_ports = cleaned_data.get("source_ports")
             destination_ports = cleaned_data.get("destination_ports")
@@ -222,16 +221,14 @@ class DataFlowBulkEditForm(PrimaryModelBulkEditForm):
         choices=add_blank_choice(choices.DataFlowProtocolChoices),
         required=False,
     )
-    source_ports = NumericArrayField(
-        base_field=forms.IntegerField(min_value=DATAFLOW_PORT_MIN, max_value=DATAFLOW_PORT_MAX),
+    source_ports = PortRangeArrayField(
         help_text=(
             "Comma-separated list of one or more port numbers (leave empty for ICMP types). "
             "A range may be specified using a hyphen."
         ),
         required=False,
     )
-    destination_ports = NumericArrayField(
-        base_field=forms.IntegerField(min_value=DATAFLOW_PORT_MIN, max_value=DATAFLOW_PORT_MAX),
+    destination_ports = PortRangeArrayField(
         help_text=(
             "Comma-separated list of one or more port numbers or ICMP type numerical values. "
             "A range may be specified using a hyphen."
@@ -309,16 +306,14 @@ class DataFlowImportForm(PrimaryModelImportForm):
         required=True,
         help_text="Protocol",
     )
-    source_ports = NumericArrayField(
-        base_field=forms.IntegerField(min_value=DATAFLOW_PORT_MIN, max_value=DATAFLOW_PORT_MAX),
+    source_ports = PortRangeArrayField(
         help_text=(
             "Comma-separated list of one or more port numbers (leave empty for ICMP types). "
             "A range may be specified using a hyphen."
         ),
         required=False,
     )
-    destination_ports = NumericArrayField(
-        base_field=forms.IntegerField(min_value=DATAFLOW_PORT_MIN, max_value=DATAFLOW_PORT_MAX),
+    destination_ports = PortRangeArrayField(
         help_text=(
             "Comma-separated list of one or more port numbers or ICMP type numerical values. "
             "A range may be specified using a hyphen."
@@ -420,6 +415,26 @@ class DataFlowFilterForm(TenancyFilterForm, PrimaryModelFilterSetForm):
         required=False,
         help_text="Use the API or repeat the URL parameter to select several",
     )
+    source_port_range = PortRangeField(
+        required=False,
+        help_text="Such as 8000-9000. Data flows allowing any source port match too.",
+    )
+    destination_port_range = PortRangeField(
+        required=False,
+        help_text="Such as 8000-9000. Data flows allowing any destination port match too.",
+    )
+    port_range_match = forms.ChoiceField(
+        choices=add_blank_choice(choices.PortRangeMatchChoices),
+        required=False,
+        label="Port range match",
+    )
+
+    containment = forms.NullBooleanField(
+        required=False,
+        label="Containment",
+        widget=forms.Select(choices=BOOLEAN_WITH_BLANK_CHOICES),
+        help_text="Also match the sources and destinations covered by the prefixes and IP ranges of the aliases",
+    )
 
     source_is_null = forms.ChoiceField(
         choices=add_blank_choice(choices.TargetIsEmptyChoice),
@@ -525,8 +540,15 @@ class DataFlowFilterForm(TenancyFilterForm, PrimaryModelFilterSetForm):
             "protocol",
             "source_ports",
             "destination_ports",
+            "source_port_range",
+            "destination_port_range",
+            "port_range_match",
             name="Specifications",
         ),
+        FieldSet(
+            "containment",
+            name="Sources and destinations",
+        ),
         FieldSet(
             "source_is_null",
             "source_aliases",
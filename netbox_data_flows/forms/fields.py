@@ -1,14 +1,38 @@
 from django import forms
+from django.db.backends.postgresql.psycopg_any import NumericRange
 
-from utilities.data import array_to_string
-from utilities.forms.fields import DynamicModelMultipleChoiceField
-from utilities.forms.fields import NumericArrayField as NumericArrayField_
+from utilities.forms.fields import DynamicModelMultipleChoiceField, NumericRangeArrayField
 
-__all__ = ("NumericArrayField",)
+from netbox_data_flows.utils.ports import normalize_port_ranges, parse_port_range, port_ranges_to_string
 
+__all__ = (
+    "IcmpTypeChoiceField",
+    "PlaceholderModelMultipleChoiceField",
+    "PortRangeArrayField",
+    "PortRangeField",
+)
 
-class NumericArrayField(NumericArrayField_):
-    """Format ranges in a human-friendly way before displaying the field."""
+
+class PortRangeField(forms.CharField):
+    """A port or a range of ports, such as "8000-9000"."""
+
+    def to_python(self, value):
+        if not value:
+            return None
+
+        if isinstance(value, NumericRange):
+            return value
+
+        try:
+            first, last = parse_port_range(value)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+
+        return NumericRange(first, last + 1, bounds="[)")
+
+
+class PortRangeArrayField(NumericRangeArrayField):
+    """Ports and port ranges, such as "22,80-90", stored as merged ranges of ports."""
 
     def prepare_value(self, value):
         if not value:
@@ -17,12 +41,23 @@ class NumericArrayField(NumericArrayField_):
         if isinstance(value, str):
             return value
 
+        # Ranges of the instance, or the ports of a clone URL
         try:
-            value = [int(v) for v in value]
-        except TypeError:
+            return port_ranges_to_string(normalize_port_ranges(value), separator=",")
+        except ValueError:
             return ""
 
-        return array_to_string(value)
+    def to_python(self, value):
+        if not value:
+            return None
+
+        if isinstance(value, str):
+            value = value.split(",")
+
+        try:
+            return normalize_port_ranges(value)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
 
 
 class IcmpTypeChoiceField(forms.TypedMultipleChoiceField):
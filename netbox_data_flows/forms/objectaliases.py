@@ -1,6 +1,7 @@
 from django import forms
 
 from netbox.forms import PrimaryModelBulkEditForm, PrimaryModelFilterSetForm, PrimaryModelForm, PrimaryModelImportForm
+from utilities.forms import BOOLEAN_WITH_BLANK_CHOICES
 from utilities.forms.fields import DynamicModelMultipleChoiceField, TagFilterField
 from utilities.forms.rendering import FieldSet
 
@@ -161,6 +162,12 @@ class ObjectAliasFilterForm(PrimaryModelFilterSetForm):
         label="Virtual Machines",
         help_text="Any IP address of the virtual machine",
     )
+    containment = forms.NullBooleanField(
+        required=False,
+        label="Containment",
+        widget=forms.Select(choices=BOOLEAN_WITH_BLANK_CHOICES),
+        help_text="Also match the objects covered by the prefixes and IP ranges of the aliases",
+    )
 
     fieldsets = (
         FieldSet(
@@ -175,6 +182,7 @@ class ObjectAliasFilterForm(PrimaryModelFilterSetForm):
             "ip_addresses",
             "devices",
             "virtual_machines",
+            "containment",
             name="Aliased objects - all objects are OR'ed together, any will match",
         ),
     )
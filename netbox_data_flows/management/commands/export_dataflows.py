@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from netbox_data_flows import choices
+from netbox_data_flows.utils.export import export_dataflows
+
+
+class Command(BaseCommand):
+    help = "Export the firewall rules of the enabled data flows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            dest="export_format",
+            choices=choices.FirewallExportFormatChoices.values(),
+            default=choices.FirewallExportFormatChoices.FORMAT_NFTABLES,
+            help="Format of the rules (default: nftables)",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to write the rules to (default: standard output)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of data flows and rules read from the database at a time",
+        )
+
+    def handle(self, *args, export_format, output=None, chunk_size=2000, **options):
+        lines = export_dataflows(export_format, chunk_size=chunk_size)
+
+        if output is None:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        with open(output, "w") as f:
+            f.writelines(lines)
@@ -0,0 +1,94 @@
+import csv
+import os
+import time
+import uuid
+from contextlib import nullcontext
+
+import yaml
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox.context_managers import event_tracking
+from users.models import User
+from utilities.request import NetBoxFakeRequest
+
+from netbox_data_flows import choices
+from netbox_data_flows.utils.bulk import BULK_BATCH_SIZE
+from netbox_data_flows.utils.imports import DataFlowImporter, read_records
+
+FORMAT_EXTENSIONS = {
+    ".csv": choices.DataFlowImportFormatChoices.FORMAT_CSV,
+    ".json": choices.DataFlowImportFormatChoices.FORMAT_JSON,
+    ".ndjson": choices.DataFlowImportFormatChoices.FORMAT_JSON,
+    ".yaml": choices.DataFlowImportFormatChoices.FORMAT_YAML,
+    ".yml": choices.DataFlowImportFormatChoices.FORMAT_YAML,
+}
+
+
+class Command(BaseCommand):
+    help = "Import data flows from a CSV, JSON or YAML file, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "file",
+            help="File to import the data flows from, with the columns of the import form",
+        )
+        parser.add_argument(
+            "--format",
+            dest="import_format",
+            choices=choices.DataFlowImportFormatChoices.values(),
+            help="Format of the file (default: from its extension)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BULK_BATCH_SIZE,
+            help="Number of data flows validated and written at a time",
+        )
+        parser.add_argument(
+            "--user",
+            help="User recorded in the change log (default: no change is recorded)",
+        )
+
+    def handle(self, *args, file, import_format=None, batch_size=BULK_BATCH_SIZE, user=None, **options):
+        if import_format is None:
+            import_format = FORMAT_EXTENSIONS.get(os.path.splitext(file)[1].lower())
+            if import_format is None:
+                raise CommandError("Unknown file extension, use --format")
+
+        request = None
+        if user is not None:
+            try:
+                user = User.objects.get(username=user)
+            except User.DoesNotExist:
+                raise CommandError(f"User not found: {user}")
+            request = NetBoxFakeRequest(
+                {
+                    "META": {},
+                    "COOKIES": {},
+                    "POST": {},
+                    "GET": {},
+                    "FILES": {},
+                    "user": user,
+                    "method": "POST",
+                    "path": "",
+                    "id": uuid.uuid4(),
+                }
+            )
+
+        start = time.monotonic()
+
+        def progress(count):
+            rate = count / max(time.monotonic() - start, 1e-6)
+            self.stdout.write(f"{count} data flows imported ({rate:.0f}/s)")
+
+        importer = DataFlowImporter(batch_size=batch_size, request=request)
+        try:
+            with open(file, newline="") as f, event_tracking(request) if request else nullcontext():
+                importer.run(read_records(f, import_format), progress=progress)
+        except ValidationError as e:
+            raise CommandError("\n".join((*e.messages, f"{importer.count} data flows were imported before the error")))
+        except (ValueError, csv.Error, yaml.YAMLError) as e:
+            raise CommandError(f"Invalid {import_format} file: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"{importer.count} data flows imported"))
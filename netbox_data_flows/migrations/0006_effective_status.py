@@ -0,0 +1,59 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:37
+
+from django.db import migrations, models
+
+STATUS_ENABLED = "enabled"
+STATUS_DISABLED = "disabled"
+STATUS_INHERITED_DISABLED = "disabled-parent"
+
+
+def populate_effective_status(apps, schema_editor):
+    """Compute the materialized inherited status of existing groups and data flows."""
+    DataFlowGroup = apps.get_model("netbox_data_flows", "DataFlowGroup")
+    DataFlow = apps.get_model("netbox_data_flows", "DataFlow")
+
+    disabled_ancestors = DataFlowGroup.objects.filter(
+        tree_id=models.OuterRef("tree_id"),
+        lft__lt=models.OuterRef("lft"),
+        rght__gt=models.OuterRef("rght"),
+        status=STATUS_DISABLED,
+    )
+    DataFlowGroup.objects.update(
+        effective_status=models.Case(
+            models.When(status=STATUS_DISABLED, then=models.Value(STATUS_DISABLED)),
+            models.When(models.Exists(disabled_ancestors), then=models.Value(STATUS_INHERITED_DISABLED)),
+            default=models.Value(STATUS_ENABLED),
+        )
+    )
+
+    disabled_group = DataFlowGroup.objects.filter(pk=models.OuterRef("group_id")).exclude(
+        effective_status=STATUS_ENABLED
+    )
+    DataFlow.objects.update(
+        effective_status=models.Case(
+            models.When(status=STATUS_DISABLED, then=models.Value(STATUS_DISABLED)),
+            models.When(models.Exists(disabled_group), then=models.Value(STATUS_INHERITED_DISABLED)),
+            default=models.Value(STATUS_ENABLED),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("netbox_data_flows", "0005_add_owner_fields_nb45"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataflow",
+            name="effective_status",
+            field=models.CharField(db_index=True, default="enabled", editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name="dataflowgroup",
+            name="effective_status",
+            field=models.CharField(db_index=True, default="enabled", editable=False, max_length=20),
+        ),
+        migrations.RunPython(populate_effective_status, migrations.RunPython.noop),
+    ]
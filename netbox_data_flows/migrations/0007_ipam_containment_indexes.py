@@ -0,0 +1,43 @@
+# Generated by Django 5.2.9 on 2026-10-18 14:05
+
+from django.db import migrations
+
+# Indexes used by ObjectAlias.objects.contains(containment=True) on the IPAM
+# tables. The GiST index on ipam_prefix and the host index on ipam_ipaddress
+# are provided by NetBox; the host indexes on the bounds of ipam_iprange only
+# exist in recent releases, so they are created unless NetBox already has them.
+IPRANGE_HOST_INDEXES = (
+    ("ipam_iprange_start_host", "netbox_data_flows_iprange_start_host", "start_address"),
+    ("ipam_iprange_end_host", "netbox_data_flows_iprange_end_host", "end_address"),
+)
+
+
+def _create_index_sql(netbox_name, name, column):
+    return f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE tablename = 'ipam_iprange' AND indexname = '{netbox_name}'
+            ) THEN
+                CREATE INDEX IF NOT EXISTS {name} ON ipam_iprange ((CAST(HOST({column}) AS INET)));
+            END IF;
+        END
+        $$;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ipam", "0047_squashed_0053"),
+        ("netbox_data_flows", "0006_effective_status"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=_create_index_sql(netbox_name, name, column),
+            reverse_sql=f"DROP INDEX IF EXISTS {name};",
+        )
+        for netbox_name, name, column in IPRANGE_HOST_INDEXES
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 5.2.9 on 2026-10-18 15:27
+
+from collections import defaultdict
+
+import django.db.models.deletion
+import netaddr
+from django.db import migrations, models
+
+
+def _port_ranges(ports):
+    if not ports:
+        return [(None, None)]
+
+    ranges = []
+    for port in sorted(set(ports)):
+        if ranges and port == ranges[-1][1] + 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return ranges
+
+
+def populate_rules(apps, schema_editor):
+    """Expand the existing data flows into rules."""
+    DataFlow = apps.get_model("netbox_data_flows", "DataFlow")
+    DataFlowRule = apps.get_model("netbox_data_flows", "DataFlowRule")
+    ObjectAlias = apps.get_model("netbox_data_flows", "ObjectAlias")
+
+    bounds = defaultdict(set)
+    for alias_id, prefix in ObjectAlias.prefixes.through.objects.values_list("objectalias_id", "prefix__prefix"):
+        network = netaddr.IPNetwork(prefix)
+        bounds[alias_id].add(
+            (netaddr.IPAddress(network.first, network.version), netaddr.IPAddress(network.last, network.version))
+        )
+    for alias_id, start, end in ObjectAlias.ip_ranges.through.objects.values_list(
+        "objectalias_id", "iprange__start_address", "iprange__end_address"
+    ):
+        bounds[alias_id].add((netaddr.IPNetwork(start).ip, netaddr.IPNetwork(end).ip))
+    for alias_id, address in ObjectAlias.ip_addresses.through.objects.values_list(
+        "objectalias_id", "ipaddress__address"
+    ):
+        host = netaddr.IPNetwork(address).ip
+        bounds[alias_id].add((host, host))
+
+    flows = {
+        pk: (protocol, source_ports, destination_ports)
+        for pk, protocol, source_ports, destination_ports in DataFlow.objects.values_list(
+            "pk", "protocol", "source_ports", "destination_ports"
+        )
+    }
+
+    rules = []
+    for direction, through in (("source", DataFlow.sources.through), ("destination", DataFlow.destinations.through)):
+        for dataflow_id, alias_id in through.objects.values_list("dataflow_id", "objectalias_id"):
+            protocol, source_ports, destination_ports = flows[dataflow_id]
+            ports = source_ports if direction == "source" else destination_ports
+            rules += [
+                DataFlowRule(
+                    dataflow_id=dataflow_id,
+                    object_alias_id=alias_id,
+                    direction=direction,
+                    start_address=str(start),
+                    end_address=str(end),
+                    protocol=protocol,
+                    port_min=port_min,
+                    port_max=port_max,
+                )
+                for start, end in sorted(bounds[alias_id])
+                for port_min, port_max in _port_ranges(ports)
+            ]
+
+    DataFlowRule.objects.bulk_create(rules, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ipam", "0047_squashed_0053"),
+        ("netbox_data_flows", "0007_ipam_containment_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataFlowRule",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ("direction", models.CharField(max_length=20)),
+                ("start_address", models.GenericIPAddressField()),
+                ("end_address", models.GenericIPAddressField()),
+                ("protocol", models.CharField(max_length=10)),
+                ("port_min", models.PositiveIntegerField(blank=True, null=True)),
+                ("port_max", models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    "dataflow",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rules",
+                        to="netbox_data_flows.dataflow",
+                    ),
+                ),
+                (
+                    "object_alias",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dataflow_rules",
+                        to="netbox_data_flows.objectalias",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("dataflow", "direction", "start_address", "end_address", "port_min"),
+                "indexes": [models.Index(fields=["start_address", "end_address"], name="netbox_data_flows_rule_range")],
+            },
+        ),
+        migrations.RunPython(populate_rules, migrations.RunPython.noop),
+    ]
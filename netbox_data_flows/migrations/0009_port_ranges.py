@@ -0,0 +1,73 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:02
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+import netbox_data_flows.utils.ports
+
+PORT_FIELDS = ("source_ports", "destination_ports")
+
+# int4multirange() merges the adjacent single-port ranges, then unnest() returns them in order
+COLLAPSE_PORTS_SQL = """
+    UPDATE netbox_data_flows_dataflow SET {column}_ranges = (
+        SELECT array_agg(r ORDER BY r)
+        FROM unnest(int4multirange(VARIADIC ARRAY(SELECT int4range(p, p, '[]') FROM unnest({column}) AS p))) AS r
+    )
+    WHERE {column} IS NOT NULL;
+"""
+
+EXPAND_PORTS_SQL = """
+    UPDATE netbox_data_flows_dataflow SET {column} = ARRAY(
+        SELECT generate_series(lower(r), upper(r) - 1) FROM unnest({column}_ranges) AS r ORDER BY 1
+    )
+    WHERE {column}_ranges IS NOT NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("netbox_data_flows", "0008_dataflowrule"),
+    ]
+
+    operations = [
+        *(
+            migrations.AddField(
+                model_name="dataflow",
+                name=f"{field_name}_ranges",
+                field=django.contrib.postgres.fields.ArrayField(
+                    base_field=django.contrib.postgres.fields.ranges.IntegerRangeField(),
+                    blank=True,
+                    null=True,
+                    size=None,
+                ),
+            )
+            for field_name in PORT_FIELDS
+        ),
+        *(
+            migrations.RunSQL(
+                sql=COLLAPSE_PORTS_SQL.format(column=field_name),
+                reverse_sql=EXPAND_PORTS_SQL.format(column=field_name),
+            )
+            for field_name in PORT_FIELDS
+        ),
+        *(migrations.RemoveField(model_name="dataflow", name=field_name) for field_name in PORT_FIELDS),
+        *(
+            migrations.RenameField(model_name="dataflow", old_name=f"{field_name}_ranges", new_name=field_name)
+            for field_name in PORT_FIELDS
+        ),
+        migrations.AddIndex(
+            model_name="dataflow",
+            index=django.contrib.postgres.indexes.GistIndex(
+                netbox_data_flows.utils.ports.PortRanges("source_ports"), name="netbox_data_flows_df_sports"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dataflow",
+            index=django.contrib.postgres.indexes.GistIndex(
+                netbox_data_flows.utils.ports.PortRanges("destination_ports"), name="netbox_data_flows_df_dports"
+            ),
+        ),
+    ]
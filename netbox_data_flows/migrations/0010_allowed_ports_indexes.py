@@ -0,0 +1,36 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:48
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+import netbox_data_flows.utils.ports
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("netbox_data_flows", "0009_port_ranges"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="dataflow",
+            name="netbox_data_flows_df_sports",
+        ),
+        migrations.RemoveIndex(
+            model_name="dataflow",
+            name="netbox_data_flows_df_dports",
+        ),
+        migrations.AddIndex(
+            model_name="dataflow",
+            index=django.contrib.postgres.indexes.GistIndex(
+                netbox_data_flows.utils.ports.AllowedPorts("source_ports"), name="netbox_data_flows_df_sports"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dataflow",
+            index=django.contrib.postgres.indexes.GistIndex(
+                netbox_data_flows.utils.ports.AllowedPorts("destination_ports"), name="netbox_data_flows_df_dports"
+            ),
+        ),
+    ]
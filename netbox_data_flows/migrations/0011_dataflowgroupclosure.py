@@ -0,0 +1,66 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_closure(apps, schema_editor):
+    """Add the path from each group to itself and to each of its ancestors."""
+    DataFlowGroup = apps.get_model("netbox_data_flows", "DataFlowGroup")
+    DataFlowGroupClosure = apps.get_model("netbox_data_flows", "DataFlowGroupClosure")
+
+    parents = dict(DataFlowGroup.objects.values_list("pk", "parent_id"))
+
+    paths = []
+    for pk in parents:
+        ancestor_id, depth = pk, 0
+        while ancestor_id is not None:
+            paths.append(DataFlowGroupClosure(ancestor_id=ancestor_id, descendant_id=pk, depth=depth))
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+
+    DataFlowGroupClosure.objects.bulk_create(paths, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("netbox_data_flows", "0010_allowed_ports_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataFlowGroupClosure",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ("depth", models.PositiveIntegerField()),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_paths",
+                        to="netbox_data_flows.dataflowgroup",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_paths",
+                        to="netbox_data_flows.dataflowgroup",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("descendant", "depth"),
+                "indexes": [models.Index(fields=["descendant", "ancestor"], name="netbox_data_flows_closure_desc")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("ancestor", "descendant"), name="netbox_data_flows_dataflowgroupclosure_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
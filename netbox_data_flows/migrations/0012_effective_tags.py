@@ -0,0 +1,140 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:31
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_effective_tags(apps, schema_editor):
+    """Add the tags of each group and of its ancestors, then of each data flow and of its groups."""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    TaggedItem = apps.get_model("extras", "TaggedItem")
+    DataFlow = apps.get_model("netbox_data_flows", "DataFlow")
+    DataFlowGroupClosure = apps.get_model("netbox_data_flows", "DataFlowGroupClosure")
+    DataFlowEffectiveTag = apps.get_model("netbox_data_flows", "DataFlowEffectiveTag")
+    DataFlowGroupEffectiveTag = apps.get_model("netbox_data_flows", "DataFlowGroupEffectiveTag")
+
+    def tagged(model_name):
+        content_type = ContentType.objects.filter(app_label="netbox_data_flows", model=model_name).first()
+        if content_type is None:
+            return set()
+        return set(TaggedItem.objects.filter(content_type=content_type).values_list("object_id", "tag_id"))
+
+    group_tags = defaultdict(set)
+    for pk, tag_id in tagged("dataflowgroup"):
+        group_tags[pk].add(tag_id)
+    effective_group_tags = {
+        (descendant_id, tag_id)
+        for ancestor_id, descendant_id in DataFlowGroupClosure.objects.values_list("ancestor_id", "descendant_id")
+        for tag_id in group_tags.get(ancestor_id, ())
+    }
+    DataFlowGroupEffectiveTag.objects.bulk_create(
+        (DataFlowGroupEffectiveTag(group_id=pk, tag_id=tag_id) for pk, tag_id in effective_group_tags),
+        batch_size=1000,
+    )
+
+    dataflow_tags = tagged("dataflow") | set(
+        DataFlow.objects.filter(group__effective_tags__isnull=False).values_list("pk", "group__effective_tags")
+    )
+    DataFlowEffectiveTag.objects.bulk_create(
+        (DataFlowEffectiveTag(dataflow_id=pk, tag_id=tag_id) for pk, tag_id in dataflow_tags),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("extras", "0077_customlink_extend_text_and_url"),
+        ("netbox_data_flows", "0011_dataflowgroupclosure"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataFlowEffectiveTag",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                (
+                    "dataflow",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="netbox_data_flows.dataflow",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="extras.tag",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["tag", "dataflow"], name="netbox_data_flows_df_tag")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("dataflow", "tag"), name="netbox_data_flows_datafloweffectivetag_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="dataflow",
+            name="effective_tags",
+            field=models.ManyToManyField(
+                editable=False,
+                related_name="+",
+                through="netbox_data_flows.DataFlowEffectiveTag",
+                to="extras.tag",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DataFlowGroupEffectiveTag",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                (
+                    "group",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="netbox_data_flows.dataflowgroup",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="extras.tag",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["tag", "group"], name="netbox_data_flows_dfg_tag")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("group", "tag"), name="netbox_data_flows_dataflowgroupeffectivetag_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="dataflowgroup",
+            name="effective_tags",
+            field=models.ManyToManyField(
+                editable=False,
+                related_name="+",
+                through="netbox_data_flows.DataFlowGroupEffectiveTag",
+                to="extras.tag",
+            ),
+        ),
+        migrations.RunPython(populate_effective_tags, migrations.RunPython.noop),
+    ]
@@ -3,3 +3,5 @@ from .applications import *
 from .dataflows import *
 from .groups import *
 from .objectaliases import *
+from .rules import *
+from .tags import *
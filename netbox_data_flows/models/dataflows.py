@@ -1,55 +1,105 @@
-from django.contrib.postgres.fields import ArrayField
-from django.core.validators import MaxValueValidator, MinValueValidator
+from django.contrib.postgres.fields import ArrayField, IntegerRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
-from django.utils.functional import cached_property
 
-from extras.models import Tag
 from netbox.models import PrimaryModel
-from utilities.data import array_to_string
 from utilities.querysets import RestrictedQuerySet
 
 from netbox_data_flows import choices
-from netbox_data_flows.constants import DATAFLOW_PORT_MAX, DATAFLOW_PORT_MIN
-from netbox_data_flows.utils.tags import AccessibleTagsMixin
+from netbox_data_flows.utils.helpers import m2m_exists
+from netbox_data_flows.utils.ports import AllowedPorts, iter_ports, normalize_port_ranges, port_ranges_to_string
+from netbox_data_flows.utils.tags import AccessibleTagsMixin, InheritedTagsQuerySetMixin
 
-from .groups import DataFlowGroup
+from .groups import DataFlowGroup, DataFlowGroupClosure
 from .objectaliases import ObjectAlias
 
 __all__ = ("DataFlow",)
 
 
-class DataFlowQuerySet(RestrictedQuerySet):
+class DataFlowQuerySet(InheritedTagsQuerySetMixin, RestrictedQuerySet):
+    @staticmethod
+    def _disabled_group():
+        """Subquery matching the group of the outer data flow if it or one of its ancestors is disabled."""
+        return DataFlowGroup.objects.only_disabled().filter(pk=models.OuterRef("group_id"))
+
+    def _inherited_status_expression(self):
+        return models.Case(
+            models.When(
+                status=choices.DataFlowStatusChoices.STATUS_DISABLED,
+                then=models.Value(choices.DataFlowInheritedStatusChoices.STATUS_DISABLED),
+            ),
+            models.When(
+                models.Exists(self._disabled_group()),
+                then=models.Value(choices.DataFlowInheritedStatusChoices.STATUS_INHERITED_DISABLED),
+            ),
+            default=models.Value(choices.DataFlowInheritedStatusChoices.STATUS_ENABLED),
+            output_field=models.CharField(),
+        )
+
+    def with_inherited_status(self):
+        """Annotate the inherited status of the data flows, computed in SQL from the disabled groups."""
+        return self.annotate(inherited_status=self._inherited_status_expression())
+
+    def update_effective_status(self):
+        """Recompute the materialized inherited status of the data flows, based on their group."""
+        effective_status = self._inherited_status_expression()
+        return (
+            self.alias(_effective_status=effective_status)
+            .exclude(effective_status=models.F("_effective_status"))
+            .update(effective_status=effective_status)
+        )
+
     def only_disabled(self):
-        disabled_groups = DataFlowGroup.objects.only_disabled().only("pk")
         return self.filter(
-            models.Q(status=choices.DataFlowStatusChoices.STATUS_DISABLED) | models.Q(group_id__in=disabled_groups)
+            models.Q(status=choices.DataFlowStatusChoices.STATUS_DISABLED) | models.Exists(self._disabled_group())
         )
 
     def only_enabled(self):
-        disabled_groups = DataFlowGroup.objects.only_disabled().only("pk")
-        return self.filter(status=choices.DataFlowStatusChoices.STATUS_ENABLED).exclude(group_id__in=disabled_groups)
+        return self.filter(
+            ~models.Q(status=choices.DataFlowStatusChoices.STATUS_DISABLED) & ~models.Exists(self._disabled_group())
+        )
 
-    def part_of_group_recursive(self, *dataflowgroups, include_direct_children=True):
-        group_ids = [getattr(dfg, "pk", dfg) for dfg in dataflowgroups]
-        subgroups = (
-            DataFlowGroup.objects.filter(pk__in=group_ids)
-            .get_descendants(include_self=include_direct_children)
-            .only("pk")
+    def for_table(self):
+        """
+        Fetch the relations displayed or exported by DataFlowTable in bulk.
+
+        The number of queries does not depend on the number of data flows. The inherited status
+        is materialized in effective_status and needs no query.
+        """
+        return self.select_related(
+            "application",
+            "application__role",
+            "group",
+            "owner",
+            "owner__group",
+            "tenant",
+            "tenant__group",
+        ).prefetch_related(
+            "sources",
+            "destinations",
+            "tags",
         )
+
+    def part_of_group_recursive(self, *dataflowgroups, include_direct_children=True):
+        subgroups = DataFlowGroupClosure.objects.descendants(*dataflowgroups, include_self=include_direct_children)
         return self.filter(group_id__in=subgroups)
 
-    def sources_or_destinations(self, *objects):
-        return self.filter(
-            models.Q(sources__in=ObjectAlias.objects.contains(*objects))
-            | models.Q(destinations__in=ObjectAlias.objects.contains(*objects))
-        ).distinct()
+    # The targets are matched with EXISTS subqueries on the many-to-many
+    # tables rather than joins, so that no DISTINCT is needed.
+
+    def sources_or_destinations(self, *objects, containment=False):
+        aliases = ObjectAlias.objects.contains(*objects, containment=containment).values("pk")
+        return self.filter(m2m_exists(self.model, "sources", aliases) | m2m_exists(self.model, "destinations", aliases))
 
-    def sources(self, *objects):
-        return self.filter(models.Q(sources__in=ObjectAlias.objects.contains(*objects))).distinct()
+    def sources(self, *objects, containment=False):
+        aliases = ObjectAlias.objects.contains(*objects, containment=containment).values("pk")
+        return self.filter(m2m_exists(self.model, "sources", aliases))
 
-    def destinations(self, *objects):
-        return self.filter(models.Q(destinations__in=ObjectAlias.objects.contains(*objects))).distinct()
+    def destinations(self, *objects, containment=False):
+        aliases = ObjectAlias.objects.contains(*objects, containment=containment).values("pk")
+        return self.filter(m2m_exists(self.model, "destinations", aliases))
 
 
 class DataFlow(AccessibleTagsMixin, PrimaryModel):
@@ -93,15 +143,42 @@ class DataFlow(AccessibleTagsMixin, PrimaryModel):
         choices=choices.DataFlowStatusChoices,
         default=choices.DataFlowStatusChoices.STATUS_ENABLED,
     )
+    # Materialized inherited status, maintained on save
+    effective_status = models.CharField(
+        max_length=20,
+        choices=choices.DataFlowInheritedStatusChoices,
+        default=choices.DataFlowInheritedStatusChoices.STATUS_ENABLED,
+        editable=False,
+        db_index=True,
+    )
+    # Materialized tags of the data flow and of its groups, maintained on save and on tag changes
+    effective_tags = models.ManyToManyField(
+        to="extras.Tag",
+        through="DataFlowEffectiveTag",
+        related_name="+",
+        editable=False,
+    )
 
-    @cached_property
-    def inherited_status(self):
+    def get_effective_status(self):
+        """Compute the inherited status from the status of the data flow and the stored status of its group."""
         if self.status == choices.DataFlowStatusChoices.STATUS_DISABLED:
-            return self.status
-        elif self.group and self.group.inherited_status != choices.DataFlowInheritedStatusChoices.STATUS_ENABLED:
+            return choices.DataFlowInheritedStatusChoices.STATUS_DISABLED
+        elif self.group and self.group.effective_status != choices.DataFlowInheritedStatusChoices.STATUS_ENABLED:
             return choices.DataFlowInheritedStatusChoices.STATUS_INHERITED_DISABLED
         else:
-            return self.status
+            return choices.DataFlowInheritedStatusChoices.STATUS_ENABLED
+
+    @property
+    def inherited_status(self):
+        if self._state.adding:
+            return self.get_effective_status()
+
+        return getattr(self, "_inherited_status", self.effective_status)
+
+    @inherited_status.setter
+    def inherited_status(self, value):
+        # Set by the with_inherited_status() annotation
+        self._inherited_status = value
 
     @property
     def inherited_status_display(self):
@@ -118,13 +195,11 @@ class DataFlow(AccessibleTagsMixin, PrimaryModel):
         if not self.pk:
             return []
 
-        if not self.group:
-            return self.tags.all()
+        if hasattr(self, "_inherited_tags"):
+            # Set by prefetch_inherited_tags()
+            return self._inherited_tags
 
-        return Tag.objects.filter(
-            models.Q(netbox_data_flows_dataflow_tagged=self.pk)
-            | models.Q(netbox_data_flows_dataflowgroup_tagged__in=self.group.get_ancestors(include_self=True))
-        ).distinct()
+        return self.effective_tags.all()
 
     #
     # Specification
@@ -143,24 +218,14 @@ class DataFlow(AccessibleTagsMixin, PrimaryModel):
         related_name="dataflow_destinations",
     )
 
-    # ports
+    # ports, stored as sorted and non-overlapping ranges
     source_ports = ArrayField(
-        base_field=models.PositiveIntegerField(
-            validators=[
-                MinValueValidator(DATAFLOW_PORT_MIN),
-                MaxValueValidator(DATAFLOW_PORT_MAX),
-            ]
-        ),
+        base_field=IntegerRangeField(),
         blank=True,
         null=True,
     )
     destination_ports = ArrayField(
-        base_field=models.PositiveIntegerField(
-            validators=[
-                MinValueValidator(DATAFLOW_PORT_MIN),
-                MaxValueValidator(DATAFLOW_PORT_MAX),
-            ]
-        ),
+        base_field=IntegerRangeField(),
         blank=True,
         null=True,
     )
@@ -177,7 +242,7 @@ class DataFlow(AccessibleTagsMixin, PrimaryModel):
         if not self.source_ports:
             return "Any"
 
-        return array_to_string(self.source_ports)
+        return port_ranges_to_string(self.source_ports)
 
     @property
     def destination_port_list(self):
@@ -187,7 +252,7 @@ class DataFlow(AccessibleTagsMixin, PrimaryModel):
         if self.is_icmp:
             return self.icmp_type_list
 
-        return array_to_string(self.destination_ports)
+        return port_ranges_to_string(self.destination_ports)
 
     @property
     def icmp_type_list(self):
@@ -200,7 +265,7 @@ class DataFlow(AccessibleTagsMixin, PrimaryModel):
             verbose_names = dict(choices.ICMPv6TypeChoices.CHOICES)
 
         ret = []
-        for icmp_type in self.destination_ports:
+        for icmp_type in iter_ports(self.destination_ports):
             try:
                 ret += [verbose_names[icmp_type]]
             except KeyError:
@@ -214,6 +279,10 @@ class DataFlow(AccessibleTagsMixin, PrimaryModel):
             "group",
             "name",
         )
+        indexes = (
+            GistIndex(AllowedPorts("source_ports"), name="netbox_data_flows_df_sports"),
+            GistIndex(AllowedPorts("destination_ports"), name="netbox_data_flows_df_dports"),
+        )
 
     objects = DataFlowQuerySet.as_manager()
 
@@ -237,6 +306,26 @@ class DataFlow(AccessibleTagsMixin, PrimaryModel):
     def get_absolute_url(self):
         return reverse("plugins:netbox_data_flows:dataflow", args=[self.pk])
 
+    def clone(self):
+        attrs = super().clone()
+
+        # Ranges are cloned in the form notation, e.g. "22,80-90"
+        for field_name in ("source_ports", "destination_ports"):
+            if attrs.get(field_name):
+                attrs[field_name] = port_ranges_to_string(attrs[field_name], separator=",")
+
+        return attrs
+
+    def update_computed_fields(self):
+        """Set the fields maintained from the others, before saving (including in bulk)."""
+        self.effective_status = self.get_effective_status()
+        self.source_ports = normalize_port_ranges(self.source_ports)
+        self.destination_ports = normalize_port_ranges(self.destination_ports)
+
+    def save(self, *args, **kwargs):
+        self.update_computed_fields()
+        super().save(*args, **kwargs)
+
     def clean(self, *args, **kwargs):
         if self.protocol in (
             choices.DataFlowProtocolChoices.PROTOCOL_ICMPv4,
@@ -244,4 +333,10 @@ class DataFlow(AccessibleTagsMixin, PrimaryModel):
         ):
             self.source_ports = []
 
+        for field_name in ("source_ports", "destination_ports"):
+            try:
+                setattr(self, field_name, normalize_port_ranges(getattr(self, field_name)))
+            except ValueError as e:
+                raise ValidationError({field_name: str(e)})
+
         return super().clean(*args, **kwargs)
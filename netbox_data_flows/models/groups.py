@@ -1,26 +1,66 @@
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
-from django.utils.functional import cached_property
 
-from extras.models import Tag
 from netbox.models import NestedGroupModel
 from utilities.mptt import TreeManager, TreeQuerySet
 
 from netbox_data_flows.choices import DataFlowInheritedStatusChoices, DataFlowStatusChoices
-from netbox_data_flows.utils.tags import AccessibleTagsMixin
+from netbox_data_flows.utils.tags import AccessibleTagsMixin, InheritedTagsQuerySetMixin
 
 from .applications import Application
 
-__all__ = ("DataFlowGroup",)
+__all__ = (
+    "DataFlowGroup",
+    "DataFlowGroupClosure",
+)
 
 
-class DataFlowGroupQuerySet(TreeQuerySet):
+class DataFlowGroupQuerySet(InheritedTagsQuerySetMixin, TreeQuerySet):
+    @staticmethod
+    def _disabled_ancestors(include_self=False):
+        """Subquery of the paths from the disabled ancestors to the outer group, in the closure table."""
+        paths = DataFlowGroupClosure.objects.filter(
+            descendant=models.OuterRef("pk"),
+            ancestor__status=DataFlowStatusChoices.STATUS_DISABLED,
+        )
+        if not include_self:
+            paths = paths.filter(depth__gt=0)
+
+        return paths
+
+    def _inherited_status_expression(self):
+        return models.Case(
+            models.When(
+                status=DataFlowStatusChoices.STATUS_DISABLED,
+                then=models.Value(DataFlowInheritedStatusChoices.STATUS_DISABLED),
+            ),
+            models.When(
+                models.Exists(self._disabled_ancestors()),
+                then=models.Value(DataFlowInheritedStatusChoices.STATUS_INHERITED_DISABLED),
+            ),
+            default=models.Value(DataFlowInheritedStatusChoices.STATUS_ENABLED),
+            output_field=models.CharField(),
+        )
+
+    def with_inherited_status(self):
+        """Annotate the inherited status of the groups, computed in SQL from their disabled ancestors."""
+        return self.annotate(inherited_status=self._inherited_status_expression())
+
+    def update_effective_status(self):
+        """Recompute the materialized inherited status of the groups, based on their ancestors."""
+        effective_status = self._inherited_status_expression()
+        return (
+            self.alias(_effective_status=effective_status)
+            .exclude(effective_status=models.F("_effective_status"))
+            .update(effective_status=effective_status)
+        )
+
     def only_disabled(self):
-        return self.filter(status=DataFlowStatusChoices.STATUS_DISABLED).get_descendants(include_self=True)
+        return self.filter(models.Exists(self._disabled_ancestors(include_self=True)))
 
     def only_enabled(self):
-        return self.exclude(pk__in=self.only_disabled().only("pk"))
+        return self.filter(~models.Exists(self._disabled_ancestors(include_self=True)))
 
 
 class DataFlowGroupManager(models.Manager.from_queryset(DataFlowGroupQuerySet), TreeManager):
@@ -59,15 +99,42 @@ class DataFlowGroup(AccessibleTagsMixin, NestedGroupModel):
         choices=DataFlowStatusChoices,
         default=DataFlowStatusChoices.STATUS_ENABLED,
     )
+    # Materialized inherited status, maintained on save
+    effective_status = models.CharField(
+        max_length=20,
+        choices=DataFlowInheritedStatusChoices,
+        default=DataFlowInheritedStatusChoices.STATUS_ENABLED,
+        editable=False,
+        db_index=True,
+    )
+    # Materialized tags of the group and of its ancestors, maintained on save and on tag changes
+    effective_tags = models.ManyToManyField(
+        to="extras.Tag",
+        through="DataFlowGroupEffectiveTag",
+        related_name="+",
+        editable=False,
+    )
 
-    @cached_property
-    def inherited_status(self):
+    def get_effective_status(self):
+        """Compute the inherited status from the status of the group and the stored status of its parent."""
         if self.status == DataFlowStatusChoices.STATUS_DISABLED:
-            return self.status
-        elif self.get_ancestors(include_self=False).filter(status=DataFlowStatusChoices.STATUS_DISABLED).exists():
+            return DataFlowInheritedStatusChoices.STATUS_DISABLED
+        elif self.parent and self.parent.effective_status != DataFlowInheritedStatusChoices.STATUS_ENABLED:
             return DataFlowInheritedStatusChoices.STATUS_INHERITED_DISABLED
         else:
-            return self.status
+            return DataFlowInheritedStatusChoices.STATUS_ENABLED
+
+    @property
+    def inherited_status(self):
+        if self._state.adding:
+            return self.get_effective_status()
+
+        return getattr(self, "_inherited_status", self.effective_status)
+
+    @inherited_status.setter
+    def inherited_status(self, value):
+        # Set by the with_inherited_status() annotation
+        self._inherited_status = value
 
     @property
     def inherited_status_display(self):
@@ -84,9 +151,11 @@ class DataFlowGroup(AccessibleTagsMixin, NestedGroupModel):
         if not self.pk:
             return []
 
-        return Tag.objects.filter(
-            netbox_data_flows_dataflowgroup_tagged__in=self.get_ancestors(include_self=True)
-        ).distinct()
+        if hasattr(self, "_inherited_tags"):
+            # Set by prefetch_inherited_tags()
+            return self._inherited_tags
+
+        return self.effective_tags.all()
 
     class Meta:
         ordering = (
@@ -118,6 +187,29 @@ class DataFlowGroup(AccessibleTagsMixin, NestedGroupModel):
     def get_absolute_url(self):
         return reverse("plugins:netbox_data_flows:dataflowgroup", args=[self.pk])
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        # The original parent is unknown (DeferredAttribute) if the field was deferred
+        moved = not adding and self._mptt_cached_fields.get("parent") != self.parent_id
+        self.effective_status = self.get_effective_status()
+        super().save(*args, **kwargs)
+
+        if adding:
+            # A new group has no descendants or data flows yet
+            DataFlowGroupClosure.objects.insert_group(self)
+            DataFlowGroup.effective_tags.through.objects.rebuild([self.pk])
+            return
+
+        if moved:
+            DataFlowGroupClosure.objects.move_group(self)
+            DataFlowGroup.effective_tags.through.objects.rebuild_subtree(self)
+
+        # The status or the position in the tree may have changed:
+        # refresh the descendants and all the data flows of the subtree
+        descendants = DataFlowGroupClosure.objects.descendants(self, include_self=False)
+        DataFlowGroup.objects.filter(pk__in=descendants).update_effective_status()
+        self.dataflows.model.objects.part_of_group_recursive(self).update_effective_status()
+
     def validate_unique(self, exclude=None):
         if self.parent is None:
             groups = self.__class__.objects.exclude(pk=self.pk)
@@ -129,3 +221,104 @@ class DataFlowGroup(AccessibleTagsMixin, NestedGroupModel):
                 raise ValidationError({"name": "A data flow group with this name already exists for this application."})
 
         super().validate_unique(exclude=exclude)
+
+
+class DataFlowGroupClosureQuerySet(models.QuerySet):
+    def descendants(self, *groups, include_self=True):
+        """Subquery of the IDs of the descendants of the groups, given as objects or IDs."""
+        paths = self.filter(ancestor__in=[getattr(group, "pk", group) for group in groups])
+        if not include_self:
+            paths = paths.filter(depth__gt=0)
+
+        return paths.values("descendant_id")
+
+    def ancestors(self, *groups, include_self=True):
+        """Subquery of the IDs of the ancestors of the groups, given as objects or IDs."""
+        paths = self.filter(descendant__in=[getattr(group, "pk", group) for group in groups])
+        if not include_self:
+            paths = paths.filter(depth__gt=0)
+
+        return paths.values("ancestor_id")
+
+    def insert_group(self, group):
+        """Add the paths to a new group: from itself and from each ancestor of its parent."""
+        paths = [self.model(ancestor_id=group.pk, descendant_id=group.pk, depth=0)]
+        if group.parent_id:
+            paths += [
+                self.model(ancestor_id=ancestor_id, descendant_id=group.pk, depth=depth + 1)
+                for ancestor_id, depth in self.filter(descendant=group.parent_id).values_list("ancestor", "depth")
+            ]
+        self.bulk_create(paths)
+
+    def move_group(self, group):
+        """Replace the paths from the former ancestors of a group to its subtree by the paths from its new ones."""
+        subtree = list(self.filter(ancestor=group.pk).values_list("descendant", "depth"))
+        subtree_ids = [pk for pk, depth in subtree]
+        self.filter(descendant__in=subtree_ids).exclude(ancestor__in=subtree_ids).delete()
+
+        if group.parent_id:
+            self.bulk_create(
+                self.model(ancestor_id=ancestor_id, descendant_id=pk, depth=ancestor_depth + depth + 1)
+                for ancestor_id, ancestor_depth in self.filter(descendant=group.parent_id).values_list(
+                    "ancestor", "depth"
+                )
+                for pk, depth in subtree
+            )
+
+    def rebuild(self):
+        """Rebuild the whole table from the parents of the groups."""
+        parents = dict(DataFlowGroup.objects.values_list("pk", "parent"))
+
+        paths = []
+        for pk in parents:
+            ancestor_id, depth = pk, 0
+            while ancestor_id is not None:
+                paths.append(self.model(ancestor_id=ancestor_id, descendant_id=pk, depth=depth))
+                ancestor_id, depth = parents[ancestor_id], depth + 1
+
+        self.all().delete()
+        self.bulk_create(paths, batch_size=1000)
+
+
+class DataFlowGroupClosure(models.Model):
+    """
+    Closure table of the data flow group hierarchy, maintained on save.
+
+    There is one row per group and per ancestor of the group, including the group itself at depth 0,
+    so that the descendants or the ancestors of any set of groups are read with one indexed join.
+    The rows of a deleted group are deleted in cascade.
+    """
+
+    ancestor = models.ForeignKey(
+        to=DataFlowGroup,
+        on_delete=models.CASCADE,
+        related_name="descendant_paths",
+        db_index=False,
+    )
+    descendant = models.ForeignKey(
+        to=DataFlowGroup,
+        on_delete=models.CASCADE,
+        related_name="ancestor_paths",
+        db_index=False,
+    )
+    depth = models.PositiveIntegerField()
+
+    objects = DataFlowGroupClosureQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("descendant", "depth")
+        constraints = (
+            models.UniqueConstraint(
+                fields=("ancestor", "descendant"),
+                name="netbox_data_flows_dataflowgroupclosure_unique",
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=("descendant", "ancestor"),
+                name="netbox_data_flows_closure_desc",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.ancestor_id} > {self.descendant_id} ({self.depth})"
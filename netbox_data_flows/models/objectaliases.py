@@ -1,36 +1,107 @@
+import netaddr
 from django.db import models
+from django.db.models.functions import Cast
 from django.urls import reverse
 
 from netbox.models import PrimaryModel
 from utilities.querysets import RestrictedQuerySet
 
-from netbox_data_flows.utils.helpers import get_device_ipaddresses
+from ipam.fields import IPAddressField
+from ipam.lookups import Host
+from ipam.models import IPAddress, IPRange, Prefix
+
+from netbox_data_flows.utils.helpers import get_device_ipaddresses, m2m_exists
 
 __all__ = ("ObjectAlias",)
 
 
+def _get_host_bounds(obj):
+    """Return the first and last host addresses of a Prefix, an IPRange or an IPAddress."""
+    if obj._meta.model_name == "prefix":
+        network = netaddr.IPNetwork(obj.prefix)
+        return (
+            netaddr.IPAddress(network.first, network.version),
+            netaddr.IPAddress(network.last, network.version),
+        )
+    if obj._meta.model_name == "iprange":
+        return netaddr.IPNetwork(obj.start_address).ip, netaddr.IPNetwork(obj.end_address).ip
+
+    address = netaddr.IPNetwork(obj.address).ip
+    return address, address
+
+
 class ObjectAliasQuerySet(RestrictedQuerySet):
-    def contains(self, *objects):
-        """Return ObjectAlias containing any one of the objects in parameter."""
-        filtering = models.Q()
-        if prefixes := [o for o in objects if o._meta.model_name == "prefix"]:
-            filtering |= models.Q(prefixes__in=prefixes)
-        if ip_ranges := [o for o in objects if o._meta.model_name == "iprange"]:
-            filtering |= models.Q(ip_ranges__in=ip_ranges)
-        if ip_addresses := [o for o in objects if o._meta.model_name == "ipaddress"]:
-            filtering |= models.Q(ip_addresses__in=ip_addresses)
+    def contains(self, *objects, containment=False):
+        """
+        Return ObjectAlias containing any one of the objects in parameter.
+
+        By default, the objects must be members of the ObjectAlias. With `containment`, the ObjectAlias must
+        cover them instead: one of its prefixes, IP ranges or IP addresses spans all their addresses, regardless
+        of the VRF.
+        """
+        prefixes = [o for o in objects if o._meta.model_name == "prefix"]
+        ip_ranges = [o for o in objects if o._meta.model_name == "iprange"]
+        ip_addresses = [o for o in objects if o._meta.model_name == "ipaddress"]
 
         if other := [o for o in objects if o._meta.model_name not in ("prefix", "iprange", "ipaddress")]:
-            dev_addresses = []
             for obj in other:
-                try:
-                    dev_addresses += get_device_ipaddresses(obj)
-                except Exception as e:
-                    raise TypeError(f"Cannot test if {self.__class__} contains {obj}") from e
+                if not hasattr(type(obj), "interfaces"):
+                    raise TypeError(f"Cannot test if {self.__class__} contains {obj}")
+
+            # The containment mode needs the addresses themselves
+            dev_addresses = get_device_ipaddresses(*other, memoize=containment)
+        else:
+            dev_addresses = None
 
-            filtering |= models.Q(ip_addresses__in=dev_addresses)
+        if containment:
+            return self._covering(*prefixes, *ip_ranges, *ip_addresses, *(dev_addresses or ()))
 
-        return self.filter(filtering).distinct()
+        filtering = models.Q()
+        if prefixes:
+            filtering |= m2m_exists(self.model, "prefixes", prefixes)
+        if ip_ranges:
+            filtering |= m2m_exists(self.model, "ip_ranges", ip_ranges)
+        if ip_addresses:
+            filtering |= m2m_exists(self.model, "ip_addresses", ip_addresses)
+        if dev_addresses is not None:
+            filtering |= m2m_exists(self.model, "ip_addresses", dev_addresses)
+
+        return self.filter(filtering)
+
+    def _covering(self, *objects):
+        """Return ObjectAlias covering any one of the prefixes, IP ranges or IP addresses in parameter."""
+        bounds = {_get_host_bounds(obj) for obj in objects}
+        if not bounds:
+            return self.none()
+
+        # Each predicate compares an IPAM column with literal addresses,
+        # so that PostgreSQL can use the GiST index on the prefixes and
+        # the host indexes on the IP ranges and IP addresses.
+        covering_prefixes = models.Q()
+        covering_ranges = models.Q()
+        hosts = []
+        for first, last in bounds:
+            covering_ranges |= models.Q(start_host__lte=str(first), end_host__gte=str(last))
+            if first == last:
+                covering_prefixes |= models.Q(prefix__net_contains_or_equals=str(first))
+                hosts.append(str(first))
+            else:
+                covering_prefixes |= models.Q(prefix__net_contains_or_equals=str(first)) & models.Q(
+                    prefix__net_contains_or_equals=str(last)
+                )
+
+        ip_ranges = IPRange.objects.alias(
+            start_host=Cast(Host("start_address"), output_field=IPAddressField()),
+            end_host=Cast(Host("end_address"), output_field=IPAddressField()),
+        ).filter(covering_ranges)
+
+        filtering = m2m_exists(self.model, "prefixes", Prefix.objects.filter(covering_prefixes)) | m2m_exists(
+            self.model, "ip_ranges", ip_ranges
+        )
+        if hosts:
+            filtering |= m2m_exists(self.model, "ip_addresses", IPAddress.objects.filter(address__net_in=hosts))
+
+        return self.filter(filtering)
 
 
 class ObjectAlias(PrimaryModel):
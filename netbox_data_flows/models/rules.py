@@ -0,0 +1,192 @@
+from collections import defaultdict
+
+import netaddr
+from django.db import models, transaction
+
+from utilities.querysets import RestrictedQuerySet
+
+from netbox_data_flows import choices
+from netbox_data_flows.utils.helpers import m2m_exists
+from netbox_data_flows.utils.ports import get_port_bounds
+
+from .dataflows import DataFlow
+from .objectaliases import ObjectAlias
+
+__all__ = ("DataFlowRule",)
+
+
+def _get_port_bounds(port_ranges):
+    """Return the first and last ports of each range. No port means any port: (None, None)."""
+    if not port_ranges:
+        return [(None, None)]
+
+    return [get_port_bounds(port_range) for port_range in port_ranges]
+
+
+def _get_alias_bounds(alias_ids):
+    """Return the (first, last) host addresses of the prefixes, IP ranges and IP addresses of each alias."""
+    bounds = defaultdict(set)
+
+    for alias_id, prefix in ObjectAlias.prefixes.through.objects.filter(objectalias_id__in=alias_ids).values_list(
+        "objectalias_id", "prefix__prefix"
+    ):
+        network = netaddr.IPNetwork(prefix)
+        bounds[alias_id].add(
+            (netaddr.IPAddress(network.first, network.version), netaddr.IPAddress(network.last, network.version))
+        )
+
+    for alias_id, start, end in ObjectAlias.ip_ranges.through.objects.filter(objectalias_id__in=alias_ids).values_list(
+        "objectalias_id", "iprange__start_address", "iprange__end_address"
+    ):
+        bounds[alias_id].add((netaddr.IPNetwork(start).ip, netaddr.IPNetwork(end).ip))
+
+    for alias_id, address in ObjectAlias.ip_addresses.through.objects.filter(objectalias_id__in=alias_ids).values_list(
+        "objectalias_id", "ipaddress__address"
+    ):
+        host = netaddr.IPNetwork(address).ip
+        bounds[alias_id].add((host, host))
+
+    return bounds
+
+
+class DataFlowRuleQuerySet(RestrictedQuerySet):
+    def only_enabled(self):
+        """Restrict to the rules of the data flows that are enabled, including through their groups."""
+        return self.filter(dataflow__effective_status=choices.DataFlowInheritedStatusChoices.STATUS_ENABLED)
+
+    def rebuild(self, dataflows=None):
+        """
+        Recompute the expanded rules of the data flows (a queryset or a list of primary keys).
+
+        Without data flows, the whole table is rebuilt. The number of queries does not depend
+        on the number of data flows.
+        """
+        flows = DataFlow.objects.all()
+        if dataflows is not None:
+            flows = flows.filter(pk__in=dataflows)
+        flows = {
+            pk: (protocol, source_ports, destination_ports)
+            for pk, protocol, source_ports, destination_ports in flows.values_list(
+                "pk", "protocol", "source_ports", "destination_ports"
+            )
+        }
+        if dataflows is not None and not flows:
+            return 0
+
+        targets = []
+        for direction, field_name in (
+            (choices.DataFlowRuleDirectionChoices.DIRECTION_SOURCE, "sources"),
+            (choices.DataFlowRuleDirectionChoices.DIRECTION_DESTINATION, "destinations"),
+        ):
+            through = getattr(DataFlow, field_name).through.objects.all()
+            if dataflows is not None:
+                through = through.filter(dataflow_id__in=list(flows))
+            targets += [(direction, *t) for t in through.values_list("dataflow_id", "objectalias_id")]
+
+        bounds = _get_alias_bounds({alias_id for _, _, alias_id in targets})
+
+        rules = []
+        for direction, dataflow_id, alias_id in targets:
+            protocol, source_ports, destination_ports = flows[dataflow_id]
+            if direction == choices.DataFlowRuleDirectionChoices.DIRECTION_SOURCE:
+                port_ranges = _get_port_bounds(source_ports)
+            else:
+                port_ranges = _get_port_bounds(destination_ports)
+
+            rules += [
+                self.model(
+                    dataflow_id=dataflow_id,
+                    object_alias_id=alias_id,
+                    direction=direction,
+                    start_address=str(start),
+                    end_address=str(end),
+                    protocol=protocol,
+                    port_min=port_min,
+                    port_max=port_max,
+                )
+                for start, end in sorted(bounds[alias_id])
+                for port_min, port_max in port_ranges
+            ]
+
+        existing = self.model.objects.all()
+        if dataflows is not None:
+            existing = existing.filter(dataflow_id__in=list(flows))
+
+        with transaction.atomic(using=self.db):
+            existing.delete()
+            self.model.objects.bulk_create(rules, batch_size=1000)
+
+        return len(rules)
+
+    def rebuild_for_aliases(self, aliases):
+        """Recompute the expanded rules of the data flows using any of the object aliases."""
+        dataflows = DataFlow.objects.filter(
+            m2m_exists(DataFlow, "sources", aliases) | m2m_exists(DataFlow, "destinations", aliases)
+        )
+        return self.rebuild(list(dataflows.values_list("pk", flat=True)))
+
+
+class DataFlowRule(models.Model):
+    """
+    Expanded rule of a data flow, maintained from its object aliases.
+
+    There is one rule per source or destination address range of the data flow and per port range,
+    so that the whole policy can be read from this table without walking the object aliases.
+    For ICMP data flows, the destination ports are the ICMP types.
+    No port (port_min and port_max are null) means any port.
+    """
+
+    dataflow = models.ForeignKey(
+        to=DataFlow,
+        on_delete=models.CASCADE,
+        related_name="rules",
+    )
+    object_alias = models.ForeignKey(
+        to=ObjectAlias,
+        on_delete=models.CASCADE,
+        related_name="dataflow_rules",
+    )
+    direction = models.CharField(
+        max_length=20,
+        choices=choices.DataFlowRuleDirectionChoices,
+    )
+    start_address = models.GenericIPAddressField()
+    end_address = models.GenericIPAddressField()
+    protocol = models.CharField(
+        max_length=10,
+        choices=choices.DataFlowProtocolChoices,
+    )
+    port_min = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+    )
+    port_max = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+    )
+
+    objects = DataFlowRuleQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("dataflow", "direction", "start_address", "end_address", "port_min")
+        indexes = (models.Index(fields=("start_address", "end_address"), name="netbox_data_flows_rule_range"),)
+
+    def __str__(self):
+        if self.start_address == self.end_address:
+            addresses = self.start_address
+        else:
+            addresses = f"{self.start_address}-{self.end_address}"
+
+        if self.port_min is None:
+            ports = "any"
+        elif self.port_min == self.port_max:
+            ports = str(self.port_min)
+        else:
+            ports = f"{self.port_min}-{self.port_max}"
+
+        return f"{self.dataflow_id} {self.direction} {addresses} {self.protocol}/{ports}"
+
+    @property
+    def cidrs(self):
+        """Return the address range as a list of CIDR networks."""
+        return netaddr.iprange_to_cidrs(self.start_address, self.end_address)
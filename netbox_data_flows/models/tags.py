@@ -0,0 +1,167 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+
+from extras.models import TaggedItem
+
+from .dataflows import DataFlow
+from .groups import DataFlowGroup, DataFlowGroupClosure
+
+__all__ = (
+    "DataFlowEffectiveTag",
+    "DataFlowGroupEffectiveTag",
+)
+
+
+class EffectiveTagQuerySet(models.QuerySet):
+    # Name of the foreign key to the tagged object
+    object_field = None
+
+    def having_all(self, tags):
+        """Subquery of the IDs of the objects having all the tags (objects or IDs) as effective tags."""
+        tag_ids = {getattr(tag, "pk", tag) for tag in tags}
+        return (
+            self.filter(tag__in=tag_ids)
+            .values(self.object_field)
+            .annotate(tag_count=models.Count("tag"))
+            .filter(tag_count=len(tag_ids))
+            .values(self.object_field)
+        )
+
+    def _replace(self, existing, rows):
+        """Replace the existing effective tags by the (object ID, tag ID) rows."""
+        with transaction.atomic(using=self.db):
+            existing.delete()
+            self.bulk_create(
+                (self.model(**{f"{self.object_field}_id": pk, "tag_id": tag_id}) for pk, tag_id in rows),
+                batch_size=1000,
+            )
+
+        return len(rows)
+
+
+class DataFlowEffectiveTagQuerySet(EffectiveTagQuerySet):
+    object_field = "dataflow"
+
+    def rebuild(self, dataflows=None):
+        """
+        Recompute the effective tags of the data flows (a queryset or a list of primary keys):
+        their own tags and the effective tags of their group.
+
+        Without data flows, the whole table is rebuilt. The effective tags of the groups must be up to date.
+        """
+        direct = TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(DataFlow))
+        inherited = DataFlow.objects.filter(group__effective_tags__isnull=False)
+        existing = self.all()
+        if dataflows is not None:
+            dataflows = list(dataflows)
+            if not dataflows:
+                return 0
+            direct = direct.filter(object_id__in=dataflows)
+            inherited = inherited.filter(pk__in=dataflows)
+            existing = existing.filter(dataflow__in=dataflows)
+
+        rows = set(direct.values_list("object_id", "tag")) | set(inherited.values_list("pk", "group__effective_tags"))
+        return self._replace(existing, rows)
+
+
+class DataFlowGroupEffectiveTagQuerySet(EffectiveTagQuerySet):
+    object_field = "group"
+
+    def rebuild(self, groups=None):
+        """
+        Recompute the effective tags of the groups (a queryset or a list of primary keys):
+        their own tags and the tags of their ancestors. Then those of the data flows of the groups.
+
+        Without groups, the whole table and the effective tags of all the data flows are rebuilt.
+        """
+        paths = DataFlowGroupClosure.objects.filter(ancestor__tags__isnull=False)
+        existing = self.all()
+        dataflows = None
+        if groups is not None:
+            groups = list(groups)
+            if not groups:
+                return 0
+            paths = paths.filter(descendant__in=groups)
+            existing = existing.filter(group__in=groups)
+            dataflows = DataFlow.objects.filter(group__in=groups).values_list("pk", flat=True)
+
+        count = self._replace(existing, set(paths.values_list("descendant", "ancestor__tags")))
+        DataFlowEffectiveTag.objects.rebuild(dataflows)
+        return count
+
+    def rebuild_subtree(self, group):
+        """Recompute the effective tags of a group, of its descendants and of their data flows."""
+        return self.rebuild(
+            DataFlowGroupClosure.objects.filter(ancestor=getattr(group, "pk", group)).values_list(
+                "descendant", flat=True
+            )
+        )
+
+
+class DataFlowEffectiveTag(models.Model):
+    """
+    Effective tag of a data flow, maintained from its tags and from the tags of its groups.
+
+    There is one row per data flow and per tag of the data flow or of its group or of any ancestor group,
+    so that the inherited tags are prefetched and filtered like plain many-to-many relationships.
+    """
+
+    dataflow = models.ForeignKey(
+        to=DataFlow,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,
+    )
+    tag = models.ForeignKey(
+        to="extras.Tag",
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,
+    )
+
+    objects = DataFlowEffectiveTagQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=("dataflow", "tag"),
+                name="netbox_data_flows_datafloweffectivetag_unique",
+            ),
+        )
+        indexes = (models.Index(fields=("tag", "dataflow"), name="netbox_data_flows_df_tag"),)
+
+    def __str__(self):
+        return f"{self.dataflow_id} {self.tag_id}"
+
+
+class DataFlowGroupEffectiveTag(models.Model):
+    """
+    Effective tag of a data flow group, maintained from its tags and from the tags of its ancestors.
+    """
+
+    group = models.ForeignKey(
+        to=DataFlowGroup,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,
+    )
+    tag = models.ForeignKey(
+        to="extras.Tag",
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,
+    )
+
+    objects = DataFlowGroupEffectiveTagQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=("group", "tag"),
+                name="netbox_data_flows_dataflowgroupeffectivetag_unique",
+            ),
+        )
+        indexes = (models.Index(fields=("tag", "group"), name="netbox_data_flows_dfg_tag"),)
+
+    def __str__(self):
+        return f"{self.group_id} {self.tag_id}"
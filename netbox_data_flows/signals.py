@@ -0,0 +1,154 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from ipam.models import IPAddress, IPRange, Prefix
+
+from netbox_data_flows.models import (
+    DataFlow,
+    DataFlowEffectiveTag,
+    DataFlowGroup,
+    DataFlowGroupEffectiveTag,
+    DataFlowRule,
+    ObjectAlias,
+)
+from netbox_data_flows.utils.reachability import bump_policy_generation
+
+#
+# Expanded rules of the data flows
+#
+
+
+def _get_related_pks(through, instance, model):
+    """Return the primary keys of the objects of the model related to the instance through a many-to-many table."""
+    columns = {field.related_model: field.attname for field in through._meta.fields if field.is_relation}
+    return set(through.objects.filter(**{columns[type(instance)]: instance.pk}).values_list(columns[model], flat=True))
+
+
+@receiver(m2m_changed, sender=DataFlow.sources.through)
+@receiver(m2m_changed, sender=DataFlow.destinations.through)
+@receiver(m2m_changed, sender=ObjectAlias.prefixes.through)
+@receiver(m2m_changed, sender=ObjectAlias.ip_ranges.through)
+@receiver(m2m_changed, sender=ObjectAlias.ip_addresses.through)
+def update_rules_on_m2m_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Update the expanded rules when the object aliases of data flows, or their targets, change."""
+    if action == "pre_clear" and reverse:
+        # The relationships are gone once cleared, so remember them beforehand
+        instance._dataflow_rules_cleared = _get_related_pks(sender, instance, model)
+        return
+
+    if action == "post_clear" and reverse:
+        pk_set = instance.__dict__.pop("_dataflow_rules_cleared", set())
+    elif action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    # Primary keys of the DataFlows or ObjectAliases whose targets changed
+    pks = list(pk_set) if reverse else [instance.pk]
+    if not pks:
+        return
+
+    if sender in (DataFlow.sources.through, DataFlow.destinations.through):
+        DataFlowRule.objects.rebuild(pks)
+    else:
+        DataFlowRule.objects.rebuild_for_aliases(pks)
+
+
+@receiver(post_save, sender=DataFlow)
+def update_rules_on_dataflow_save(sender, instance, created, raw=False, **kwargs):
+    """Update the expanded rules of a data flow when its protocol or ports change."""
+    if created or raw:
+        # The targets of a new data flow are set afterwards
+        return
+
+    DataFlowRule.objects.rebuild([instance.pk])
+
+
+@receiver(post_save, sender=Prefix)
+@receiver(post_save, sender=IPRange)
+@receiver(post_save, sender=IPAddress)
+def update_rules_on_ipam_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Update the expanded rules of the data flows using an IPAM object when it is modified, and invalidate the
+    compiled policy. Most IPAM objects are not referenced by any object alias, and do not affect the policy.
+    """
+    if created or raw or not instance.data_flow_object_aliases.exists():
+        return
+
+    DataFlowRule.objects.rebuild(DataFlow.objects.sources_or_destinations(instance).values_list("pk", flat=True))
+    transaction.on_commit(bump_policy_generation)
+
+
+@receiver(pre_delete, sender=Prefix)
+@receiver(pre_delete, sender=IPRange)
+@receiver(pre_delete, sender=IPAddress)
+def find_rules_on_ipam_delete(sender, instance, **kwargs):
+    """Remember the data flows using an IPAM object, as its object aliases are unlinked on deletion."""
+    instance._dataflow_rules_dataflows = list(
+        DataFlow.objects.sources_or_destinations(instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Prefix)
+@receiver(post_delete, sender=IPRange)
+@receiver(post_delete, sender=IPAddress)
+def update_rules_on_ipam_delete(sender, instance, **kwargs):
+    """Update the expanded rules of the data flows that used a deleted IPAM object, and invalidate the policy."""
+    dataflows = instance.__dict__.pop("_dataflow_rules_dataflows", None)
+    if dataflows:
+        DataFlowRule.objects.rebuild(dataflows)
+        transaction.on_commit(bump_policy_generation)
+
+
+#
+# Effective tags of the data flows and groups
+#
+
+
+@receiver(m2m_changed, sender=DataFlow.tags.through)
+def update_effective_tags_on_tags_change(sender, instance, action, **kwargs):
+    """Update the effective tags when the tags of a data flow, or of a group and thus of its subtree, change."""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    # The tags of all the models share the same through model
+    if isinstance(instance, DataFlowGroup):
+        DataFlowGroupEffectiveTag.objects.rebuild_subtree(instance)
+    elif isinstance(instance, DataFlow):
+        DataFlowEffectiveTag.objects.rebuild([instance.pk])
+
+
+@receiver(post_save, sender=DataFlow)
+def update_effective_tags_on_dataflow_save(sender, instance, raw=False, **kwargs):
+    """Update the effective tags of a data flow, which inherits those of its group."""
+    if raw:
+        return
+
+    DataFlowEffectiveTag.objects.rebuild([instance.pk])
+
+
+#
+# Compiled policy cache
+#
+
+
+@receiver(post_save, sender=DataFlow)
+@receiver(post_save, sender=DataFlowGroup)
+@receiver(post_save, sender=ObjectAlias)
+@receiver(post_delete, sender=DataFlow)
+@receiver(post_delete, sender=DataFlowGroup)
+@receiver(post_delete, sender=ObjectAlias)
+@receiver(m2m_changed, sender=DataFlow.sources.through)
+@receiver(m2m_changed, sender=DataFlow.destinations.through)
+@receiver(m2m_changed, sender=ObjectAlias.prefixes.through)
+@receiver(m2m_changed, sender=ObjectAlias.ip_ranges.through)
+@receiver(m2m_changed, sender=ObjectAlias.ip_addresses.through)
+def invalidate_policy(sender, action=None, **kwargs):
+    """
+    Invalidate the compiled policy once the changes are committed, so that it is not compiled from stale data.
+
+    The changes of the IPAM objects invalidate it in update_rules_on_ipam_save() and update_rules_on_ipam_delete().
+    """
+    if action not in (None, "post_add", "post_remove", "post_clear"):
+        return
+
+    transaction.on_commit(bump_policy_generation)
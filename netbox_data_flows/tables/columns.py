@@ -1,9 +1,9 @@
 import django_tables2 as tables
 
 from netbox.tables import columns
-from utilities.data import array_to_string
 
 from netbox_data_flows.utils.helpers import object_list_to_string
+from netbox_data_flows.utils.ports import port_ranges_to_string
 
 
 class PortListColumn(tables.Column):
@@ -17,13 +17,13 @@ class PortListColumn(tables.Column):
         if not value:
             return "Any"
 
-        return array_to_string(value)
+        return port_ranges_to_string(value)
 
     def value(self, value):
         if not value:
             return ""
 
-        return array_to_string(value)
+        return port_ranges_to_string(value)
 
 
 class ObjectAliasListColumn(tables.Column):
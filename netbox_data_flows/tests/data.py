@@ -5,6 +5,7 @@ from utilities.testing import create_tags
 
 from dcim import models as dcim
 from ipam import models as ipam
+from tenancy import models as tenancy
 from virtualization import models as virtualization
 
 from netbox_data_flows import choices, models
@@ -628,3 +629,51 @@ class TestData:
             self._custom_fields = (cf1, cf2, cf3, cf4)
 
         return self._custom_fields
+
+    #
+    # Factories of additional objects, to check that the number of queries does not depend on the number of objects
+    #
+
+    @staticmethod
+    def _related_objects(count):
+        """Return a new tenant in a new tenant group, an application with a role and new tags."""
+        tenant_group = tenancy.TenantGroup.objects.create(name=f"Tenant Group {count}", slug=f"tenant-group-{count}")
+        tenant = tenancy.Tenant.objects.create(name=f"Tenant {count}", slug=f"tenant-{count}", group=tenant_group)
+        application = models.Application.objects.filter(role__isnull=False).first()
+        tags = create_tags(f"Tag {count}")
+
+        return tenant, application, tags
+
+    def add_dataflows(self, count):
+        """Create `count` data flows in a nested group, with a tenant, an application, targets and tags."""
+        tenant, application, tags = self._related_objects(count)
+        group = models.DataFlowGroup.objects.filter(parent__isnull=False).first()
+        aliases = models.ObjectAlias.objects.all()[:2]
+
+        for i in range(count):
+            dataflow = models.DataFlow.objects.create(
+                name=f"Data Flow {count}-{i}",
+                application=application,
+                group=group,
+                tenant=tenant,
+                protocol=choices.DataFlowProtocolChoices.PROTOCOL_TCP,
+                destination_ports=[443],
+            )
+            dataflow.sources.set(aliases)
+            dataflow.destinations.set(aliases)
+            dataflow.tags.set(tags)
+
+    def add_dataflowgroups(self, count):
+        """Create a chain of `count` nested groups, with a tenant, an application and tags."""
+        tenant, application, tags = self._related_objects(count)
+
+        parent = models.DataFlowGroup.objects.first()
+        for i in range(count):
+            parent = models.DataFlowGroup.objects.create(
+                name=f"Group {count}-{i}",
+                slug=f"group-{count}-{i}",
+                parent=parent,
+                application=application,
+                tenant=tenant,
+            )
+            parent.tags.set(tags)
@@ -1,7 +1,20 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from rest_framework import status
 
+from core.choices import ObjectChangeActionChoices
+from core.events import OBJECT_UPDATED
+from core.models import ObjectChange, ObjectType
+from extras.models import Notification, Subscription, Tag
+from users.models import ObjectPermission
 from utilities.testing import APITestCase
 from utilities.testing import APIViewTestCases as _APIViewTestCases
+from utilities.testing import create_tags
+from utilities.testing.query_counts import assert_expected_query_count
 
 from ipam import models as ipam
 
@@ -26,6 +39,44 @@ class APIViewTestCases(_APIViewTestCases):
             self.skipTest("GraphQL not supported")
 
 
+class KeysetPaginationTestMixin:
+    """Crawl the list with NetBox's cursor pagination (?start=), while the objects change."""
+
+    def _crawl(self, on_page=None, limit=2):
+        ids = []
+        url = self._get_list_url()
+        params = {"start": 0, "limit": limit}
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, params, **self.header)
+            self.assertHttpStatus(response, status.HTTP_200_OK)
+            self.assertIsNone(response.data["count"])
+            for sql in (q["sql"] for q in ctx.captured_queries):
+                self.assertNotIn("OFFSET", sql)
+                self.assertNotIn("COUNT(", sql)
+
+            ids += [o["id"] for o in response.data["results"]]
+            if on_page:
+                on_page(len(ids))
+            url, params = response.data["next"], None
+
+        return ids
+
+    def test_list_objects_with_cursor(self):
+        obj_perm = self.model._meta.model_name
+        self.add_permissions(f"netbox_data_flows.view_{obj_perm}")
+        expected = list(self.model.objects.order_by("pk").values_list("pk", flat=True))
+
+        self.assertEqual(self._crawl(), expected)
+
+        # Deleting a crawled object neither skips nor repeats any other object
+        def on_page(crawled):
+            if crawled == 2:
+                self.model.objects.filter(pk=expected[0]).delete()
+
+        self.assertEqual(self._crawl(on_page), expected)
+
+
 class AppTest(PluginUrlBase, APITestCase):
 
     def test_root(self):
@@ -34,6 +85,148 @@ class AppTest(PluginUrlBase, APITestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class ReachabilityTestCase(PluginUrlBase, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        TestData().dataflows
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse(f"{self.view_namespace}-api:reachability")
+        cache.clear()
+
+    def test_reachability(self):
+        self.add_permissions("netbox_data_flows.view_dataflow")
+        params = {"src": "192.0.2.1", "dst": "10.0.2.1", "protocol": "tcp", "port": 100}
+
+        response = self.client.get(self.url, params, **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertTrue(response.data["allowed"])
+        self.assertEqual([o["name"] for o in response.data["dataflows"]], ["Data Flow 6"])
+
+        response = self.client.get(self.url, {**params, "port": 101}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertFalse(response.data["allowed"])
+        self.assertEqual(response.data["dataflows"], [])
+
+    def test_reachability_restricted(self):
+        params = {"src": "192.0.2.1", "dst": "10.0.2.1", "protocol": "tcp", "port": 100}
+
+        response = self.client.get(self.url, params, **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertFalse(response.data["allowed"])
+        self.assertEqual(response.data["dataflows"], [])
+
+    def test_reachability_batch(self):
+        self.add_permissions("netbox_data_flows.view_dataflow")
+        dataflows = {dataflow.name: dataflow.pk for dataflow in models.DataFlow.objects.all()}
+        data = {
+            "connections": [
+                {"src": "192.0.2.1", "dst": "10.0.2.1", "protocol": "tcp", "port": 100},
+                {"src": "192.0.2.1", "dst": "10.0.2.1", "protocol": "tcp", "port": 101},
+                {"src": "10.0.1.1", "dst": "10.0.1.1"},
+                {"src": "10.0.3.3", "dst": "192.0.2.1", "protocol": "sctp", "port": 200, "src_port": 201},
+            ]
+        }
+
+        response = self.client.post(self.url, data, format="json", **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"allowed": True, "dataflows": [dataflows["Data Flow 6"]]},
+                {"allowed": False, "dataflows": []},
+                {
+                    "allowed": True,
+                    "dataflows": sorted(dataflows[f"Data Flow {i}"] for i in (2, 6, 7)),
+                },
+                {"allowed": False, "dataflows": []},
+            ],
+        )
+
+    def test_reachability_batch_restricted(self):
+        data = {
+            "connections": [
+                {"src": "192.0.2.1", "dst": "10.0.2.1", "protocol": "tcp", "port": 100},
+                {"src": "10.0.1.1", "dst": "10.0.1.1"},
+            ]
+        }
+
+        response = self.client.post(self.url, data, format="json", **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [{"allowed": False, "dataflows": []}] * 2)
+
+        # Only the data flows visible to the user permit the traffic
+        obj_perm = ObjectPermission(name="Test permission", actions=["view"], constraints={"name": "Data Flow 2"})
+        obj_perm.save()
+        obj_perm.users.add(self.user)
+        obj_perm.object_types.add(ObjectType.objects.get_for_model(models.DataFlow))
+
+        response = self.client.post(self.url, data, format="json", **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"allowed": False, "dataflows": []},
+                {"allowed": True, "dataflows": [models.DataFlow.objects.get(name="Data Flow 2").pk]},
+            ],
+        )
+
+    def test_reachability_batch_invalid(self):
+        for data in (
+            {},
+            {"connections": []},
+            {"connections": [{"src": "192.0.2.1"}]},
+            {"connections": [{"src": "192.0.2.1", "dst": "10.0.2.1", "protocol": "any"}]},
+        ):
+            response = self.client.post(self.url, data, format="json", **self.header)
+            self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+
+    def test_reachability_invalid(self):
+        for params in (
+            {"dst": "10.0.2.1"},
+            {"src": "192.0.2.1", "dst": "10.0.2"},
+            {"src": "192.0.2.1", "dst": "10.0.2.1", "protocol": "tcp+udp"},
+            {"src": "192.0.2.1", "dst": "10.0.2.1", "port": 65536},
+        ):
+            response = self.client.get(self.url, params, **self.header)
+            self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+
+
+class FirewallExportTestCase(PluginUrlBase, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        TestData().dataflows
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse(f"{self.view_namespace}-api:export")
+
+    def test_export(self):
+        self.add_permissions("netbox_data_flows.view_dataflow")
+
+        response = self.client.get(self.url, {"output": "json"}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+
+        response = self.client.get(self.url, {"output": "nftables", "protocol": "tcp"}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn('"Data Flow 8"', content)
+        self.assertNotIn('"Data Flow 6"', content)
+
+    def test_export_restricted(self):
+        response = self.client.get(self.url, {"output": "json"}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"")
+
+    def test_export_invalid(self):
+        response = self.client.get(self.url, {"output": "pf"}, **self.header)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+
+
 class ApplicationRoleTestCase(PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraphQL):
     model = models.ApplicationRole
     brief_fields = [
@@ -153,8 +346,25 @@ class DataFlowGroupTestCase(PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGra
             "comments": "New comments",
         }
 
+    def _count_list_queries(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self._get_list_url(), params, **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
 
-class ObjectAliasTestCase(PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraphQL):
+    def test_list_objects_query_count(self):
+        self.add_permissions("netbox_data_flows.view_dataflowgroup")
+
+        # The first request updates the last use of the token
+        TestData().add_dataflowgroups(2)
+        self._count_list_queries({"limit": 1000})
+        expected = self._count_list_queries({"limit": 1000})
+
+        TestData().add_dataflowgroups(20)
+        self.assertEqual(self._count_list_queries({"limit": 1000}), expected)
+
+
+class ObjectAliasTestCase(KeysetPaginationTestMixin, PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraphQL):
     model = models.ObjectAlias
     brief_fields = [
         "description",
@@ -211,7 +421,7 @@ class ObjectAliasTestCase(PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraph
         }
 
 
-class DataFlowTestCase(PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraphQL):
+class DataFlowTestCase(KeysetPaginationTestMixin, PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraphQL):
     model = models.DataFlow
     brief_fields = [
         "description",
@@ -237,8 +447,8 @@ class DataFlowTestCase(PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraphQL)
                 "group": groups[1].pk,
                 "status": choices.DataFlowStatusChoices.STATUS_ENABLED,
                 "protocol": choices.DataFlowProtocolChoices.PROTOCOL_TCP,
-                "source_ports": [1, 2, 3],
-                "destination_ports": [4, 5, 6],
+                "source_ports": [[1, 3]],
+                "destination_ports": [[4, 6], [8, 8]],
                 "comments": "New comments",
                 "sources": [aliases[0].pk, aliases[1].pk],
                 "destinations": [aliases[2].pk, aliases[3].pk],
@@ -253,7 +463,7 @@ class DataFlowTestCase(PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraphQL)
                 "group": groups[2].pk,
                 "protocol": choices.DataFlowProtocolChoices.PROTOCOL_UDP,
                 "sources": [aliases[1].pk],
-                "source_ports": [5],
+                "source_ports": [[5, 5]],
                 "destination_ports": [],
             },
             {
@@ -263,7 +473,7 @@ class DataFlowTestCase(PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraphQL)
                 "protocol": choices.DataFlowProtocolChoices.PROTOCOL_TCP_UDP,
                 "sources": [],
                 "destinations": [aliases[1].pk],
-                "destination_ports": [155, 156],
+                "destination_ports": [[155, 156]],
             },
         ]
         cls.bulk_update_data = {
@@ -272,9 +482,291 @@ class DataFlowTestCase(PluginUrlBase, APIViewTestCases.APIViewTestCaseNoGraphQL)
             "group": groups[1].pk,
             "status": choices.DataFlowStatusChoices.STATUS_ENABLED,
             "protocol": choices.DataFlowProtocolChoices.PROTOCOL_TCP,
-            "source_ports": [1, 2, 3],
-            "destination_ports": [4, 5, 6],
+            "source_ports": [[1, 3]],
+            "destination_ports": [[4, 6]],
             "comments": "New comments",
             "sources": [aliases[0].pk, aliases[1].pk],
             "destinations": [aliases[2].pk, aliases[3].pk],
         }
+
+    def test_create_object_with_port_notations(self):
+        self.add_permissions("netbox_data_flows.add_dataflow")
+        data = {
+            "name": "Data Flow 30",
+            "protocol": choices.DataFlowProtocolChoices.PROTOCOL_TCP,
+            "source_ports": [1, 2, 3, 7],
+            "destination_ports": ["8000-9000", [443, 443], 80, [8080, 8443]],
+        }
+
+        response = self.client.post(self._get_list_url(), data, format="json", **self.header)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["source_ports"], [[1, 3], [7, 7]])
+        self.assertEqual(response.data["destination_ports"], [[80, 80], [443, 443], [8000, 9000]])
+
+        for ports in ([[90, 80]], [70000], ["http"], [[1, 2, 3]]):
+            data["destination_ports"] = ports
+            response = self.client.post(self._get_list_url(), data, format="json", **self.header)
+            self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+
+    def _bulk_create(self, count, **attrs):
+        aliases = models.ObjectAlias.objects.all()
+        tags = Tag.objects.filter(name__startswith="Bulk Tag")
+        data = [
+            {
+                "name": f"Bulk Data Flow {count}-{i}",
+                "protocol": choices.DataFlowProtocolChoices.PROTOCOL_TCP,
+                "destination_ports": [443],
+                "sources": [aliases[i % 2].pk, aliases[2].pk],
+                "destinations": [aliases[3].pk],
+                "tags": [tag.pk for tag in tags],
+                **attrs,
+            }
+            for i in range(count)
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self._get_list_url(), data, format="json", **self.header)
+        return response, ctx.captured_queries
+
+    @staticmethod
+    def _count_bulk_queries(queries):
+        """Count the queries reading the object aliases or writing the data flows, their targets and tags."""
+        tables = ("netbox_data_flows_objectalias", "netbox_data_flows_dataflow", "extras_taggeditem")
+        return sum(
+            1
+            for q in queries
+            if (q["sql"].startswith("SELECT") and 'FROM "netbox_data_flows_objectalias"' in q["sql"])
+            or (q["sql"].startswith("INSERT") and any(f'INTO "{table}' in q["sql"] for table in tables))
+        )
+
+    def test_bulk_create_objects_in_bulk(self):
+        self.add_permissions("netbox_data_flows.add_dataflow", "netbox_data_flows.view_dataflow")
+        create_tags("Bulk Tag 1", "Bulk Tag 2")
+
+        response, queries = self._bulk_create(2)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+        expected = self._count_bulk_queries(queries)
+
+        response, queries = self._bulk_create(20)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+        self.assertEqual(self._count_bulk_queries(queries), expected)
+        self.assertEqual(len(response.data), 20)
+
+        aliases = models.ObjectAlias.objects.all()
+        for i, data in enumerate(response.data):
+            dataflow = self.model.objects.get(pk=data["id"])
+            self.assertEqual(dataflow.name, f"Bulk Data Flow 20-{i}")
+            self.assertEqual(set(dataflow.sources.all()), {aliases[i % 2], aliases[2]})
+            self.assertEqual(list(dataflow.destinations.all()), [aliases[3]])
+            self.assertEqual(dataflow.tags.count(), 2)
+            self.assertTrue(dataflow.rules.exists())
+
+            objectchange = ObjectChange.objects.get(
+                changed_object_type=ContentType.objects.get_for_model(self.model), changed_object_id=dataflow.pk
+            )
+            self.assertEqual(objectchange.action, ObjectChangeActionChoices.ACTION_CREATE)
+            self.assertEqual(objectchange.user, self.user)
+            self.assertEqual(
+                sorted(objectchange.postchange_data["sources"]), sorted([aliases[i % 2].pk, aliases[2].pk])
+            )
+            self.assertEqual(objectchange.postchange_data["tags"], ["Bulk Tag 1", "Bulk Tag 2"])
+
+    def test_bulk_create_objects_without_permission(self):
+        obj_perm = ObjectPermission(
+            name="Test permission",
+            actions=["add", "view"],
+            constraints={"protocol": choices.DataFlowProtocolChoices.PROTOCOL_UDP},
+        )
+        obj_perm.save()
+        obj_perm.users.add(self.user)
+        obj_perm.object_types.add(ObjectType.objects.get_for_model(self.model))
+        create_tags("Bulk Tag 1", "Bulk Tag 2")
+        count = self.model.objects.count()
+
+        response, _ = self._bulk_create(2)
+        self.assertHttpStatus(response, status.HTTP_403_FORBIDDEN)
+        self.assertEqual([error["index"] for error in response.data["errors"]], [0, 1])
+        self.assertEqual(self.model.objects.count(), count)
+        self.assertFalse(models.DataFlowRule.objects.filter(dataflow__name__startswith="Bulk Data Flow").exists())
+
+    def test_bulk_update_objects_in_bulk(self):
+        self.add_permissions("netbox_data_flows.change_dataflow", "netbox_data_flows.view_dataflow")
+        aliases = models.ObjectAlias.objects.all()
+        dataflows = list(self.model.objects.order_by("pk")[:3])
+        data = [
+            {"id": dataflows[0].pk, "sources": [aliases[0].pk], "changelog_message": "Sync"},
+            {"id": dataflows[1].pk, "protocol": choices.DataFlowProtocolChoices.PROTOCOL_UDP},
+            {"id": dataflows[2].pk, "destinations": []},
+        ]
+
+        response = self.client.patch(self._get_list_url(), data, format="json", **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+
+        self.assertEqual(list(self.model.objects.get(pk=dataflows[0].pk).sources.all()), [aliases[0]])
+        self.assertEqual(
+            self.model.objects.get(pk=dataflows[1].pk).protocol, choices.DataFlowProtocolChoices.PROTOCOL_UDP
+        )
+        self.assertFalse(self.model.objects.get(pk=dataflows[2].pk).destinations.exists())
+
+        # The expanded rules are up to date
+        def get_rules():
+            return sorted(
+                models.DataFlowRule.objects.values_list(
+                    "dataflow", "direction", "start_address", "end_address", "protocol", "port_min", "port_max"
+                )
+            )
+
+        rules = get_rules()
+        models.DataFlowRule.objects.rebuild()
+        self.assertEqual(get_rules(), rules)
+
+        objectchange = ObjectChange.objects.get(
+            changed_object_type=ContentType.objects.get_for_model(self.model), changed_object_id=dataflows[0].pk
+        )
+        self.assertEqual(objectchange.action, ObjectChangeActionChoices.ACTION_UPDATE)
+        self.assertEqual(objectchange.message, "Sync")
+        self.assertNotEqual(objectchange.prechange_data["sources"], objectchange.postchange_data["sources"])
+        self.assertEqual(objectchange.postchange_data["sources"], [aliases[0].pk])
+
+    def test_bulk_create_objects_with_add_tags(self):
+        self.add_permissions("netbox_data_flows.add_dataflow", "netbox_data_flows.view_dataflow")
+        tags = create_tags("Bulk Tag 1", "Bulk Tag 2")
+        data = [
+            {
+                "name": f"Bulk Data Flow {i}",
+                "protocol": choices.DataFlowProtocolChoices.PROTOCOL_TCP,
+                "add_tags": [{"name": tag.name} for tag in tags],
+            }
+            for i in range(2)
+        ]
+
+        response = self.client.post(self._get_list_url(), data, format="json", **self.header)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+        for dataflow in self.model.objects.filter(name__startswith="Bulk Data Flow"):
+            self.assertEqual(set(dataflow.tags.all()), set(tags))
+
+    def test_bulk_update_objects_with_add_and_remove_tags(self):
+        self.add_permissions("netbox_data_flows.change_dataflow", "netbox_data_flows.view_dataflow")
+        tags = create_tags("Bulk Tag 1", "Bulk Tag 2", "Bulk Tag 3")
+        dataflows = list(self.model.objects.order_by("pk")[:2])
+        for dataflow in dataflows:
+            dataflow.tags.set(tags[:2])
+        data = [
+            {"id": dataflows[0].pk, "add_tags": [{"name": tags[2].name}]},
+            {"id": dataflows[1].pk, "add_tags": [{"name": tags[2].name}], "remove_tags": [{"name": tags[0].name}]},
+        ]
+
+        response = self.client.patch(self._get_list_url(), data, format="json", **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+        self.assertEqual(set(dataflows[0].tags.all()), set(tags))
+        self.assertEqual(set(dataflows[1].tags.all()), set(tags[1:]))
+
+    def test_bulk_create_objects_with_restricted_tag(self):
+        self.add_permissions("netbox_data_flows.add_dataflow", "netbox_data_flows.view_dataflow")
+        tags = create_tags("Bulk Tag 1", "Bulk Tag 2")
+        tags[1].object_types.add(ObjectType.objects.get_for_model(ipam.Prefix))
+        count = self.model.objects.count()
+
+        response, _ = self._bulk_create(2)
+        self.assertHttpStatus(response, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.model.objects.count(), count)
+
+        tags[1].object_types.add(ObjectType.objects.get_for_model(self.model))
+        response, _ = self._bulk_create(2)
+        self.assertHttpStatus(response, status.HTTP_201_CREATED)
+
+    def test_bulk_update_objects_notifies_subscribers(self):
+        self.add_permissions("netbox_data_flows.change_dataflow", "netbox_data_flows.view_dataflow")
+        dataflows = list(self.model.objects.order_by("pk")[:2])
+        object_type = ObjectType.objects.get_for_model(self.model)
+        Subscription.objects.create(object_type=object_type, object_id=dataflows[0].pk, user=self.user)
+        data = [{"id": dataflow.pk, "description": "Updated"} for dataflow in dataflows]
+
+        for _ in range(2):
+            response = self.client.patch(self._get_list_url(), data, format="json", **self.header)
+            self.assertHttpStatus(response, status.HTTP_200_OK)
+
+        notification = Notification.objects.get(user=self.user)
+        self.assertEqual((notification.object_type_id, notification.object_id), (object_type.pk, dataflows[0].pk))
+        self.assertEqual(notification.event_type, OBJECT_UPDATED)
+
+    def _get_list_queries(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self._get_list_url(), params, **self.header)
+        self.assertHttpStatus(response, status.HTTP_200_OK)
+
+        table = self.model._meta.db_table
+        queries = [
+            q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT") and f'FROM "{table}"' in q["sql"]
+        ]
+        return response, queries
+
+    def test_list_objects_query_count(self):
+        self.add_permissions("netbox_data_flows.view_dataflow")
+
+        # The first request updates the last use of the token
+        TestData().add_dataflows(2)
+        self._get_list_queries({"limit": 1000})
+        with CaptureQueriesContext(connection) as ctx:
+            self._get_list_queries({"limit": 1000})
+        expected = len(ctx.captured_queries)
+
+        TestData().add_dataflows(20)
+        with CaptureQueriesContext(connection) as ctx:
+            response, _ = self._get_list_queries({"limit": 1000})
+        self.assertEqual(response.data["count"], self.model.objects.count())
+        self.assertEqual(len(ctx.captured_queries), expected)
+
+    def test_list_objects_with_selected_fields(self):
+        self.add_permissions("netbox_data_flows.view_dataflow")
+        fields = ["id", "name", "source_ids", "destination_ids", "protocol", "destination_ports"]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response, _ = self._get_list_queries({"fields": ",".join(fields)})
+        self.assertEqual(response.data["count"], self.model.objects.count())
+        for data in response.data["results"]:
+            dataflow = self.model.objects.get(pk=data["id"])
+            self.assertEqual(sorted(data), sorted(fields))
+            self.assertEqual(sorted(data["source_ids"]), sorted(dataflow.sources.values_list("pk", flat=True)))
+            self.assertEqual(
+                sorted(data["destination_ids"]), sorted(dataflow.destinations.values_list("pk", flat=True))
+            )
+
+        # Neither the nested objects nor the tags are fetched
+        for sql in (q["sql"] for q in ctx.captured_queries):
+            self.assertNotIn('FROM "extras_taggeditem"', sql)
+            self.assertNotIn('FROM "netbox_data_flows_application"', sql)
+            self.assertNotIn('FROM "netbox_data_flows_dataflowgroup"', sql)
+
+    def test_list_objects_without_distinct(self):
+        self.add_permissions("netbox_data_flows.view_dataflow")
+
+        response, queries = self._get_list_queries({})
+        self.assertEqual(response.data["count"], self.model.objects.count())
+        self.assertTrue(queries)
+        for sql in queries:
+            self.assertNotIn("DISTINCT", sql)
+
+    def test_list_objects_with_target_filters(self):
+        self.add_permissions("netbox_data_flows.view_dataflow")
+        aliases = models.ObjectAlias.objects.all()
+        prefix = ipam.Prefix.objects.first()
+        params = {
+            "source_aliases": [aliases[0].pk, aliases[2].pk],
+            "source_prefixes": [prefix.pk],
+            "destination_is_null": choices.TargetIsEmptyChoice.STATUS_NOT_NULL,
+        }
+        expected = (
+            self.model.objects.filter(
+                Q(sources__in=[aliases[0], aliases[2]]) | Q(sources__in=models.ObjectAlias.objects.contains(prefix))
+            )
+            .exclude(destinations=None)
+            .distinct()
+        )
+
+        with assert_expected_query_count(self, "api_list_objects_with_target_filters"):
+            response, queries = self._get_list_queries(params)
+        self.assertEqual({o["id"] for o in response.data["results"]}, {o.pk for o in expected})
+        self.assertTrue(queries)
+        for sql in queries:
+            self.assertNotIn("DISTINCT", sql)
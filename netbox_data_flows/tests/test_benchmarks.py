@@ -0,0 +1,233 @@
+import os
+import random
+import timeit
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase
+from netaddr import IPAddress as NetIPAddress
+from netaddr import IPNetwork
+
+from ipam.models import IPAddress
+
+from netbox_data_flows import choices, models
+from netbox_data_flows.filtersets import DataFlowFilterSet
+from netbox_data_flows.utils.reachability import ReachabilityIndex
+
+BENCHMARK_ENV_VAR = "DATA_FLOWS_BENCHMARK"
+
+
+@skipUnless(os.environ.get(BENCHMARK_ENV_VAR), f"Set {BENCHMARK_ENV_VAR}=1 to run the benchmarks")
+class TargetLookupBenchmark(TestCase):
+    """
+    Compare the target lookups of DataFlowQuerySet and DataFlowFilterSet with the former joins + DISTINCT.
+
+    Seeds 50k data flows and 20k object aliases, then prints the query plans and timings of both versions.
+    """
+
+    dataflow_count = 50_000
+    alias_count = 20_000
+    targets_per_dataflow = 2
+    repeat = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        first_ip = int(NetIPAddress("10.0.0.1"))
+
+        ip_addresses = IPAddress.objects.bulk_create(
+            (IPAddress(address=IPNetwork(f"{NetIPAddress(first_ip + i)}/8")) for i in range(cls.alias_count)),
+            batch_size=5000,
+        )
+        aliases = models.ObjectAlias.objects.bulk_create(
+            (models.ObjectAlias(name=f"Benchmark Alias {i}") for i in range(cls.alias_count)),
+            batch_size=5000,
+        )
+        models.ObjectAlias.ip_addresses.through.objects.bulk_create(
+            (
+                models.ObjectAlias.ip_addresses.through(objectalias_id=alias.pk, ipaddress_id=ip.pk)
+                for alias, ip in zip(aliases, ip_addresses)
+            ),
+            batch_size=5000,
+        )
+
+        dataflows = models.DataFlow.objects.bulk_create(
+            (
+                models.DataFlow(name=f"Benchmark Data Flow {i}", protocol=choices.DataFlowProtocolChoices.PROTOCOL_TCP)
+                for i in range(cls.dataflow_count)
+            ),
+            batch_size=5000,
+        )
+        for field_name in ("sources", "destinations"):
+            through = getattr(models.DataFlow, field_name).through
+            through.objects.bulk_create(
+                (
+                    through(dataflow_id=dataflow.pk, objectalias_id=alias.pk)
+                    for dataflow in dataflows
+                    for alias in rng.sample(aliases, cls.targets_per_dataflow)
+                ),
+                batch_size=5000,
+            )
+
+        with connection.cursor() as cursor:
+            for model in (IPAddress, models.ObjectAlias, models.DataFlow):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+            for through in (
+                models.ObjectAlias.ip_addresses.through,
+                models.DataFlow.sources.through,
+                models.DataFlow.destinations.through,
+            ):
+                cursor.execute(f"ANALYZE {through._meta.db_table}")
+
+        cls.target = ip_addresses[cls.alias_count // 2]
+
+    @staticmethod
+    def legacy_sources_or_destinations(*objects):
+        ip_addresses = [o for o in objects if o._meta.model_name == "ipaddress"]
+        aliases = models.ObjectAlias.objects.filter(Q(ip_addresses__in=ip_addresses)).distinct()
+        return models.DataFlow.objects.filter(Q(sources__in=aliases) | Q(destinations__in=aliases)).distinct()
+
+    def _report(self, name, queryset):
+        elapsed = min(timeit.repeat(lambda: list(queryset.all()), number=1, repeat=self.repeat))
+        print(f"\n=== {name}: {elapsed * 1000:.1f} ms (best of {self.repeat})")
+        print(queryset.explain(analyze=True))
+
+    def test_sources_or_destinations(self):
+        legacy = self.legacy_sources_or_destinations(self.target)
+        current = models.DataFlow.objects.sources_or_destinations(self.target)
+
+        self.assertEqual(set(legacy.values_list("pk", flat=True)), set(current.values_list("pk", flat=True)))
+        self.assertNotIn("DISTINCT", str(current.query))
+
+        self._report("JOIN + DISTINCT", legacy)
+        self._report("EXISTS", current)
+
+    def test_filterset(self):
+        alias = models.ObjectAlias.objects.get(ip_addresses=self.target)
+        page = slice(0, 50)
+
+        qs = DataFlowFilterSet({}, models.DataFlow.objects.all()).qs
+        self.assertNotIn("DISTINCT", str(qs.query))
+        self._report("DataFlowFilterSet, no target filter, DISTINCT", qs.distinct()[page])
+        self._report("DataFlowFilterSet, no target filter", qs[page])
+
+        params = {"source_aliases": [alias.pk], "destination_ip_addresses": [self.target.pk]}
+        qs = DataFlowFilterSet(params, models.DataFlow.objects.all()).qs
+        legacy = (
+            models.DataFlow.objects.filter(Q(sources__in=[alias]))
+            .filter(Q(destinations__in=models.ObjectAlias.objects.filter(ip_addresses=self.target).distinct()))
+            .distinct()
+        )
+        self.assertEqual(set(legacy.values_list("pk", flat=True)), set(qs.values_list("pk", flat=True)))
+        self.assertNotIn("DISTINCT", str(qs.query))
+        self._report("DataFlowFilterSet, target filters, JOIN + DISTINCT", legacy[page])
+        self._report("DataFlowFilterSet, target filters, EXISTS", qs[page])
+
+
+@skipUnless(os.environ.get(BENCHMARK_ENV_VAR), f"Set {BENCHMARK_ENV_VAR}=1 to run the benchmarks")
+class PortFilterBenchmark(TestCase):
+    """
+    Check that the port filters of DataFlowFilterSet use the GiST indexes on the allowed ports.
+
+    Seeds 100k data flows with random port ranges, then prints the query plans and timings of the port filters.
+    """
+
+    dataflow_count = 100_000
+    repeat = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+
+        def random_ports():
+            if rng.random() < 0.05:
+                return None
+            first = rng.randrange(1, 60000)
+            return [NumericRange(first, first + rng.choice((1, 1, 1, 10, 1000)))]
+
+        models.DataFlow.objects.bulk_create(
+            (
+                models.DataFlow(
+                    name=f"Benchmark Data Flow {i}",
+                    protocol=choices.DataFlowProtocolChoices.PROTOCOL_TCP,
+                    source_ports=random_ports(),
+                    destination_ports=random_ports(),
+                )
+                for i in range(cls.dataflow_count)
+            ),
+            batch_size=5000,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {models.DataFlow._meta.db_table}")
+
+    def _report(self, name, params):
+        queryset = DataFlowFilterSet(params, models.DataFlow.objects.all()).qs.values("pk")
+        elapsed = min(timeit.repeat(lambda: list(queryset.all()), number=1, repeat=self.repeat))
+        plan = queryset.explain(analyze=True)
+        print(f"\n=== {name}: {elapsed * 1000:.1f} ms (best of {self.repeat})")
+        print(plan)
+        self.assertIn("netbox_data_flows_df_dports", plan)
+
+    def test_port_filters(self):
+        self._report("destination_ports=443", {"destination_ports": [443]})
+        self._report("destination_port_range=8000-9000", {"destination_port_range": ["8000-9000"]})
+        self._report(
+            "destination_port_range=8000-9000, all",
+            {"destination_port_range": ["8000-9000"], "port_range_match": choices.PortRangeMatchChoices.MATCH_ALL},
+        )
+
+
+@skipUnless(os.environ.get(BENCHMARK_ENV_VAR), f"Set {BENCHMARK_ENV_VAR}=1 to run the benchmarks")
+class ReachabilityBenchmark(SimpleTestCase):
+    """
+    Time the compilation and the lookups (single and batch) of ReachabilityIndex.
+
+    Compiles 50k data flows with 4 address ranges each, without the database, then prints the timings.
+    """
+
+    dataflow_count = 50_000
+    ranges_per_direction = 2
+    lookup_count = 10_000
+
+    def test_lookups(self):
+        rng = random.Random(0)
+        first_ip = int(NetIPAddress("10.0.0.0"))
+        directions = (
+            choices.DataFlowRuleDirectionChoices.DIRECTION_SOURCE,
+            choices.DataFlowRuleDirectionChoices.DIRECTION_DESTINATION,
+        )
+
+        def random_range():
+            start = first_ip + rng.randrange(1 << 24)
+            return str(NetIPAddress(start)), str(NetIPAddress(start + rng.choice((0, 0, 255, 65535))))
+
+        dataflows = [
+            (pk, choices.DataFlowProtocolChoices.PROTOCOL_TCP, None, [NumericRange(443, 444)], True, True)
+            for pk in range(self.dataflow_count)
+        ]
+        rules = [
+            (pk, direction, *random_range())
+            for pk in range(self.dataflow_count)
+            for direction in directions
+            for _ in range(self.ranges_per_direction)
+        ]
+        queries = [
+            (str(NetIPAddress(first_ip + rng.randrange(1 << 24))), str(NetIPAddress(first_ip + rng.randrange(1 << 24))))
+            for _ in range(self.lookup_count)
+        ]
+
+        elapsed = min(timeit.repeat(lambda: ReachabilityIndex(dataflows, rules), number=1, repeat=3))
+        print(f"\n=== Compilation of {len(rules)} rules: {elapsed * 1000:.1f} ms (best of 3)")
+
+        index = ReachabilityIndex(dataflows, rules)
+        elapsed = timeit.timeit(lambda: [index.lookup(src, dst, "tcp", 443) for src, dst in queries], number=1)
+        print(f"=== Lookup: {elapsed / self.lookup_count * 1_000_000:.1f} us per lookup")
+        self.assertLess(elapsed / self.lookup_count, 0.001)
+
+        # Connection logs: many connections between the same few thousand pairs of addresses
+        connections = [(*rng.choice(queries[:2000]), "tcp", rng.choice((22, 443)), None) for _ in range(100_000)]
+        elapsed = timeit.timeit(lambda: index.lookup_many(connections), number=1)
+        print(f"=== Batch lookup of {len(connections)} connections: {elapsed * 1000:.1f} ms")
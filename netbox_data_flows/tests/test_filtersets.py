@@ -1,4 +1,6 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from dcim import models as dcim
 from ipam import models as ipam
@@ -251,6 +253,13 @@ class ObjectAliasTestCase(TestCase):
         }
         self.assertEqual(self.filterset(params, self.queryset).qs.count(), 2)
 
+    def test_containment(self):
+        ip = ipam.IPAddress.objects.create(address="10.0.1.20/24")
+        params = {"ip_addresses": [ip.pk]}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 0)
+        params = {"ip_addresses": [ip.pk], "containment": True}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 2)
+
     def test_multiple_targets(self):
         params = {
             "prefixes": [ipam.Prefix.objects.first().pk],
@@ -441,6 +450,36 @@ class DataFlowTestCase(TestCase):
         params = {"source_ports": [55, 57, 300], "destination_ports": [82]}
         self.assertEqual(self.filterset(params, self.queryset).qs.count(), 1)
 
+    def test_source_port_range(self):
+        # 5 data flows allow any source port
+        params = {"source_port_range": ["50-60"]}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 6)
+        params = {"source_port_range": ["50-60"], "port_range_match": choices.PortRangeMatchChoices.MATCH_ALL}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 5)
+        params = {"source_port_range": ["55", "200-300"]}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 7)
+
+    def test_destination_port_range(self):
+        # 1 data flow allows any destination port
+        params = {"destination_port_range": ["80-81"]}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 4)
+        params = {"destination_port_range": ["80-81"], "port_range_match": choices.PortRangeMatchChoices.MATCH_ALL}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 1)
+        params = {"destination_port_range": ["81-82"], "port_range_match": choices.PortRangeMatchChoices.MATCH_ALL}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 3)
+        params = {"destination_port_range": ["80", "400"]}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 3)
+        params = {"destination_port_range": ["1000-2000"]}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 1)
+
+    def test_source_and_destination_port_range(self):
+        params = {"source_port_range": ["200"], "destination_port_range": ["200-300"]}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 2)
+
+    def test_invalid_port_range(self):
+        for value in ("90-80", "70000", "http"):
+            self.assertFalse(self.filterset({"destination_port_range": [value]}, self.queryset).is_valid())
+
     def test_source_is_null(self):
         params = {"source_is_null": choices.TargetIsEmptyChoice.STATUS_NULL}
         self.assertEqual(self.filterset(params, self.queryset).qs.count(), 3)
@@ -470,6 +509,22 @@ class DataFlowTestCase(TestCase):
         params = {"source_prefixes": [prefixes[1].pk]}
         self.assertEqual(self.filterset(params, self.queryset).qs.count(), 2)
 
+    def test_containment(self):
+        ip = ipam.IPAddress.objects.create(address="10.0.1.20/24")
+        covering = models.ObjectAlias.objects.filter(name__in=("Object Alias 1", "Object Alias 3"))
+        params = {"source_ip_addresses": [ip.pk]}
+        self.assertEqual(self.filterset(params, self.queryset).qs.count(), 0)
+        params = {"source_ip_addresses": [ip.pk], "containment": True}
+        self.assertEqual(
+            self.filterset(params, self.queryset).qs.count(),
+            self.queryset.filter(sources__in=covering).distinct().count(),
+        )
+        params = {"destination_ip_addresses": [ip.pk], "containment": True}
+        self.assertEqual(
+            self.filterset(params, self.queryset).qs.count(),
+            self.queryset.filter(destinations__in=covering).distinct().count(),
+        )
+
     def test_source_ip_ranges(self):
         ip_ranges = ipam.IPRange.objects.all()
         params = {"source_ip_ranges": [ip_ranges[0].pk]}
@@ -495,6 +550,35 @@ class DataFlowTestCase(TestCase):
         params = {"source_devices": [devices[0].pk, devices[1].pk]}
         self.assertEqual(self.filterset(params, self.queryset).qs.count(), 1)
 
+    def test_source_devices_query_count(self):
+        def count_queries(params):
+            with CaptureQueriesContext(connection) as ctx:
+                self.filterset(params, self.queryset).qs.count()
+            return len(ctx.captured_queries)
+
+        device = dcim.Device.objects.first()
+        vm = virtualization.VirtualMachine.objects.first()
+        params = {"source_devices": [device.pk], "source_virtual_machines": [vm.pk]}
+        expected = count_queries(params)
+
+        dcim.Device.objects.bulk_create(
+            dcim.Device(
+                name=f"Device {i}",
+                device_type=device.device_type,
+                role=device.role,
+                site=device.site,
+            )
+            for i in range(100, 150)
+        )
+        virtualization.VirtualMachine.objects.bulk_create(
+            virtualization.VirtualMachine(name=f"VM {i}") for i in range(100, 150)
+        )
+        params = {
+            "source_devices": list(dcim.Device.objects.values_list("pk", flat=True)),
+            "source_virtual_machines": list(virtualization.VirtualMachine.objects.values_list("pk", flat=True)),
+        }
+        self.assertEqual(count_queries(params), expected)
+
     def test_source_virtual_machines(self):
         vms = virtualization.VirtualMachine.objects.all()[:2]
         params = {"source_virtual_machines": [vms[0].pk]}
@@ -1,6 +1,43 @@
-from django.test import SimpleTestCase
+import json
+import os
+import random
+import tempfile
+from collections import defaultdict
+from io import StringIO
 
-from netbox_data_flows.utils.helpers import object_list_to_string
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import ObjectChange, ObjectType
+from extras.choices import CustomFieldTypeChoices
+from extras.models import CustomField, Tag
+from netbox.context import query_cache
+from users.models import User
+
+from dcim import models as dcim
+from ipam import models as ipam
+from virtualization import models as virtualization
+
+from netbox_data_flows import choices, models
+from netbox_data_flows.utils.export import export_dataflows
+from netbox_data_flows.utils.helpers import get_device_ipaddresses, object_list_to_string
+from netbox_data_flows.utils.imports import DataFlowImporter, read_records
+from netbox_data_flows.utils.ports import iter_ports, normalize_port_ranges, port_ranges_to_string
+from netbox_data_flows.utils.reachability import (
+    IntervalTree,
+    ReachabilityIndex,
+    get_policy_generation,
+    get_reachability_index,
+)
+
+from .data import TestData
 
 
 class DummyObject:
@@ -26,3 +63,501 @@ class ObjectListToStringTestCase(SimpleTestCase):
         self.assertIn('<a href="/plugins/netbox-data-flows/object-aliases/1/">', result)
         self.assertIn("&lt;img src=x onerror=alert(1)&gt;", result)
         self.assertNotIn(payload, result)
+
+
+class PortRangesTestCase(SimpleTestCase):
+    def test_normalize_port_ranges(self):
+        ranges = normalize_port_ranges([443, "8000-9000", (80, 81), 82, "8500", NumericRange(9001, 9010)])
+        self.assertEqual(ranges, [NumericRange(80, 83), NumericRange(443, 444), NumericRange(8000, 9010)])
+        self.assertEqual(port_ranges_to_string(ranges), "80-82, 443, 8000-9009")
+        self.assertEqual(list(iter_ports(ranges[:2])), [80, 81, 82, 443])
+
+        self.assertEqual(normalize_port_ranges([]), [])
+        self.assertIsNone(normalize_port_ranges(None))
+
+    def test_normalize_invalid_port_ranges(self):
+        for value in (-1, 65536, "90-80", "http", (1, 2, 3), None):
+            with self.assertRaises(ValueError):
+                normalize_port_ranges([value])
+
+
+class IntervalTreeTestCase(SimpleTestCase):
+    def test_search(self):
+        rng = random.Random(42)
+        intervals = []
+        for value in range(500):
+            first = rng.randrange(1000)
+            intervals.append((first, first + rng.randrange(100), value))
+        tree = IntervalTree(intervals)
+
+        for point in range(-10, 1110):
+            self.assertEqual(
+                tree.search(point),
+                {value for first, last, value in intervals if first <= point <= last},
+            )
+
+    def test_empty(self):
+        self.assertEqual(IntervalTree([]).search(1), set())
+
+
+class ReachabilityIndexTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        TestData().dataflows
+
+    def setUp(self):
+        self.dataflows = {dataflow.name: dataflow.pk for dataflow in models.DataFlow.objects.all()}
+
+    def assertLookup(self, index, expected, *args, **kwargs):
+        self.assertEqual(
+            index.lookup(*args, **kwargs),
+            sorted(self.dataflows[f"Data Flow {i}"] for i in expected),
+        )
+
+    def test_build(self):
+        with self.assertNumQueries(2):
+            index = ReachabilityIndex.build()
+
+        # TCP+UDP/100 from Any to Object Alias 4 and Object Alias 5
+        self.assertLookup(index, [6], "192.0.2.1", "10.0.2.1", "tcp", 100)
+        self.assertLookup(index, [6], "192.0.2.1", "10.0.3.3", "udp", 100)
+        self.assertLookup(index, [], "192.0.2.1", "10.0.2.1", "tcp", 101)
+        self.assertLookup(index, [], "192.0.2.1", "10.0.2.1", "sctp", 100)
+
+        # TCP/400 from Object Alias 6 to Object Alias 3 and Object Alias 6
+        self.assertLookup(index, [8], "10.100.1.1", "10.0.5.5", "tcp", 400)
+        self.assertLookup(index, [8], "10.100.1.1", "10.100.1.1", "tcp", 400)
+        self.assertLookup(index, [], "10.0.0.1", "10.0.5.5", "tcp", 400)
+
+        # ICMPv4 types 0 and 8 from any to any
+        self.assertLookup(index, [2], "192.0.2.1", "198.51.100.1", "icmp", 8)
+        self.assertLookup(index, [], "192.0.2.1", "198.51.100.1", "icmp", 3)
+        self.assertLookup(index, [], "2001:db8::1", "2001:db8::2", "icmp")
+
+        # SCTP/200 from SCTP/200 from Object Alias 5 to Any
+        self.assertLookup(index, [7], "10.0.3.3", "192.0.2.1", "sctp", 200, source_port=200)
+        self.assertLookup(index, [], "10.0.3.3", "192.0.2.1", "sctp", 200, source_port=201)
+
+        # Any protocol and port; Data Flow 4 has an empty destination alias
+        self.assertLookup(index, [2, 6, 7], "10.0.1.1", "10.0.1.1")
+        self.assertLookup(index, [], "10.0.1.1", "2001:db8::1")
+
+    def test_lookup_many(self):
+        index = ReachabilityIndex.build()
+        connections = [
+            ("192.0.2.1", "10.0.2.1", "tcp", 100, None),
+            ("192.0.2.1", "10.0.2.1", "tcp", 101, None),
+            ("10.0.3.3", "192.0.2.1", "sctp", 200, 200),
+            ("10.0.1.1", "10.0.1.1", None, None, None),
+            ("10.0.1.1", "2001:db8::1", None, None, None),
+            ("192.0.2.1", "10.0.2.1", "udp", 100, None),
+        ]
+
+        self.assertEqual(
+            index.lookup_many(connections),
+            [index.lookup(src, dst, protocol, port, src_port) for src, dst, protocol, port, src_port in connections],
+        )
+        self.assertEqual(index.lookup_many([]), [])
+
+    def test_disabled_dataflows(self):
+        models.DataFlow.objects.filter(name="Data Flow 6").update(
+            effective_status=choices.DataFlowInheritedStatusChoices.STATUS_DISABLED
+        )
+        self.assertLookup(ReachabilityIndex.build(), [2, 7], "10.0.1.1", "10.0.1.1")
+
+
+class PolicyCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        TestData().dataflows
+
+    def setUp(self):
+        cache.clear()
+
+    def assertInvalidates(self, func):
+        generation = get_policy_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            func()
+        self.assertGreater(get_policy_generation(), generation)
+
+    def assertNotInvalidates(self, func):
+        generation = get_policy_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            func()
+        self.assertEqual(get_policy_generation(), generation)
+
+    def test_cached(self):
+        with self.assertNumQueries(2):
+            index = get_reachability_index()
+        with self.assertNumQueries(0):
+            self.assertIs(get_reachability_index(), index)
+
+    def test_invalidation(self):
+        dataflow = models.DataFlow.objects.get(name="Data Flow 6")
+        alias = models.ObjectAlias.objects.get(name="Object Alias 4")
+        self.assertEqual(get_reachability_index().lookup("192.0.2.1", "10.0.2.1", "tcp", 100), [dataflow.pk])
+
+        dataflow.status = choices.DataFlowStatusChoices.STATUS_DISABLED
+        self.assertInvalidates(dataflow.save)
+        self.assertEqual(get_reachability_index().lookup("192.0.2.1", "10.0.2.1", "tcp", 100), [])
+
+        dataflow.status = choices.DataFlowStatusChoices.STATUS_ENABLED
+        self.assertInvalidates(dataflow.save)
+        self.assertInvalidates(lambda: alias.ip_addresses.remove(ipam.IPAddress.objects.get(address="10.0.2.1/24")))
+        self.assertEqual(get_reachability_index().lookup("192.0.2.1", "10.0.2.1", "tcp", 100), [])
+
+        self.assertInvalidates(lambda: dataflow.destinations.clear())
+        self.assertEqual(get_reachability_index().lookup("192.0.2.1", "10.0.2.1", "tcp", 100), [dataflow.pk])
+
+        self.assertInvalidates(models.DataFlowGroup.objects.get(name="Group 1").save)
+        self.assertInvalidates(alias.save)
+
+    def test_ipam_invalidation(self):
+        # Only the changes of the IPAM objects used by data flows invalidate the policy
+        used = models.ObjectAlias.objects.filter(
+            Q(dataflow_sources__isnull=False) | Q(dataflow_destinations__isnull=False)
+        )
+        self.assertInvalidates(ipam.Prefix.objects.filter(data_flow_object_aliases__in=used).first().save)
+        self.assertInvalidates(ipam.IPRange.objects.filter(data_flow_object_aliases__in=used).first().delete)
+
+        prefix = ipam.Prefix.objects.create(prefix="198.51.100.0/24")
+        self.assertNotInvalidates(prefix.save)
+        with CaptureQueriesContext(connection) as queries:
+            prefix.save()
+        # Only the object aliases of the prefix are queried
+        self.assertEqual(len([query for query in queries if "netbox_data_flows_" in query["sql"]]), 1)
+        self.assertNotInvalidates(prefix.delete)
+
+    def test_no_invalidation_before_commit(self):
+        generation = get_policy_generation()
+        with self.captureOnCommitCallbacks(execute=False):
+            models.DataFlow.objects.first().save()
+        self.assertEqual(get_policy_generation(), generation)
+
+
+class FirewallExportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        TestData().dataflows
+
+    def export(self, export_format, queryset=None):
+        return "".join(export_dataflows(export_format, queryset, chunk_size=2))
+
+    def test_nftables(self):
+        # Data Flow 4 has an empty destination alias: no rule
+        self.assertEqual(
+            self.export(choices.FirewallExportFormatChoices.FORMAT_NFTABLES),
+            "table inet netbox_data_flows {\n"
+            "    chain netbox_data_flows {\n"
+            '        icmp type { 0, 8 } accept comment "Data Flow 2"\n'
+            "        ip daddr { 10.0.1.1, 10.0.1.2, 10.0.2.1, 10.0.2.2, 10.0.3.3 } meta l4proto { tcp, udp } "
+            'th dport { 100 } accept comment "Data Flow 6"\n'
+            "        ip saddr { 10.0.1.1, 10.0.1.2, 10.0.3.3 } sctp sport { 200 } sctp dport { 200 } "
+            'accept comment "Data Flow 7"\n'
+            "        ip saddr { 10.100.1.1 } ip daddr { 10.0.0.0/16, 10.0.1.10-10.0.1.49, 10.100.1.1 } "
+            'tcp sport { 400 } tcp dport { 400 } accept comment "Data Flow 8"\n'
+            "    }\n"
+            "}\n",
+        )
+
+    def test_iptables(self):
+        lines = self.export(choices.FirewallExportFormatChoices.FORMAT_IPTABLES).splitlines()
+        self.assertEqual(lines[:2], ["*filter", ":NETBOX_DATA_FLOWS - [0:0]"])
+        self.assertEqual(lines[-1], "COMMIT")
+        self.assertEqual(
+            lines[2:4],
+            [
+                '-A NETBOX_DATA_FLOWS -p icmp --icmp-type 0 -m comment --comment "Data Flow 2" -j ACCEPT',
+                '-A NETBOX_DATA_FLOWS -p icmp --icmp-type 8 -m comment --comment "Data Flow 2" -j ACCEPT',
+            ],
+        )
+        self.assertIn(
+            "-A NETBOX_DATA_FLOWS -d 10.0.3.3 -p udp -m multiport --dports 100 "
+            '-m comment --comment "Data Flow 6" -j ACCEPT',
+            lines,
+        )
+        self.assertIn(
+            "-A NETBOX_DATA_FLOWS -s 10.100.1.1 -m iprange --dst-range 10.0.1.10-10.0.1.49 -p tcp "
+            '-m multiport --sports 400 -m multiport --dports 400 -m comment --comment "Data Flow 8" -j ACCEPT',
+            lines,
+        )
+        # 2 for Data Flow 2, 5 addresses x 2 protocols for Data Flow 6, 3 for Data Flow 7, 3 for Data Flow 8
+        self.assertEqual(len(lines), 2 + 2 + 10 + 3 + 3 + 1)
+
+        # No IPv6 address: only the any to any data flows, but not ICMPv4
+        self.assertEqual(
+            self.export(choices.FirewallExportFormatChoices.FORMAT_IP6TABLES).splitlines(),
+            ["*filter", ":NETBOX_DATA_FLOWS - [0:0]", "COMMIT"],
+        )
+
+    def test_comments(self):
+        dataflow = models.DataFlow.objects.get(name="Data Flow 2")
+        dataflow.name = 'Flow "2"\n-A INPUT -j ACCEPT\\\r' + "x" * 98 + "é" * 5
+        dataflow.save()
+        queryset = models.DataFlow.objects.filter(pk=dataflow.pk)
+
+        comment = "Flow '2' -A INPUT -j ACCEPT/ "
+        lines = self.export(choices.FirewallExportFormatChoices.FORMAT_NFTABLES, queryset).splitlines()
+        self.assertEqual(len(lines), 5)
+        nftables_comment = lines[2].split(" comment ")[1]
+        # Truncated to 128 bytes, without the incomplete character
+        self.assertEqual(nftables_comment, f'"{comment}{"x" * 98}"')
+        self.assertLessEqual(len(nftables_comment[1:-1].encode()), 128)
+
+        lines = self.export(choices.FirewallExportFormatChoices.FORMAT_IPTABLES, queryset).splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertIn(f'--comment "{comment}{"x" * 98}{"é" * 5}" -j ACCEPT', lines[2])
+
+    def test_json(self):
+        dataflows = [
+            json.loads(line) for line in self.export(choices.FirewallExportFormatChoices.FORMAT_JSON).splitlines()
+        ]
+        self.assertEqual([o["name"] for o in dataflows], [f"Data Flow {i}" for i in (2, 4, 6, 7, 8)])
+        self.assertEqual(
+            dataflows[4],
+            {
+                "id": models.DataFlow.objects.get(name="Data Flow 8").pk,
+                "name": "Data Flow 8",
+                "protocol": "tcp",
+                "sources": ["10.100.1.1/32"],
+                "destinations": [
+                    "10.0.0.0/16",
+                    "10.0.1.10/31",
+                    "10.0.1.12/30",
+                    "10.0.1.16/28",
+                    "10.0.1.32/28",
+                    "10.0.1.48/31",
+                    "10.100.1.1/32",
+                ],
+                "source_ports": [[400, 400]],
+                "destination_ports": [[400, 400]],
+            },
+        )
+        # Empty alias and any
+        self.assertEqual(dataflows[1]["destinations"], [])
+        self.assertIsNone(dataflows[2]["sources"])
+
+    def test_queryset(self):
+        queryset = models.DataFlow.objects.filter(name__in=("Data Flow 1", "Data Flow 2"))
+        self.assertEqual(
+            self.export(choices.FirewallExportFormatChoices.FORMAT_JSON, queryset).count("\n"),
+            1,
+        )
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command("export_dataflows", "--format", "json", stdout=out)
+        self.assertEqual(out.getvalue(), self.export(choices.FirewallExportFormatChoices.FORMAT_JSON))
+
+
+class DataFlowImportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        TestData().objectaliases
+        TestData().dataflowgroups
+
+    CSV = (
+        "name,application,group,status,protocol,source_ports,destination_ports,sources,destinations,tags\n"
+        'Import 1,Application 1,group-1,enabled,tcp,,"443,80-90,22",Object Alias 1,"Object Alias 3,Object Alias 4",'
+        '"tag0,tag1"\n'
+        "Import 2,,group-3,enabled,icmp,,8,,Object Alias 5,\n"
+    )
+
+    def records(self, count):
+        return [
+            {
+                "name": f"Import {i}",
+                "application": f"Application {i % 6 + 1}",
+                "status": "enabled",
+                "protocol": "tcp",
+                "destination_ports": [i % 100 + 1],
+                "sources": [f"Object Alias {i % 7 + 1}"],
+                "destinations": "Object Alias 1,Object Alias 2",
+                "tags": ["tag0"],
+            }
+            for i in range(count)
+        ]
+
+    def count_queries(self, count):
+        with CaptureQueriesContext(connection) as queries:
+            DataFlowImporter(batch_size=count).run(self.records(count))
+        return len(queries)
+
+    def test_read_records(self):
+        self.assertEqual(
+            list(read_records(StringIO(self.CSV), choices.DataFlowImportFormatChoices.FORMAT_CSV))[1],
+            {
+                "name": "Import 2",
+                "application": "",
+                "group": "group-3",
+                "status": "enabled",
+                "protocol": "icmp",
+                "source_ports": "",
+                "destination_ports": "8",
+                "sources": "",
+                "destinations": "Object Alias 5",
+                "tags": "",
+            },
+        )
+
+        records = self.records(3)
+        ndjson = "".join(json.dumps(record) + "\n" for record in records)
+        self.assertEqual(list(read_records(StringIO(ndjson), choices.DataFlowImportFormatChoices.FORMAT_JSON)), records)
+        # The NDJSON lines are read one at a time
+        f = StringIO(ndjson)
+        next(read_records(f, choices.DataFlowImportFormatChoices.FORMAT_JSON))
+        self.assertEqual(f.tell(), len(json.dumps(records[0])) + 1)
+        self.assertEqual(
+            list(read_records(StringIO(json.dumps(records)), choices.DataFlowImportFormatChoices.FORMAT_JSON)), records
+        )
+        yaml_records = "\n---\n".join(json.dumps(documents) for documents in (records[:2], records[2:]))
+        self.assertEqual(
+            list(read_records(StringIO(yaml_records), choices.DataFlowImportFormatChoices.FORMAT_YAML)), records
+        )
+
+    def test_import(self):
+        records = read_records(StringIO(self.CSV), choices.DataFlowImportFormatChoices.FORMAT_CSV)
+        self.assertEqual(DataFlowImporter(batch_size=1).run(records), 2)
+
+        dataflow = models.DataFlow.objects.get(name="Import 1")
+        self.assertEqual(dataflow.application.name, "Application 1")
+        self.assertEqual(dataflow.group.slug, "group-1")
+        self.assertEqual(port_ranges_to_string(dataflow.destination_ports), "22, 80-90, 443")
+        self.assertEqual({o.name for o in dataflow.destinations.all()}, {"Object Alias 3", "Object Alias 4"})
+        self.assertEqual({t.slug for t in dataflow.tags.all()}, {"tag0", "tag1"})
+        self.assertTrue(models.DataFlowRule.objects.filter(dataflow=dataflow).exists())
+
+        # group-3 is disabled
+        dataflow = models.DataFlow.objects.get(name="Import 2")
+        self.assertEqual(dataflow.effective_status, dataflow.get_effective_status())
+        self.assertEqual(dataflow.sources.count(), 0)
+
+    def test_update(self):
+        dataflow = models.DataFlow.objects.create(
+            name="Import", protocol=choices.DataFlowProtocolChoices.PROTOCOL_TCP, description="Unchanged"
+        )
+        records = [{"id": str(dataflow.pk), "protocol": "udp", "sources": "Object Alias 1"}]
+        DataFlowImporter().run(records)
+
+        dataflow.refresh_from_db()
+        self.assertEqual(dataflow.protocol, choices.DataFlowProtocolChoices.PROTOCOL_UDP)
+        self.assertEqual(dataflow.description, "Unchanged")
+        self.assertEqual([o.name for o in dataflow.sources.all()], ["Object Alias 1"])
+
+    def test_query_count(self):
+        # The names are resolved with one query per model, whatever the number of records
+        self.count_queries(1)
+        self.assertEqual(self.count_queries(5), self.count_queries(50))
+
+    def test_errors(self):
+        records = self.records(3)
+        records[1]["sources"] = "Object Alias 1,Unknown"
+        records[2]["destination_ports"] = "80-70"
+        records[2]["color"] = "red"
+
+        importer = DataFlowImporter(batch_size=1)
+        with self.assertRaises(ValidationError) as cm:
+            importer.run(records)
+        self.assertEqual(cm.exception.messages, ["Record 2: sources: object alias not found: name=Unknown"])
+        # The previous batches are kept
+        self.assertEqual(importer.count, 1)
+        self.assertTrue(models.DataFlow.objects.filter(name="Import 0").exists())
+
+        with self.assertRaises(ValidationError) as cm:
+            DataFlowImporter().run(records[2:])
+        self.assertEqual(len(cm.exception.messages), 2)
+        self.assertIn("Record 1: color: Unknown field", cm.exception.messages)
+        self.assertFalse(models.DataFlow.objects.filter(name="Import 2").exists())
+
+        # The tags restricted to other object types are rejected
+        Tag.objects.get(slug="tag0").object_types.add(ObjectType.objects.get_for_model(ipam.Prefix))
+        with self.assertRaises(ValidationError) as cm:
+            DataFlowImporter().run(self.records(2))
+        self.assertEqual(cm.exception.messages, ["Records 1-2: Tag tag0 cannot be assigned to dataflow objects."])
+
+    def test_custom_fields(self):
+        object_type = ObjectType.objects.get_for_model(models.DataFlow)
+        port = CustomField.objects.create(name="port", type=CustomFieldTypeChoices.TYPE_INTEGER, required=True)
+        port.object_types.set([object_type])
+        contact = CustomField.objects.create(name="contact", type=CustomFieldTypeChoices.TYPE_TEXT, default="noc")
+        contact.object_types.set([object_type])
+
+        records = self.records(2)
+        records[0]["cf_port"] = "8080"
+        records[1]["cf_port"] = 22
+        records[1]["cf_contact"] = "ops"
+        DataFlowImporter().run(records)
+        self.assertEqual(
+            models.DataFlow.objects.get(name="Import 0").custom_field_data, {"port": 8080, "contact": "noc"}
+        )
+        self.assertEqual(models.DataFlow.objects.get(name="Import 1").custom_field_data, {"port": 22, "contact": "ops"})
+
+        records = self.records(3)[2:]
+        with self.assertRaises(ValidationError) as cm:
+            DataFlowImporter().run(records)
+        self.assertEqual(cm.exception.messages, ["Record 1: __all__: Missing required custom field 'port'."])
+
+        records[0]["cf_port"] = "http"
+        with self.assertRaises(ValidationError) as cm:
+            DataFlowImporter().run(records)
+        self.assertIn("Record 1: cf_port: Enter a whole number.", cm.exception.messages)
+
+    def test_management_command(self):
+        user = User.objects.create(username="importer")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dataflows.ndjson")
+            with open(path, "w") as f:
+                f.writelines(json.dumps(record) + "\n" for record in self.records(5))
+
+            out = StringIO()
+            call_command("import_dataflows", path, "--batch-size", "2", "--user", "importer", stdout=out)
+            self.assertEqual(out.getvalue().count("data flows imported"), 4)
+            self.assertEqual(models.DataFlow.objects.filter(name__startswith="Import ").count(), 5)
+            self.assertEqual(ObjectChange.objects.filter(user=user).count(), 5)
+
+            with open(path, "a") as f:
+                f.write('{"name": "Import 5", "protocol": "tcp", "group": "unknown"}\n')
+            with self.assertRaisesMessage(CommandError, "Record 6: group: data flow group not found: slug=unknown"):
+                call_command("import_dataflows", path, "--format", "json", stdout=StringIO())
+
+
+class GetDeviceIPAddressesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        TestData().targetobjects
+
+    def test_devices_and_virtual_machines(self):
+        devices = dcim.Device.objects.order_by("name")
+        vms = virtualization.VirtualMachine.objects.order_by("name")
+
+        self.assertEqual(
+            {str(ip) for ip in get_device_ipaddresses(devices[0])},
+            {"10.0.1.1/24", "10.0.1.2/24"},
+        )
+        self.assertEqual(
+            {str(ip) for ip in get_device_ipaddresses(*devices, *vms)},
+            {"10.0.1.1/24", "10.0.1.2/24", "10.0.2.1/24", "10.0.2.2/24", "10.0.3.3/24", "10.100.1.1/24"},
+        )
+        self.assertEqual(get_device_ipaddresses().count(), 0)
+
+    def test_one_query(self):
+        devices = list(dcim.Device.objects.all())
+        vms = list(virtualization.VirtualMachine.objects.all())
+        # Prime the object types cache
+        get_device_ipaddresses(*devices, *vms).count()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(get_device_ipaddresses(*devices, *vms, memoize=True)), 6)
+
+    def test_memoize(self):
+        devices = list(dcim.Device.objects.all())
+        get_device_ipaddresses(*devices).count()
+
+        token = query_cache.set(defaultdict(dict))
+        try:
+            with self.assertNumQueries(1):
+                ip_addresses = get_device_ipaddresses(*devices, memoize=True)
+                self.assertEqual(get_device_ipaddresses(*reversed(devices), memoize=True), ip_addresses)
+        finally:
+            query_cache.reset(token)
@@ -1,7 +1,9 @@
 import random
 
+from django.db.backends.postgresql.psycopg_any import NumericRange
 from django.db.models import QuerySet
 from django.test import TestCase
+from netaddr import IPNetwork
 
 from dcim import models as dcim
 from ipam import models as ipam
@@ -42,6 +44,42 @@ class ObjectAliasTestCase(TestCase):
         qs = self.model.objects.contains(pref[0], *vm)
         self.assertEqual(qs.count(), 4)
 
+    def test_qs_contains_containment(self):
+        # 10.0.1.1 is a member of aliases 4 and 5, and covered by 10.0.0.0/16 (aliases 1 and 3)
+        ip = ipam.IPAddress.objects.get(address="10.0.1.1/24")
+        qs = self.model.objects.contains(ip, containment=True)
+        self.assertEqual({a.name for a in qs}, {"Object Alias 1", "Object Alias 3", "Object Alias 4", "Object Alias 5"})
+
+        # 10.0.1.20 is not in IPAM but is covered by Range 1 (alias 3) and 10.0.0.0/16 (aliases 1 and 3)
+        ip = ipam.IPAddress.objects.create(address="10.0.1.20/24")
+        qs = self.model.objects.contains(ip, containment=True)
+        self.assertEqual({a.name for a in qs}, {"Object Alias 1", "Object Alias 3"})
+
+        # A range only matches when it is fully covered
+        iprange = ipam.IPRange.objects.create(
+            start_address=IPNetwork("10.0.1.15/24"), end_address=IPNetwork("10.0.1.30/24")
+        )
+        self.assertEqual(self.model.objects.contains(iprange).count(), 0)
+        self.assertEqual(self.model.objects.contains(iprange, containment=True).count(), 2)
+        iprange = ipam.IPRange.objects.create(
+            start_address=IPNetwork("10.0.255.250/24"), end_address=IPNetwork("10.1.0.5/24")
+        )
+        self.assertEqual(self.model.objects.contains(iprange, containment=True).count(), 0)
+
+        # A prefix is covered by itself and its parents
+        pref = ipam.Prefix.objects.get(prefix="10.0.2.0/24")
+        qs = self.model.objects.contains(pref, containment=True)
+        self.assertEqual({a.name for a in qs}, {"Object Alias 1", "Object Alias 3"})
+        pref = ipam.Prefix.objects.get(prefix="10.100.0.0/16")
+        self.assertEqual(self.model.objects.contains(pref, containment=True).count(), 0)
+
+        dev = dcim.Device.objects.all()[:2]
+        self.assertGreaterEqual(
+            self.model.objects.contains(*dev, containment=True).count(),
+            self.model.objects.contains(*dev).count(),
+        )
+        self.assertEqual(self.model.objects.contains(containment=True).count(), 0)
+
 
 class DataFlowTestCase(TestCase):
     model = models.DataFlow
@@ -62,6 +100,16 @@ class DataFlowTestCase(TestCase):
         self.assertIsInstance(qs, QuerySet)
         self.assertEqual(qs.count(), 5)
 
+    def test_qs_with_inherited_status(self):
+        qs = self.model.objects.with_inherited_status()
+        self.assertIsInstance(qs, QuerySet)
+        for obj in qs:
+            self.assertEqual(obj.inherited_status, obj.effective_status)
+        self.assertEqual(
+            qs.filter(inherited_status=choices.DataFlowInheritedStatusChoices.STATUS_ENABLED).count(),
+            self.model.objects.only_enabled().count(),
+        )
+
     def test_qs_part_of_group_recursive(self):
         groups = models.DataFlowGroup.objects.all()
         qs = self.model.objects.part_of_group_recursive(groups[1], groups[2], include_direct_children=False)
@@ -98,6 +146,19 @@ class DataFlowTestCase(TestCase):
         qs = self.model.objects.sources(pref[0], *vm)
         self.assertEqual(qs.count(), 4)
 
+    def test_qs_sources_containment(self):
+        ip = ipam.IPAddress.objects.create(address="10.0.1.20/24")
+        covering = models.ObjectAlias.objects.filter(name__in=("Object Alias 1", "Object Alias 3"))
+        self.assertEqual(self.model.objects.sources(ip).count(), 0)
+        self.assertEqual(
+            set(self.model.objects.sources(ip, containment=True)),
+            set(self.model.objects.filter(sources__in=covering)),
+        )
+        self.assertEqual(
+            set(self.model.objects.destinations(ip, containment=True)),
+            set(self.model.objects.filter(destinations__in=covering)),
+        )
+
     def test_qs_destinations(self):
         ips = ipam.IPAddress.objects.all()[:3]
         qs = self.model.objects.destinations(*ips)
@@ -197,6 +258,40 @@ class DataFlowTestCase(TestCase):
             choices.DataFlowInheritedStatusChoices.STATUS_DISABLED,
         )
 
+    def test_effective_status_is_maintained(self):
+        enabled = choices.DataFlowInheritedStatusChoices.STATUS_ENABLED
+        disabled = choices.DataFlowInheritedStatusChoices.STATUS_DISABLED
+        inherited_disabled = choices.DataFlowInheritedStatusChoices.STATUS_INHERITED_DISABLED
+
+        def effective_status(obj):
+            return obj.__class__.objects.values_list("effective_status", flat=True).get(pk=obj.pk)
+
+        group12 = models.DataFlowGroup.objects.get(slug="group-1-2")
+        group121 = models.DataFlowGroup.objects.get(slug="group-1-2-1")
+        group2 = models.DataFlowGroup.objects.get(slug="group-2")
+        dataflow4 = models.DataFlow.objects.get(name="Data Flow 4")
+        dataflow8 = models.DataFlow.objects.get(name="Data Flow 8")
+        self.assertEqual(effective_status(dataflow4), enabled)
+
+        # Disabling an ancestor disables the subtree and its data flows
+        group12.status = choices.DataFlowStatusChoices.STATUS_DISABLED
+        group12.save()
+        self.assertEqual(effective_status(group12), disabled)
+        self.assertEqual(effective_status(group121), inherited_disabled)
+        self.assertEqual(effective_status(dataflow4), inherited_disabled)
+
+        # Moving the group out of the disabled subtree enables it again
+        group121.refresh_from_db()
+        group121.parent = group2
+        group121.save()
+        self.assertEqual(effective_status(group121), enabled)
+        self.assertEqual(effective_status(dataflow4), enabled)
+
+        # Reassigning a data flow to a disabled group disables it
+        dataflow8.group = group12
+        dataflow8.save()
+        self.assertEqual(effective_status(dataflow8), inherited_disabled)
+
     def test_inherited_tags(self):
         dataflows = self.dataflows
         tags = self.tags
@@ -212,6 +307,56 @@ class DataFlowTestCase(TestCase):
 
         self.assertEqual(set(dataflows[7].inherited_tags), set())
 
+    def test_qs_prefetch_inherited_tags(self):
+        expected = {obj.pk: list(obj.inherited_tags) for obj in self.model.objects.all()}
+
+        with self.assertNumQueries(2):
+            objs = list(self.model.objects.prefetch_inherited_tags())
+            for obj in objs:
+                self.assertEqual(obj.inherited_tags, expected[obj.pk])
+
+    def assertEffectiveTagsAreUpToDate(self):
+        def effective_tags():
+            return (
+                set(models.DataFlowGroupEffectiveTag.objects.values_list("group", "tag")),
+                set(models.DataFlowEffectiveTag.objects.values_list("dataflow", "tag")),
+            )
+
+        tags = effective_tags()
+        models.DataFlowGroupEffectiveTag.objects.rebuild()
+        self.assertEqual(tags, effective_tags())
+
+    def test_effective_tags_are_maintained(self):
+        tags = self.tags
+        self.assertEffectiveTagsAreUpToDate()
+
+        group1 = models.DataFlowGroup.objects.get(name="Group 1")
+        group2 = models.DataFlowGroup.objects.get(name="Group 2")
+        group12 = models.DataFlowGroup.objects.get(name="Group 1.2")
+
+        group1.tags.add(tags[6])
+        self.assertEffectiveTagsAreUpToDate()
+        self.assertIn(tags[6], self.model.objects.get(pk=self.dataflows[3].pk).inherited_tags)
+
+        group12.refresh_from_db()
+        group12.parent = group2
+        group12.save()
+        self.assertEffectiveTagsAreUpToDate()
+
+        dataflow = self.model.objects.create(name="Data Flow 9", protocol="tcp", group=group12)
+        self.assertEffectiveTagsAreUpToDate()
+        dataflow.tags.set(tags[3:5])
+        self.assertEffectiveTagsAreUpToDate()
+        dataflow.group = None
+        dataflow.save()
+        self.assertEffectiveTagsAreUpToDate()
+        self.assertEqual(set(dataflow.inherited_tags), set(tags[3:5]))
+
+        group1.tags.clear()
+        self.assertEffectiveTagsAreUpToDate()
+        tags[0].delete()
+        self.assertEffectiveTagsAreUpToDate()
+
     def test_icmp_clean_remove_source_ports(self):
         def rand_source_ports():
             return [random.randrange(0, 255) for i in range(0, random.randrange(0, 12))]
@@ -226,7 +371,11 @@ class DataFlowTestCase(TestCase):
             )
             d.clean()
             self.assertEqual(d.source_ports, [], "Cleaning ICMPv4 should clear source_ports")
-            self.assertEqual(d.destination_ports, [type_code], "Cleaning ICMPv4 should keep destination_ports")
+            self.assertEqual(
+                d.destination_ports,
+                [NumericRange(type_code, type_code + 1)],
+                "Cleaning ICMP should keep destination_ports",
+            )
 
         for type_code, description in choices.ICMPv6TypeChoices:
             d = self.model(
@@ -238,7 +387,11 @@ class DataFlowTestCase(TestCase):
             )
             d.clean()
             self.assertEqual(d.source_ports, [], "Cleaning ICMPv4 should clear source_ports")
-            self.assertEqual(d.destination_ports, [type_code], "Cleaning ICMPv4 should keep destination_ports")
+            self.assertEqual(
+                d.destination_ports,
+                [NumericRange(type_code, type_code + 1)],
+                "Cleaning ICMP should keep destination_ports",
+            )
 
 
 class DataFlowGroupTestCase(TestCase):
@@ -260,6 +413,16 @@ class DataFlowGroupTestCase(TestCase):
         self.assertIsInstance(qs, QuerySet)
         self.assertEqual(qs.count(), 5)
 
+    def test_qs_with_inherited_status(self):
+        qs = self.model.objects.with_inherited_status()
+        self.assertIsInstance(qs, QuerySet)
+        for obj in qs:
+            self.assertEqual(obj.inherited_status, obj.effective_status)
+        self.assertEqual(
+            qs.filter(inherited_status=choices.DataFlowInheritedStatusChoices.STATUS_ENABLED).count(),
+            self.model.objects.only_enabled().count(),
+        )
+
     def test_inherited_status(self):
         groups = self.groups
 
@@ -301,3 +464,161 @@ class DataFlowGroupTestCase(TestCase):
 
         self.assertEqual(set(groups[8].inherited_tags), set())
         self.assertEqual(set(groups[9].inherited_tags), set())
+
+    def test_qs_prefetch_inherited_tags(self):
+        expected = {obj.pk: list(obj.inherited_tags) for obj in self.model.objects.all()}
+
+        with self.assertNumQueries(2):
+            objs = list(self.model.objects.prefetch_inherited_tags())
+            for obj in objs:
+                self.assertEqual(obj.inherited_tags, expected[obj.pk])
+
+    def assertClosureIsUpToDate(self):
+        paths = {
+            (ancestor.pk, group.pk, group.level - ancestor.level)
+            for group in self.model.objects.all()
+            for ancestor in group.get_ancestors(include_self=True)
+        }
+        self.assertEqual(set(models.DataFlowGroupClosure.objects.values_list("ancestor", "descendant", "depth")), paths)
+
+    def test_closure_is_maintained(self):
+        groups = self.groups
+        self.assertClosureIsUpToDate()
+
+        group = models.DataFlowGroup.objects.create(name="Group 1.1.1.1", slug="group-1111", parent=groups[2])
+        self.assertClosureIsUpToDate()
+
+        # Move a subtree to another tree, then to the root
+        groups[1].refresh_from_db()
+        groups[1].parent = groups[8]
+        groups[1].save()
+        self.assertClosureIsUpToDate()
+        self.assertEqual(
+            set(models.DataFlowGroupClosure.objects.ancestors(group).values_list("ancestor", flat=True)),
+            {group.pk, groups[2].pk, groups[1].pk, groups[8].pk},
+        )
+
+        groups[1].refresh_from_db()
+        groups[1].parent = None
+        groups[1].save()
+        self.assertClosureIsUpToDate()
+
+        groups[1].refresh_from_db()
+        groups[1].delete()
+        self.assertClosureIsUpToDate()
+
+        models.DataFlowGroupClosure.objects.all().delete()
+        models.DataFlowGroupClosure.objects.rebuild()
+        self.assertClosureIsUpToDate()
+
+    def test_qs_recursive_filters_query_count(self):
+        with self.assertNumQueries(1):
+            list(models.DataFlow.objects.part_of_group_recursive(*self.groups[:5]))
+        with self.assertNumQueries(1):
+            list(self.model.objects.only_disabled())
+
+
+class DataFlowRuleTestCase(TestCase):
+    model = models.DataFlowRule
+
+    @classmethod
+    def setUpTestData(cls):
+        data = TestData()
+        data.dataflows
+
+    def get_rules(self):
+        return set(
+            self.model.objects.values_list(
+                "dataflow",
+                "object_alias",
+                "direction",
+                "start_address",
+                "end_address",
+                "protocol",
+                "port_min",
+                "port_max",
+            )
+        )
+
+    def assertRulesAreUpToDate(self):
+        rules = self.get_rules()
+        self.model.objects.rebuild()
+        self.assertEqual(rules, self.get_rules())
+
+    def test_rules(self):
+        df = models.DataFlow.objects.get(name="Data Flow 5")
+        sources = {
+            (start, end, port_min, port_max)
+            for start, end, port_min, port_max in df.rules.filter(
+                direction=choices.DataFlowRuleDirectionChoices.DIRECTION_SOURCE
+            ).values_list("start_address", "end_address", "port_min", "port_max")
+        }
+        self.assertEqual(
+            sources,
+            {
+                ("10.0.0.0", "10.0.255.255", 55, 55),
+                ("10.0.0.0", "10.0.255.255", 57, 57),
+                ("10.0.1.10", "10.0.1.49", 55, 55),
+                ("10.0.1.10", "10.0.1.49", 57, 57),
+            },
+        )
+        destinations = df.rules.filter(direction=choices.DataFlowRuleDirectionChoices.DIRECTION_DESTINATION)
+        self.assertEqual(
+            set(destinations.values_list("start_address", "port_min", "port_max")),
+            {(ip, 81, 82) for ip in ("10.0.1.1", "10.0.1.2", "10.0.2.1", "10.0.2.2")},
+        )
+        self.assertEqual(set(df.rules.values_list("protocol", flat=True)), {df.protocol})
+
+        any_port = models.DataFlow.objects.filter(source_ports__isnull=True).exclude(rules=None).first()
+        self.assertFalse(any_port.rules.filter(port_min__isnull=False, direction="source").exists())
+
+        self.assertEqual(
+            set(self.model.objects.only_enabled().values_list("dataflow__effective_status", flat=True)),
+            {choices.DataFlowInheritedStatusChoices.STATUS_ENABLED},
+        )
+
+    def test_rules_are_maintained(self):
+        self.assertRulesAreUpToDate()
+
+        df = models.DataFlow.objects.get(name="Data Flow 5")
+        aliases = models.ObjectAlias.objects.all()
+
+        df.destination_ports = [443]
+        df.save()
+        self.assertRulesAreUpToDate()
+        self.assertEqual(set(df.rules.filter(direction="destination").values_list("port_min", flat=True)), {443})
+
+        df.sources.add(aliases[6])
+        self.assertRulesAreUpToDate()
+        df.destinations.clear()
+        self.assertRulesAreUpToDate()
+        self.assertFalse(df.rules.filter(direction="destination").exists())
+
+        aliases[6].dataflow_destinations.add(df)
+        self.assertRulesAreUpToDate()
+        aliases[2].dataflow_sources.clear()
+        self.assertRulesAreUpToDate()
+
+        aliases[6].ip_addresses.add(ipam.IPAddress.objects.get(address="10.100.1.1/24"))
+        self.assertRulesAreUpToDate()
+        aliases[6].prefixes.add(ipam.Prefix.objects.get(prefix="10.0.2.0/24"))
+        self.assertRulesAreUpToDate()
+
+        prefix = ipam.Prefix.objects.get(prefix="10.0.2.0/24")
+        prefix.prefix = IPNetwork("10.0.4.0/24")
+        prefix.save()
+        self.assertRulesAreUpToDate()
+        self.assertTrue(df.rules.filter(start_address="10.0.4.0", end_address="10.0.4.255").exists())
+
+        prefix.data_flow_object_aliases.clear()
+        self.assertRulesAreUpToDate()
+
+        ipam.IPAddress.objects.get(address="10.100.1.1/24").delete()
+        self.assertRulesAreUpToDate()
+        ipam.IPRange.objects.all().delete()
+        self.assertRulesAreUpToDate()
+
+        aliases[6].delete()
+        self.assertRulesAreUpToDate()
+        df.delete()
+        self.assertRulesAreUpToDate()
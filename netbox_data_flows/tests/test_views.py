@@ -1,14 +1,25 @@
+from urllib.parse import urlencode
+
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from core.models import ObjectType
 from users.models import ObjectPermission
-from utilities.testing import ViewTestCases, create_tags, post_data
+from utilities.testing import TestCase, ViewTestCases, create_tags, post_data
 
+from dcim import models as dcim
 from ipam import models as ipam
+from virtualization import models as virtualization
 
 from netbox_data_flows import choices, models
+from netbox_data_flows.utils.ports import normalize_port_ranges, port_ranges_to_string
+from netbox_data_flows.utils.reachability import get_policy_generation
+from netbox_data_flows.views.dataflows import _get_target_pks
+from netbox_data_flows.views.model_tabs import _count_related_aliases_or_dataflows
 
 from .data import TestData
 
@@ -230,8 +241,8 @@ class DataFlowTestCase(PluginUrlBase, ViewTestCases.PrimaryObjectViewTestCase):
             "group": groups[0].pk,
             "status": choices.DataFlowStatusChoices.STATUS_ENABLED,
             "protocol": choices.DataFlowProtocolChoices.PROTOCOL_TCP,
-            "source_ports": "81,82,83",
-            "destination_ports": "181,182,183",
+            "source_ports": "81-83",
+            "destination_ports": "181-183,443",
             "sources": [a.pk for a in aliases[0:2]],
             "destinations": [a.pk for a in aliases[3:5]],
             "comments": "Some comments",
@@ -286,11 +297,89 @@ class DataFlowTestCase(PluginUrlBase, ViewTestCases.PrimaryObjectViewTestCase):
             "status": choices.DataFlowStatusChoices.STATUS_DISABLED,
             "protocol": choices.DataFlowProtocolChoices.PROTOCOL_TCP_UDP,
             "source_ports": "66,666,1666",
-            "destination_ports": "33,333,334,335,1333",
+            "destination_ports": "33,333-335,1333",
             "sources": [a.pk for a in aliases[5:7]],
             "destinations": [a.pk for a in aliases[0:3]],
         }
 
+    def _count_list_queries(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self._get_url("list", query=query))
+        self.assertHttpStatus(response, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_and_export_query_count(self):
+        self.add_permissions("netbox_data_flows.view_dataflow")
+        queries = (
+            {"per_page": 1000},
+            {"export": "table"},
+            # All the columns
+            {"export": ""},
+        )
+
+        TestData().add_dataflows(2)
+        expected = [self._count_list_queries(query) for query in queries]
+
+        TestData().add_dataflows(20)
+        self.assertEqual([self._count_list_queries(query) for query in queries], expected)
+
+    def test_targets(self):
+        self.add_permissions(
+            "netbox_data_flows.view_dataflow", "ipam.view_prefix", "ipam.view_iprange", "ipam.view_ipaddress"
+        )
+        cache.clear()
+        dataflow = models.DataFlow.objects.get(name="Data Flow 8")
+
+        response = self.client.get(self._get_url("targets", dataflow))
+        self.assertHttpStatus(response, 200)
+        url = reverse("plugins:netbox_data_flows:dataflow_targets_table")
+
+        for direction in ("sources", "destinations"):
+            aliases = getattr(dataflow, direction).all()
+            for field_name, model in (
+                ("prefixes", ipam.Prefix),
+                ("ip_ranges", ipam.IPRange),
+                ("ip_addresses", ipam.IPAddress),
+            ):
+                params = {"dataflow_id": dataflow.pk, "direction": direction, "field_name": field_name}
+                self.assertIn(urlencode(params).replace("&", "&amp;"), response.content.decode())
+
+                table_response = self.client.get(url, {**params, "per_page": 1000})
+                self.assertHttpStatus(table_response, 200)
+                expected = model.objects.filter(data_flow_object_aliases__in=aliases).distinct()
+                self.assertEqual(table_response.content.decode().count('class="htmx-container'), 1)
+                for obj in expected:
+                    self.assertIn(obj.get_absolute_url(), table_response.content.decode())
+
+        for params in (
+            {"dataflow_id": dataflow.pk, "direction": "sources", "field_name": "tags"},
+            {"dataflow_id": "", "direction": "sources", "field_name": "prefixes"},
+        ):
+            self.assertHttpStatus(self.client.get(url, params), 404)
+
+    def test_targets_query_count(self):
+        cache.clear()
+        dataflow = models.DataFlow.objects.get(name="Data Flow 8")
+        get_policy_generation()
+
+        # All the targets in one query, then none while the policy is unchanged
+        with self.assertNumQueries(1):
+            targets = _get_target_pks(dataflow)
+        self.assertEqual(
+            targets["destinations", "prefixes"],
+            set(
+                ipam.Prefix.objects.filter(data_flow_object_aliases__in=dataflow.destinations.all()).values_list(
+                    "pk", flat=True
+                )
+            ),
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(_get_target_pks(dataflow), targets)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dataflow.destinations.clear()
+        self.assertEqual(_get_target_pks(dataflow)["destinations", "prefixes"], set())
+
     @override_settings(EXEMPT_VIEW_PERMISSIONS=["*"], EXEMPT_EXCLUDE_MODELS=[])
     def test_edit_hyphen_ports(self):
         instance = models.DataFlow.objects.first()
@@ -302,12 +391,12 @@ class DataFlowTestCase(PluginUrlBase, ViewTestCases.PrimaryObjectViewTestCase):
         obj_perm.object_types.add(ObjectType.objects.get_for_model(self.model))
 
         form_data = dict(**self.form_data)
-        form_data["source_ports"] = "10-15,20-21"
+        form_data["source_ports"] = "20-21,10-15,13"
         form_data["destination_ports"] = "99,100-103"
 
         changelog_data = dict(**self.form_data)
-        changelog_data["source_ports"] = "10,11,12,13,14,15,20,21"
-        changelog_data["destination_ports"] = "99,100,101,102,103"
+        changelog_data["source_ports"] = "10-15,20-21"
+        changelog_data["destination_ports"] = "99-103"
 
         # Try POST with model-level permission
         request = {
@@ -362,8 +451,8 @@ class DataFlowTestCase(PluginUrlBase, ViewTestCases.PrimaryObjectViewTestCase):
         bulk_edit_data["destination_ports"] = "99,100-103"
 
         changelog_data = dict(**self.bulk_edit_data)
-        changelog_data["source_ports"] = "10,11,12,13,14,15,20,21"
-        changelog_data["destination_ports"] = "99,100,101,102,103"
+        changelog_data["source_ports"] = "10-15,20-21"
+        changelog_data["destination_ports"] = "99-103"
 
         # Append the form data to the request
         data.update(post_data(bulk_edit_data))
@@ -388,10 +477,10 @@ class ICMPDataFlowTestCase(PluginUrlBase, ViewTestCases.PrimaryObjectViewTestCas
         if "source_ports" in data:
             data["source_ports"] = ""
         if "icmpv4_types" in data:
-            data["destination_ports"] = ",".join(str(t) for t in data["icmpv4_types"])
+            data["destination_ports"] = port_ranges_to_string(normalize_port_ranges(data["icmpv4_types"]), ",")
             data["icmpv4_types"] = ""
         if "icmpv6_types" in data:
-            data["destination_ports"] = ",".join(str(t) for t in data["icmpv6_types"])
+            data["destination_ports"] = port_ranges_to_string(normalize_port_ranges(data["icmpv6_types"]), ",")
             data["icmpv6_types"] = ""
         return super().assertInstanceEqual(instance, data, *args, **kwargs)
 
@@ -480,7 +569,9 @@ class ICMPDataFlowTestCase(PluginUrlBase, ViewTestCases.PrimaryObjectViewTestCas
             "status": choices.DataFlowStatusChoices.STATUS_DISABLED,
             "protocol": choices.DataFlowProtocolChoices.PROTOCOL_ICMPv6,
             "source_ports": "555",
-            "destination_ports": ",".join(str(t) for t, _ in choices.ICMPv6TypeChoices),
+            "destination_ports": port_ranges_to_string(
+                normalize_port_ranges([t for t, _ in choices.ICMPv6TypeChoices]), ","
+            ),
             "sources": [a.pk for a in aliases[5:7]],
             "destinations": [a.pk for a in aliases[0:3]],
         }
@@ -558,3 +649,62 @@ class ObjectAliasTestCase(PluginUrlBase, ViewTestCases.PrimaryObjectViewTestCase
             "ip_ranges": ip_ranges,
             "ip_addresses": [ip_addresses[1]],
         }
+
+
+class DataFlowTabTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        TestData().dataflows
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_badge(self):
+        for model in (dcim.Device, virtualization.VirtualMachine, ipam.IPAddress, ipam.IPRange, ipam.Prefix):
+            for obj in model.objects.all():
+                if models.ObjectAlias.objects.contains(obj).exists():
+                    expected = str(models.DataFlow.objects.sources_or_destinations(obj).count())
+                else:
+                    expected = 0
+                self.assertEqual(_count_related_aliases_or_dataflows(obj), expected, obj)
+
+    def test_badge_cache(self):
+        device = dcim.Device.objects.get(name="Device 1")
+        get_policy_generation()
+
+        with self.assertNumQueries(1):
+            badge = _count_related_aliases_or_dataflows(device)
+        with self.assertNumQueries(0):
+            self.assertEqual(_count_related_aliases_or_dataflows(device), badge)
+
+        # Any change of the data flows invalidates the cached badges
+        with self.captureOnCommitCallbacks(execute=True):
+            dataflow = models.DataFlow.objects.create(name="New", protocol=choices.DataFlowProtocolChoices.PROTOCOL_TCP)
+            dataflow.sources.set(models.ObjectAlias.objects.contains(device))
+        self.assertEqual(_count_related_aliases_or_dataflows(device), str(int(badge) + 1))
+
+    def test_tab(self):
+        self.add_permissions(
+            "dcim.view_device", "netbox_data_flows.view_dataflow", "netbox_data_flows.view_objectalias"
+        )
+        device = dcim.Device.objects.get(name="Device 1")
+
+        # The tables are loaded separately, from the filtered lists
+        response = self.client.get(reverse("dcim:device_dataflows-tab", kwargs={"pk": device.pk}))
+        self.assertHttpStatus(response, 200)
+        content = response.content.decode()
+        for viewname, filter_name in (
+            ("objectalias_list", "devices"),
+            ("dataflow_list", "source_devices"),
+            ("dataflow_list", "destination_devices"),
+        ):
+            url = reverse(f"plugins:netbox_data_flows:{viewname}")
+            self.assertIn(f"{url}?embedded=True&{filter_name}={device.pk}&amp;", content)
+
+        response = self.client.get(
+            reverse("plugins:netbox_data_flows:dataflow_list"), {"embedded": True, "source_devices": device.pk}
+        )
+        self.assertHttpStatus(response, 200)
+        for dataflow in models.DataFlow.objects.sources(device):
+            self.assertIn(dataflow.get_absolute_url(), response.content.decode())
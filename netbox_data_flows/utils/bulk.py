@@ -0,0 +1,184 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.choices import ObjectChangeActionChoices
+from core.events import OBJECT_CREATED, OBJECT_UPDATED
+from core.models import ObjectChange
+from extras.events import enqueue_event
+from extras.models import Notification, Subscription, Tag, TaggedItem
+from netbox.context import current_request, events_queue
+from netbox.search.backends import search_backend
+from utilities.exceptions import AbortRequest
+
+from netbox_data_flows.models import DataFlow, DataFlowEffectiveTag, DataFlowRule
+from netbox_data_flows.utils.reachability import bump_policy_generation
+
+__all__ = ("bulk_save_dataflows",)
+
+BULK_BATCH_SIZE = 1000
+
+# The many-to-many fields written by bulk_save_dataflows(), besides the tags
+DATAFLOW_TARGET_FIELDS = ("sources", "destinations")
+
+
+def _replace_m2m(field, values, existing_pks):
+    """Replace the related objects of a many-to-many field, given as {pk: [related objects]}."""
+    through = field.remote_field.through
+    column, reverse_column = field.m2m_column_name(), field.m2m_reverse_name()
+
+    if replaced := [pk for pk in values if pk in existing_pks]:
+        through.objects.filter(**{f"{column}__in": replaced}).delete()
+    through.objects.bulk_create(
+        (through(**{column: pk, reverse_column: obj.pk}) for pk, objs in values.items() for obj in objs),
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def _validate_tags(values):
+    """Check that no tag is restricted to other object types, as NetBox does when tags are assigned."""
+    content_type = ContentType.objects.get_for_model(DataFlow)
+    tag_ids = {tag.pk for tags in values.values() for tag in tags}
+    for tag in Tag.objects.filter(pk__in=tag_ids, object_types__isnull=False).exclude(object_types=content_type):
+        raise AbortRequest(f"Tag {tag} cannot be assigned to {content_type.model} objects.")
+
+
+def _replace_tags(values, existing_pks):
+    """Replace the tags of the data flows, given as {pk: [tags]}."""
+    content_type = ContentType.objects.get_for_model(DataFlow)
+
+    if replaced := [pk for pk in values if pk in existing_pks]:
+        TaggedItem.objects.filter(content_type=content_type, object_id__in=replaced).delete()
+    TaggedItem.objects.bulk_create(
+        (TaggedItem(content_type=content_type, object_id=pk, tag=tag) for pk, tags in values.items() for tag in tags),
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def _log_changes(saved, dataflows, existing_pks, request):
+    """Record the changes in the change log and enqueue their events, as NetBox does for each save."""
+    changes = []
+    queue = events_queue.get()
+    for dataflow, original in zip(saved, dataflows):
+        # The saved data flows are fetched again, with their targets and tags
+        dataflow._changelog_message = original._changelog_message
+        if dataflow.pk in existing_pks:
+            dataflow._prechange_snapshot = getattr(original, "_prechange_snapshot", None)
+            action, event_type = ObjectChangeActionChoices.ACTION_UPDATE, OBJECT_UPDATED
+        else:
+            action, event_type = ObjectChangeActionChoices.ACTION_CREATE, OBJECT_CREATED
+
+        objectchange = dataflow.to_objectchange(action)
+        if objectchange.has_changes:
+            objectchange.user = request.user
+            objectchange.user_name = request.user.username
+            objectchange.request_id = request.id
+            changes.append(objectchange)
+
+        enqueue_event(queue, dataflow, request, event_type)
+
+    events_queue.set(queue)
+    ObjectChange.objects.bulk_create(changes, batch_size=BULK_BATCH_SIZE)
+
+
+def _notify_subscribers(dataflows):
+    """Notify the users subscribed to the updated data flows, as NetBox does for each save."""
+    content_type = ContentType.objects.get_for_model(DataFlow)
+    subscriptions = Subscription.objects.filter(
+        object_type=content_type,
+        object_id__in=[dataflow.pk for dataflow in dataflows],
+    ).values_list("object_id", "user")
+    if not subscriptions:
+        return
+
+    users = {}
+    for pk, user_id in subscriptions:
+        users.setdefault(pk, []).append(user_id)
+
+    # Replace the existing notifications of the subscribers
+    Notification.objects.filter(
+        Q(*(Q(object_id=pk, user__in=user_ids) for pk, user_ids in users.items()), _connector=Q.OR),
+        object_type=content_type,
+    ).delete()
+    Notification.objects.bulk_create(
+        (
+            Notification(
+                user_id=user_id,
+                object=dataflow,
+                object_repr=Notification.get_object_repr(dataflow),
+                event_type=OBJECT_UPDATED,
+            )
+            for dataflow in dataflows
+            for user_id in users.get(dataflow.pk, ())
+        ),
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def bulk_save_dataflows(dataflows, related=None, request=None):
+    """
+    Create or update data flows with set-based writes, in a number of queries independent of their number.
+
+    dataflows: new or existing DataFlow instances, already validated. Take the snapshot() of the existing ones
+        before modifying them, for the change log.
+    related: for each data flow, a dictionary of its new "sources", "destinations" and "tags".
+        A missing key leaves the current ones unchanged.
+    request: the request recorded in the change log and the events, by default the current one.
+        Like a save, nothing is recorded outside of a request.
+
+    The expanded rules, the effective tags, the search cache, the compiled policy and the notifications of
+    the subscribers are updated as on save. Like on assignment, raise AbortRequest if a tag is restricted to
+    other object types.
+    Return the saved data flows, with their targets and tags prefetched.
+    """
+    if related is None:
+        related = [{}] * len(dataflows)
+    if request is None:
+        request = current_request.get()
+
+    now = timezone.now()
+    created, updated = [], []
+    for dataflow in dataflows:
+        dataflow.update_computed_fields()
+        if dataflow.pk is None:
+            created.append(dataflow)
+        else:
+            dataflow.last_updated = now
+            updated.append(dataflow)
+
+    existing_pks = {dataflow.pk for dataflow in updated}
+    if tags := {i: objs["tags"] for i, objs in enumerate(related) if "tags" in objs}:
+        _validate_tags(tags)
+
+    with transaction.atomic(using=DataFlow.objects.db):
+        DataFlow.objects.bulk_create(created, batch_size=BULK_BATCH_SIZE)
+        if updated:
+            fields = [field.name for field in DataFlow._meta.concrete_fields if field.name not in ("id", "created")]
+            DataFlow.objects.bulk_update(updated, fields, batch_size=BULK_BATCH_SIZE)
+
+        for field_name in DATAFLOW_TARGET_FIELDS:
+            values = {df.pk: objs[field_name] for df, objs in zip(dataflows, related) if field_name in objs}
+            if values:
+                _replace_m2m(DataFlow._meta.get_field(field_name), values, existing_pks)
+        if tags := {df.pk: objs["tags"] for df, objs in zip(dataflows, related) if "tags" in objs}:
+            _replace_tags(tags, existing_pks)
+
+        pks = [dataflow.pk for dataflow in dataflows]
+        DataFlowRule.objects.rebuild(pks)
+        DataFlowEffectiveTag.objects.rebuild(pks)
+        transaction.on_commit(bump_policy_generation)
+
+        saved = DataFlow.objects.filter(pk__in=pks).prefetch_related(*DATAFLOW_TARGET_FIELDS, "tags").in_bulk()
+        saved = [saved[pk] for pk in pks]
+        if request is not None:
+            _log_changes(saved, dataflows, existing_pks, request)
+        if updated:
+            _notify_subscribers([df for df in saved if df.pk in existing_pks])
+
+    if created:
+        search_backend.cache([df for df in saved if df.pk not in existing_pks], remove_existing=False)
+    if updated:
+        search_backend.cache([df for df in saved if df.pk in existing_pks])
+
+    return saved
@@ -0,0 +1,343 @@
+import json
+import unicodedata
+from collections import namedtuple
+from itertools import groupby
+
+import netaddr
+
+from netbox_data_flows import choices
+from netbox_data_flows.models import DataFlow, DataFlowRule
+from netbox_data_flows.utils.helpers import m2m_exists
+from netbox_data_flows.utils.ports import get_port_bounds
+
+__all__ = (
+    "EXPORT_CHAIN",
+    "ExportedDataFlow",
+    "export_dataflows",
+    "iter_exported_dataflows",
+)
+
+EXPORT_CHAIN = "NETBOX_DATA_FLOWS"
+
+# Number of ports per iptables multiport match, where a range counts as 2 (the maximum is 15)
+IPTABLES_MULTIPORT_MAX = 14
+
+# Maximum length of the rule comments, in bytes
+NFTABLES_COMMENT_MAX = 128
+IPTABLES_COMMENT_MAX = 255
+
+# sources and destinations: sorted (first, last) netaddr.IPAddress, or None for any address
+# source_ports and destination_ports: sorted (first, last) ports, or None for any port
+ExportedDataFlow = namedtuple(
+    "ExportedDataFlow",
+    ("pk", "name", "protocol", "sources", "destinations", "source_ports", "destination_ports"),
+)
+
+
+def _get_port_bounds(port_ranges):
+    if not port_ranges:
+        return None
+    return [get_port_bounds(port_range) for port_range in port_ranges]
+
+
+def iter_exported_dataflows(queryset=None, chunk_size=2000):
+    """
+    Iterate over the enabled data flows of the queryset, with their addresses expanded from the rules.
+
+    The data flows and their rules are read in two server-side cursors, sorted by data flow,
+    so that the whole policy is never loaded in memory.
+    """
+    if queryset is None:
+        queryset = DataFlow.objects.all()
+
+    dataflows = (
+        queryset.only_enabled()
+        .annotate(
+            has_sources=m2m_exists(DataFlow, "sources"),
+            has_destinations=m2m_exists(DataFlow, "destinations"),
+        )
+        .order_by("pk")
+        .values_list("pk", "name", "protocol", "source_ports", "destination_ports", "has_sources", "has_destinations")
+    )
+    rules = (
+        DataFlowRule.objects.filter(dataflow__in=dataflows.values("pk"))
+        .order_by("dataflow_id", "direction", "start_address", "end_address")
+        .values_list("dataflow_id", "direction", "start_address", "end_address")
+        .distinct()
+    )
+
+    rules_by_dataflow = groupby(rules.iterator(chunk_size=chunk_size), key=lambda rule: rule[0])
+    next_rules = next(rules_by_dataflow, None)
+    for pk, name, protocol, source_ports, destination_ports, has_sources, has_destinations in dataflows.iterator(
+        chunk_size=chunk_size
+    ):
+        targets = {
+            choices.DataFlowRuleDirectionChoices.DIRECTION_SOURCE: [] if has_sources else None,
+            choices.DataFlowRuleDirectionChoices.DIRECTION_DESTINATION: [] if has_destinations else None,
+        }
+
+        while next_rules is not None and next_rules[0] < pk:
+            next_rules = next(rules_by_dataflow, None)
+        if next_rules is not None and next_rules[0] == pk:
+            for _, direction, start_address, end_address in next_rules[1]:
+                targets[direction].append((netaddr.IPAddress(start_address), netaddr.IPAddress(end_address)))
+            next_rules = next(rules_by_dataflow, None)
+
+        yield ExportedDataFlow(
+            pk=pk,
+            name=name,
+            protocol=protocol,
+            sources=targets[choices.DataFlowRuleDirectionChoices.DIRECTION_SOURCE],
+            destinations=targets[choices.DataFlowRuleDirectionChoices.DIRECTION_DESTINATION],
+            source_ports=_get_port_bounds(source_ports),
+            destination_ports=_get_port_bounds(destination_ports),
+        )
+
+
+#
+# Helpers
+#
+
+
+def _get_families(dataflow):
+    """Return the IP versions the data flow applies to."""
+    Protocols = choices.DataFlowProtocolChoices
+
+    families = {4, 6}
+    for targets in (dataflow.sources, dataflow.destinations):
+        if targets is not None:
+            families &= {first.version for first, _ in targets}
+    if dataflow.protocol == Protocols.PROTOCOL_ICMPv4:
+        families &= {4}
+    elif dataflow.protocol == Protocols.PROTOCOL_ICMPv6:
+        families &= {6}
+
+    return families
+
+
+def _get_cidr(first, last):
+    """Return the address or the network matching the address range exactly, or None."""
+    if first == last:
+        return str(first)
+
+    cidrs = netaddr.iprange_to_cidrs(first, last)
+    return str(cidrs[0]) if len(cidrs) == 1 else None
+
+
+def _filter_family(targets, family):
+    if targets is None:
+        return None
+    return [(first, last) for first, last in targets if first.version == family]
+
+
+def _get_comment(dataflow, max_length):
+    """
+    Return the name of the data flow as a rule comment, of at most max_length bytes in UTF-8.
+
+    The comments are quoted on a single line: the control characters would start a new rule and
+    neither nftables nor iptables comments can contain double quotes or backslashes.
+    """
+    comment = "".join(
+        " " if unicodedata.category(char).startswith("C") else char
+        for char in dataflow.name.replace('"', "'").replace("\\", "/")
+    )
+    return comment.encode()[:max_length].decode(errors="ignore")
+
+
+#
+# Formats
+#
+
+
+def _export_json(dataflows):
+    """One JSON object per line (NDJSON), with the addresses as CIDR networks."""
+
+    def cidrs(targets):
+        if targets is None:
+            return None
+        return [str(cidr) for first, last in targets for cidr in netaddr.iprange_to_cidrs(first, last)]
+
+    for dataflow in dataflows:
+        yield json.dumps(
+            {
+                "id": dataflow.pk,
+                "name": dataflow.name,
+                "protocol": dataflow.protocol,
+                "sources": cidrs(dataflow.sources),
+                "destinations": cidrs(dataflow.destinations),
+                "source_ports": dataflow.source_ports,
+                "destination_ports": dataflow.destination_ports,
+            }
+        ) + "\n"
+
+
+def _nftables_set(values):
+    return "{ " + ", ".join(values) + " }"
+
+
+def _nftables_addresses(targets):
+    return _nftables_set(_get_cidr(first, last) or f"{first}-{last}" for first, last in targets)
+
+
+def _nftables_ports(ports):
+    return _nftables_set(str(first) if first == last else f"{first}-{last}" for first, last in ports)
+
+
+def _nftables_protocol(dataflow):
+    Protocols = choices.DataFlowProtocolChoices
+    statements = []
+
+    if dataflow.protocol in (Protocols.PROTOCOL_ICMPv4, Protocols.PROTOCOL_ICMPv6):
+        header = "icmp" if dataflow.protocol == Protocols.PROTOCOL_ICMPv4 else "icmpv6"
+        if dataflow.destination_ports:
+            statements.append(f"{header} type {_nftables_ports(dataflow.destination_ports)}")
+        else:
+            statements.append(f"meta l4proto {'icmp' if header == 'icmp' else 'ipv6-icmp'}")
+    elif dataflow.protocol != Protocols.PROTOCOL_ANY:
+        if dataflow.protocol == Protocols.PROTOCOL_TCP_UDP:
+            header = "th"
+            statements.append("meta l4proto { tcp, udp }")
+        else:
+            header = dataflow.protocol
+            if not dataflow.source_ports and not dataflow.destination_ports:
+                statements.append(f"meta l4proto {dataflow.protocol}")
+        if dataflow.source_ports:
+            statements.append(f"{header} sport {_nftables_ports(dataflow.source_ports)}")
+        if dataflow.destination_ports:
+            statements.append(f"{header} dport {_nftables_ports(dataflow.destination_ports)}")
+
+    return statements
+
+
+def _export_nftables(dataflows):
+    """A chain of an inet table, with one rule per data flow and IP version, to load with `nft -f`."""
+    yield "table inet netbox_data_flows {\n"
+    yield f"    chain {EXPORT_CHAIN.lower()} {{\n"
+
+    for dataflow in dataflows:
+        families = sorted(_get_families(dataflow))
+        if families and dataflow.sources is None and dataflow.destinations is None:
+            # A single rule without any address
+            families = [None]
+
+        protocol = _nftables_protocol(dataflow)
+        for family in families:
+            statements = []
+            if family is not None:
+                header = "ip" if family == 4 else "ip6"
+                sources = _filter_family(dataflow.sources, family)
+                destinations = _filter_family(dataflow.destinations, family)
+                if sources is not None:
+                    statements.append(f"{header} saddr {_nftables_addresses(sources)}")
+                if destinations is not None:
+                    statements.append(f"{header} daddr {_nftables_addresses(destinations)}")
+
+            statements += protocol
+            statements.append(f'accept comment "{_get_comment(dataflow, NFTABLES_COMMENT_MAX)}"')
+            yield "        " + " ".join(statements) + "\n"
+
+    yield "    }\n"
+    yield "}\n"
+
+
+def _iptables_addresses(targets, option):
+    """Return the iptables matches of each address range, or [""] for any address."""
+    if targets is None:
+        return [""]
+
+    matches = []
+    for first, last in targets:
+        cidr = _get_cidr(first, last)
+        if cidr:
+            matches.append(f"-{option[0]} {cidr}")
+        else:
+            matches.append(f"-m iprange --{option}-range {first}-{last}")
+    return matches
+
+
+def _iptables_ports(ports, option):
+    """Return the multiport matches of the port ranges, or [""] for any port."""
+    if not ports:
+        return [""]
+
+    chunks = [[]]
+    size = 0
+    for first, last in ports:
+        port_size = 1 if first == last else 2
+        if size + port_size > IPTABLES_MULTIPORT_MAX:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(str(first) if first == last else f"{first}:{last}")
+        size += port_size
+
+    return [f"-m multiport --{option} {','.join(chunk)}" for chunk in chunks]
+
+
+def _iptables_protocols(dataflow, family):
+    """Return the protocol and port matches of the data flow."""
+    Protocols = choices.DataFlowProtocolChoices
+
+    if dataflow.protocol == Protocols.PROTOCOL_ANY:
+        return [""]
+
+    if dataflow.protocol in (Protocols.PROTOCOL_ICMPv4, Protocols.PROTOCOL_ICMPv6):
+        protocol, option = ("icmp", "icmp-type") if family == 4 else ("ipv6-icmp", "icmpv6-type")
+        if not dataflow.destination_ports:
+            return [f"-p {protocol}"]
+        return [
+            f"-p {protocol} --{option} {icmp_type}"
+            for first, last in dataflow.destination_ports
+            for icmp_type in range(first, last + 1)
+        ]
+
+    if dataflow.protocol == Protocols.PROTOCOL_TCP_UDP:
+        protocols = (Protocols.PROTOCOL_TCP, Protocols.PROTOCOL_UDP)
+    else:
+        protocols = (dataflow.protocol,)
+
+    return [
+        " ".join(filter(None, (f"-p {protocol}", source_ports, destination_ports)))
+        for protocol in protocols
+        for source_ports in _iptables_ports(dataflow.source_ports, "sports")
+        for destination_ports in _iptables_ports(dataflow.destination_ports, "dports")
+    ]
+
+
+def _export_iptables(dataflows, family=4):
+    """A chain of the filter table, to load with `iptables-restore` (or `ip6tables-restore` for IPv6)."""
+    yield "*filter\n"
+    yield f":{EXPORT_CHAIN} - [0:0]\n"
+
+    for dataflow in dataflows:
+        if family not in _get_families(dataflow):
+            continue
+
+        comment = f'-m comment --comment "{_get_comment(dataflow, IPTABLES_COMMENT_MAX)}"'
+        for source in _iptables_addresses(_filter_family(dataflow.sources, family), "src"):
+            for destination in _iptables_addresses(_filter_family(dataflow.destinations, family), "dst"):
+                for protocol in _iptables_protocols(dataflow, family):
+                    rule = (f"-A {EXPORT_CHAIN}", source, destination, protocol, comment, "-j ACCEPT")
+                    yield " ".join(filter(None, rule)) + "\n"
+
+    yield "COMMIT\n"
+
+
+def _export_ip6tables(dataflows):
+    return _export_iptables(dataflows, family=6)
+
+
+EXPORTERS = {
+    choices.FirewallExportFormatChoices.FORMAT_NFTABLES: _export_nftables,
+    choices.FirewallExportFormatChoices.FORMAT_IPTABLES: _export_iptables,
+    choices.FirewallExportFormatChoices.FORMAT_IP6TABLES: _export_ip6tables,
+    choices.FirewallExportFormatChoices.FORMAT_JSON: _export_json,
+}
+
+
+def export_dataflows(export_format, queryset=None, chunk_size=2000):
+    """
+    Generate the firewall rules of the enabled data flows of the queryset, line by line.
+
+    The export format is one of FirewallExportFormatChoices.
+    """
+    return EXPORTERS[export_format](iter_exported_dataflows(queryset, chunk_size=chunk_size))
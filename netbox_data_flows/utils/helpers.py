@@ -1,7 +1,10 @@
-from django.db.models import Q
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Exists, OuterRef, Q
 from django.utils.html import format_html_join
 
-from core.models import ObjectType
+from netbox.context import query_cache
 
 from ipam.models import IPAddress
 
@@ -21,27 +24,63 @@ def object_list_to_string(objects, *, linkify=False, default="", separator=", ")
     return separator.join(str(o) for o in objects)
 
 
-def _get_ip_qs(device):
-    """Return a querystring matching any IP assigned to the device."""
-    interfaces = device.interfaces.all()
-    ct = ObjectType.objects.get_for_model(interfaces.model)
+def m2m_exists(model, field_name, targets=None):
+    """
+    Return an EXISTS expression matching the objects related to any of the targets through a many-to-many field.
+
+    Without targets, match the objects related to anything through that field.
+    """
+    field = model._meta.get_field(field_name)
+    filtering = {field.m2m_field_name(): OuterRef("pk")}
+    if targets is not None:
+        filtering[f"{field.m2m_reverse_field_name()}__in"] = targets
+
+    return Exists(field.remote_field.through.objects.filter(**filtering))
+
+
+def _get_ip_qs(*devices):
+    """Return a Q object matching any IP assigned to the devices, with one subquery per interface model."""
+    device_ids = defaultdict(set)
+    for device in devices:
+        device_ids[type(device)].add(device.pk)
 
-    return Q(
-        assigned_object_type=ct.pk,
-        assigned_object_id__in=interfaces,
-    )
+    # ContentType caches the types for the whole process, unlike ObjectType
+    qs = Q(pk__in=[])
+    for model, pks in device_ids.items():
+        interfaces = model.interfaces
+        interface_model = interfaces.rel.related_model
+        qs |= Q(
+            assigned_object_type=ContentType.objects.get_for_model(interface_model).pk,
+            assigned_object_id__in=interface_model.objects.filter(**{f"{interfaces.field.name}__in": pks}).values("pk"),
+        )
+
+    return qs
 
 
 def get_one_device_ipaddresses(device):
     """Return the list of IP addresses of a device or virtual machine."""
-    ip_qs = _get_ip_qs(device)
-    return IPAddress.objects.filter(ip_qs)
+    return get_device_ipaddresses(device)
+
+
+def get_device_ipaddresses(*devices, memoize=False):
+    """
+    Return the list of IP addresses of a list of devices or virtual machines.
+
+    Devices and virtual machines can be mixed: the queryset has one subquery per interface model, whatever the
+    number of devices. With `memoize`, the IP addresses are fetched and returned as a list, which is cached for
+    the rest of the current request.
+    """
+    ip_addresses = IPAddress.objects.filter(_get_ip_qs(*devices))
+    if not memoize:
+        return ip_addresses
 
+    cache = query_cache.get()
+    if cache is None:
+        return list(ip_addresses)
 
-def get_device_ipaddresses(*devices):
-    """Return the list of IP addresses of a list of devices or virtual machines."""
-    qs = Q()
-    for dev in devices:
-        qs |= _get_ip_qs(dev)
+    memo = cache["netbox_data_flows.device_ipaddresses"]
+    key = frozenset((device._meta.label_lower, device.pk) for device in devices)
+    if key not in memo:
+        memo[key] = list(ip_addresses)
 
-    return IPAddress.objects.filter(qs)
+    return memo[key]
@@ -0,0 +1,312 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import chain, islice
+
+import yaml
+from django.core.exceptions import ValidationError
+
+from extras.choices import CustomFieldTypeChoices, CustomFieldUIEditableChoices
+from extras.models import CustomField, Tag
+from netbox.context import query_cache
+from users.models import Owner
+from utilities.exceptions import AbortRequest
+
+from tenancy.models import Tenant
+
+from netbox_data_flows import choices
+from netbox_data_flows.models import Application, DataFlow, DataFlowGroup, ObjectAlias
+from netbox_data_flows.utils.bulk import BULK_BATCH_SIZE, bulk_save_dataflows
+from netbox_data_flows.utils.ports import normalize_port_ranges
+
+__all__ = (
+    "DataFlowImporter",
+    "read_records",
+)
+
+# The foreign keys and many-to-many fields of the records, given by name: (model, lookup field)
+RELATED_FIELDS = {
+    "application": (Application, "name"),
+    "group": (DataFlowGroup, "slug"),
+    "tenant": (Tenant, "name"),
+    "owner": (Owner, "name"),
+}
+MULTIPLE_RELATED_FIELDS = {
+    "sources": (ObjectAlias, "name"),
+    "destinations": (ObjectAlias, "name"),
+    "tags": (Tag, "slug"),
+}
+PORT_FIELDS = ("source_ports", "destination_ports")
+PLAIN_FIELDS = ("name", "description", "status", "protocol", "comments")
+
+# Cached value of the names matching several objects
+AMBIGUOUS = object()
+
+
+#
+# Readers
+#
+
+
+def _read_csv(f):
+    for record in csv.DictReader(f):
+        yield {key.strip(): value for key, value in record.items() if key is not None}
+
+
+def _read_json(f):
+    """A JSON list of objects, read at once, or one JSON object per line (NDJSON), streamed."""
+    head = f.read(1)
+    while head.isspace():
+        head = f.read(1)
+
+    if head == "[":
+        yield from json.loads(head + f.read())
+        return
+
+    for line in chain([head + f.readline()], f):
+        if line.strip():
+            yield json.loads(line)
+
+
+def _read_yaml(f):
+    """Several YAML documents, each an object or a list of objects, streamed by document."""
+    for document in yaml.load_all(f, Loader=yaml.SafeLoader):
+        if isinstance(document, list):
+            yield from document
+        elif isinstance(document, dict):
+            yield document
+        elif document is not None:
+            raise ValueError("Each YAML document must be an object or a list of objects")
+
+
+READERS = {
+    choices.DataFlowImportFormatChoices.FORMAT_CSV: _read_csv,
+    choices.DataFlowImportFormatChoices.FORMAT_JSON: _read_json,
+    choices.DataFlowImportFormatChoices.FORMAT_YAML: _read_yaml,
+}
+
+
+def read_records(f, import_format):
+    """
+    Iterate over the data flow records of a file, as dictionaries.
+
+    The import format is one of DataFlowImportFormatChoices.
+    """
+    return READERS[import_format](f)
+
+
+#
+# Values
+#
+
+
+def _split(value):
+    """Return the names of a list or of a comma-separated string."""
+    if value in (None, ""):
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    elif not isinstance(value, (list, tuple)):
+        value = [value]
+    return [str(name).strip() for name in value if str(name).strip()]
+
+
+def _split_ports(value):
+    if value in (None, ""):
+        return []
+    if isinstance(value, str):
+        return value.split(",")
+    if isinstance(value, (list, tuple)):
+        return value
+    return [value]
+
+
+class DataFlowImporter:
+    """
+    Import data flows from records, in batches written with bulk_save_dataflows().
+
+    The records are dictionaries of the fields of DataFlowImportForm: the application, the tenant
+    and the owner by name, the group by slug, the sources and destinations by object alias name and
+    the tags by slug, and the custom fields as `cf_<name>`. The lists can be comma-separated strings.
+    A record with an `id` updates the fields it contains of that data flow; the custom fields missing
+    from a new data flow take their default value.
+
+    The names referenced by each batch are resolved with one query per model, and cached for the
+    next batches. Each batch is validated as a whole, then written in its own transaction: if any
+    record of a batch is invalid, a ValidationError listing the errors of the batch is raised and
+    the previous batches stay imported.
+    """
+
+    def __init__(self, batch_size=BULK_BATCH_SIZE, request=None):
+        self.batch_size = batch_size
+        self.request = request
+        self.count = 0
+        # {(model, lookup field): {name: object, None or AMBIGUOUS}}
+        self._cache = defaultdict(dict)
+
+    def _resolve(self, records):
+        """Fetch the objects referenced by the records and not cached yet, with one query per model."""
+        names = defaultdict(set)
+        for record in records:
+            for field_name, key in RELATED_FIELDS.items():
+                if record.get(field_name) not in (None, ""):
+                    names[key].add(str(record[field_name]).strip())
+            for field_name, key in MULTIPLE_RELATED_FIELDS.items():
+                names[key].update(_split(record.get(field_name)))
+
+        for (model, lookup), values in names.items():
+            cache = self._cache[model, lookup]
+            if not (missing := values - cache.keys()):
+                continue
+
+            cache.update(dict.fromkeys(missing))
+            for obj in model.objects.filter(**{f"{lookup}__in": missing}):
+                name = getattr(obj, lookup)
+                cache[name] = obj if cache[name] is None else AMBIGUOUS
+
+    def _get(self, key, name):
+        obj = self._cache[key].get(name)
+        model, lookup = key
+        if obj is None:
+            raise ValidationError(f"{model._meta.verbose_name} not found: {lookup}={name}")
+        if obj is AMBIGUOUS:
+            raise ValidationError(f"Several {model._meta.verbose_name_plural} match: {lookup}={name}")
+        return obj
+
+    @staticmethod
+    def _get_custom_fields():
+        # The custom fields editable in the UI, as in the import form
+        return {
+            f"cf_{cf.name}": cf
+            for cf in CustomField.objects.get_for_model(DataFlow)
+            if cf.ui_editable == CustomFieldUIEditableChoices.YES
+        }
+
+    def _build(self, record, dataflow):
+        """Apply a record to a data flow, and return its related objects. Raise a ValidationError."""
+        errors = defaultdict(list)
+        related = {}
+        custom_fields = self._get_custom_fields()
+
+        if dataflow._state.adding:
+            dataflow.custom_field_data = {
+                cf.name: cf.default for cf in custom_fields.values() if cf.default is not None
+            }
+
+        for field_name, value in record.items():
+            try:
+                if field_name == "id":
+                    continue
+                elif field_name in custom_fields:
+                    self._set_custom_field(dataflow, custom_fields[field_name], value)
+                elif field_name in RELATED_FIELDS:
+                    name = str(value).strip() if value is not None else ""
+                    obj = self._get(RELATED_FIELDS[field_name], name) if name else None
+                    setattr(dataflow, field_name, obj)
+                elif field_name in MULTIPLE_RELATED_FIELDS:
+                    key = MULTIPLE_RELATED_FIELDS[field_name]
+                    related[field_name] = [self._get(key, name) for name in _split(value)]
+                elif field_name in PORT_FIELDS:
+                    try:
+                        setattr(dataflow, field_name, normalize_port_ranges(_split_ports(value)))
+                    except ValueError as e:
+                        raise ValidationError(str(e))
+                elif field_name in PLAIN_FIELDS:
+                    setattr(dataflow, field_name, "" if value is None else str(value).strip())
+                else:
+                    raise ValidationError("Unknown field")
+            except ValidationError as e:
+                errors[field_name].extend(e.messages)
+
+        try:
+            # The foreign keys are resolved already: their validation would query each of them again
+            dataflow.full_clean(exclude=RELATED_FIELDS, validate_unique=False, validate_constraints=False)
+        except ValidationError as e:
+            for field_name, messages in e.message_dict.items():
+                errors[field_name].extend(messages)
+
+        if errors:
+            raise ValidationError(errors)
+        return related
+
+    @staticmethod
+    def _set_custom_field(dataflow, cf, value):
+        form_field = cf.to_form_field(set_initial=False, for_csv_import=True)
+        value = form_field.clean(value)
+        if value in form_field.empty_values:
+            dataflow.custom_field_data[cf.name] = None
+            return
+
+        if cf.type == CustomFieldTypeChoices.TYPE_JSON and isinstance(value, str):
+            value = json.loads(value)
+        dataflow.custom_field_data[cf.name] = cf.serialize(value)
+
+    def _import_batch(self, records):
+        for i, record in enumerate(records, start=self.count + 1):
+            if not isinstance(record, dict):
+                raise ValidationError(f"Record {i}: not an object")
+        self._resolve(records)
+
+        ids = {record["id"] for record in records if record.get("id") not in (None, "")}
+        existing = {}
+        if ids:
+            try:
+                ids = {int(pk) for pk in ids}
+            except (TypeError, ValueError):
+                raise ValidationError(f"Invalid ID in records {self.count + 1}-{self.count + len(records)}")
+            existing = (
+                DataFlow.objects.filter(pk__in=ids)
+                .select_related("group")
+                .prefetch_related("sources", "destinations", "tags")
+                .in_bulk()
+            )
+
+        dataflows, related, errors = [], [], []
+        for i, record in enumerate(records, start=self.count + 1):
+            if record.get("id") in (None, ""):
+                dataflow = DataFlow()
+            elif (dataflow := existing.get(int(record["id"]))) is None:
+                errors.append(f"Record {i}: data flow not found: id={record['id']}")
+                continue
+            elif self.request is not None:
+                dataflow.snapshot()
+
+            try:
+                related.append(self._build(record, dataflow))
+                dataflows.append(dataflow)
+            except ValidationError as e:
+                errors.extend(
+                    f"Record {i}: {field_name}: {message}"
+                    for field_name, messages in e.message_dict.items()
+                    for message in messages
+                )
+
+        if errors:
+            raise ValidationError(errors)
+
+        try:
+            bulk_save_dataflows(dataflows, related, request=self.request)
+        except AbortRequest as e:
+            raise ValidationError(f"Records {self.count + 1}-{self.count + len(records)}: {e.message}")
+        self.count += len(records)
+
+    def run(self, records, progress=None):
+        """
+        Import the records, and return the number of data flows created or updated.
+
+        progress: called with the number of data flows imported so far, after each batch.
+        """
+        records = iter(records)
+
+        # Cache the custom fields for the validation of the whole import, as in a request
+        token = query_cache.set(defaultdict(dict)) if query_cache.get() is None else None
+        try:
+            while batch := list(islice(records, self.batch_size)):
+                self._import_batch(batch)
+                if progress is not None:
+                    progress(self.count)
+        finally:
+            if token is not None:
+                query_cache.reset(token)
+
+        return self.count
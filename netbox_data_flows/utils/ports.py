@@ -0,0 +1,129 @@
+from django.contrib.postgres.fields import IntegerRangeField
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.db.models import Func, Value
+from django.db.models.functions import Cast
+
+from netbox_data_flows.constants import DATAFLOW_PORT_MAX, DATAFLOW_PORT_MIN
+
+__all__ = (
+    "AllowedPorts",
+    "PortRanges",
+    "get_port_bounds",
+    "iter_ports",
+    "normalize_port_ranges",
+    "parse_port_range",
+    "port_range_value",
+    "port_ranges_to_string",
+)
+
+
+class PortRanges(Func):
+    """
+    Merge an array of port ranges into a single int4multirange.
+
+    The result can be indexed with GiST and supports the range lookups (contains, overlap...).
+    """
+
+    function = "int4multirange"
+    template = "%(function)s(VARIADIC %(expressions)s)"
+    output_field = IntegerRangeField()
+
+
+class AllowedPorts(Func):
+    """
+    Ports allowed by an array of port ranges, as an int4multirange. No port means all the ports.
+
+    Used by the GiST indexes and the port filters of the data flows, which must share the same expression.
+    """
+
+    template = (
+        "COALESCE(NULLIF(int4multirange(VARIADIC %(expressions)s), '{}'::int4multirange), "
+        f"int4multirange(int4range({DATAFLOW_PORT_MIN}, {DATAFLOW_PORT_MAX + 1})))"
+    )
+    output_field = IntegerRangeField()
+
+
+def port_range_value(port_range):
+    """Return a port range as an int4range expression, to compare it with AllowedPorts."""
+    # Without the cast, PostgreSQL would parse the literal as a multirange
+    return Cast(Value(port_range, output_field=IntegerRangeField()), IntegerRangeField())
+
+
+def get_port_bounds(port_range):
+    """Return the first and last ports of a port range, inclusive."""
+    first = port_range.lower if port_range.lower_inc else port_range.lower + 1
+    last = port_range.upper if port_range.upper_inc else port_range.upper - 1
+    return first, last
+
+
+def parse_port_range(value):
+    """
+    Return the first and last ports of a port range, inclusive.
+
+    The range can be given as a port, a "first-last" string, a (first, last) pair or a NumericRange.
+    Raise ValueError if it is not a valid range of ports.
+    """
+    if isinstance(value, NumericRange):
+        bounds = get_port_bounds(value) if not value.isempty else ()
+    elif isinstance(value, (list, tuple)):
+        bounds = value
+    elif isinstance(value, str):
+        first, _, last = value.strip().partition("-")
+        bounds = (first, last or first)
+    else:
+        bounds = (value, value)
+
+    try:
+        first, last = (int(v) for v in bounds)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid port range: {value}")
+
+    if not DATAFLOW_PORT_MIN <= first <= last <= DATAFLOW_PORT_MAX:
+        raise ValueError(
+            f"Invalid port range: {value}. Ports must be between {DATAFLOW_PORT_MIN} and {DATAFLOW_PORT_MAX}, "
+            "in ascending order."
+        )
+
+    return first, last
+
+
+def normalize_port_ranges(values):
+    """
+    Return ports and port ranges as a sorted list of NumericRange, merging the adjacent and overlapping ones.
+
+    Empty values, meaning any port, are returned unchanged.
+    Raise ValueError if any range is invalid.
+    """
+    if not values:
+        return values
+
+    merged = []
+    for first, last in sorted(parse_port_range(v) for v in values):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+
+    return [NumericRange(first, last + 1, bounds="[)") for first, last in merged]
+
+
+def iter_ports(port_ranges):
+    """Iterate over all the ports of the ranges."""
+    for port_range in port_ranges or ():
+        first, last = get_port_bounds(port_range)
+        yield from range(first, last + 1)
+
+
+def port_ranges_to_string(port_ranges, separator=", "):
+    """
+    Generate a human-friendly string from port ranges.
+
+    Example:
+        [NumericRange(22, 23), NumericRange(80, 91)] => "22, 80-90"
+    """
+    ret = []
+    for port_range in port_ranges or ():
+        first, last = get_port_bounds(port_range)
+        ret.append(str(first) if first == last else f"{first}-{last}")
+
+    return separator.join(ret)
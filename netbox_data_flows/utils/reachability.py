@@ -0,0 +1,269 @@
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+import netaddr
+from django.core.cache import cache
+
+from netbox.plugins import get_plugin_config
+
+from netbox_data_flows import choices
+from netbox_data_flows.models import DataFlow, DataFlowRule
+from netbox_data_flows.utils.helpers import m2m_exists
+from netbox_data_flows.utils.ports import get_port_bounds
+
+__all__ = (
+    "IntervalTree",
+    "ReachabilityIndex",
+    "bump_policy_generation",
+    "get_policy_generation",
+    "get_reachability_index",
+)
+
+POLICY_GENERATION_KEY = "netbox_data_flows:policy_generation"
+POLICY_INDEX_KEY = "netbox_data_flows:policy:{generation}"
+
+
+class IntervalTree:
+    """
+    Static centered interval tree, to find the intervals containing a point in O(log n + k).
+
+    The intervals are (first, last, value) tuples, both bounds included.
+    """
+
+    __slots__ = ("center", "starts", "by_start", "ends", "by_end", "left", "right")
+
+    def __init__(self, intervals):
+        points = sorted(bound for first, last, _ in intervals for bound in (first, last))
+        self.center = points[len(points) // 2] if points else 0
+
+        left, right, here = [], [], []
+        for interval in intervals:
+            if interval[1] < self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        # The intervals containing the center, sorted by first and by last bound
+        here.sort(key=lambda interval: interval[0])
+        self.starts = [first for first, _, _ in here]
+        self.by_start = [value for _, _, value in here]
+        here.sort(key=lambda interval: interval[1])
+        self.ends = [last for _, last, _ in here]
+        self.by_end = [value for _, _, value in here]
+
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def search(self, point):
+        """Return the set of values of the intervals containing the point."""
+        values = set()
+        node = self
+        while node is not None:
+            if point < node.center:
+                last = bisect_right(node.starts, point)
+                values.update(node.by_start[:last])
+                node = node.left
+            elif point > node.center:
+                first = bisect_left(node.ends, point)
+                values.update(node.by_end[first:])
+                node = node.right
+            else:
+                values.update(node.by_start)
+                break
+
+        return values
+
+
+def _compile_ports(port_ranges):
+    """Return the first and last ports of the ranges as two sorted tuples, or None for any port."""
+    if not port_ranges:
+        return None
+
+    bounds = sorted(get_port_bounds(port_range) for port_range in port_ranges)
+    return tuple(first for first, _ in bounds), tuple(last for _, last in bounds)
+
+
+def _port_matches(ports, port):
+    if ports is None or port is None:
+        return True
+
+    firsts, lasts = ports
+    i = bisect_right(firsts, port) - 1
+    return i >= 0 and lasts[i] >= port
+
+
+def _protocol_matches(dataflow_protocol, protocol, version):
+    Protocols = choices.DataFlowProtocolChoices
+
+    # ICMP is specific to the IP version
+    if dataflow_protocol == Protocols.PROTOCOL_ICMPv4 and version != 4:
+        return False
+    if dataflow_protocol == Protocols.PROTOCOL_ICMPv6 and version != 6:
+        return False
+
+    if protocol is None or dataflow_protocol in (Protocols.PROTOCOL_ANY, protocol):
+        return True
+    if dataflow_protocol == Protocols.PROTOCOL_TCP_UDP:
+        return protocol in (Protocols.PROTOCOL_TCP, Protocols.PROTOCOL_UDP)
+
+    return False
+
+
+class ReachabilityIndex:
+    """
+    Compiled index of the enabled data flows, to find the ones permitting some traffic without any query.
+
+    The addresses of the sources and destinations come from the expanded rules of the data flows,
+    in one interval tree per direction and IP version. A data flow without any source (or destination)
+    permits any source (or destination).
+    """
+
+    def __init__(self, dataflows, rules):
+        """
+        Compile the index.
+
+        dataflows: (pk, protocol, source_ports, destination_ports, has_sources, has_destinations) tuples.
+        rules: (dataflow_id, direction, start_address, end_address) tuples.
+        """
+        Directions = choices.DataFlowRuleDirectionChoices
+
+        self.protocols = {}
+        self.ports = {}
+        self.any_targets = {Directions.DIRECTION_SOURCE: set(), Directions.DIRECTION_DESTINATION: set()}
+        for pk, protocol, source_ports, destination_ports, has_sources, has_destinations in dataflows:
+            self.protocols[pk] = protocol
+            self.ports[pk] = (_compile_ports(source_ports), _compile_ports(destination_ports))
+            if not has_sources:
+                self.any_targets[Directions.DIRECTION_SOURCE].add(pk)
+            if not has_destinations:
+                self.any_targets[Directions.DIRECTION_DESTINATION].add(pk)
+
+        intervals = defaultdict(set)
+        for dataflow_id, direction, start_address, end_address in rules:
+            if dataflow_id not in self.protocols:
+                continue
+            start = netaddr.IPAddress(start_address)
+            intervals[direction, start.version].add((int(start), int(netaddr.IPAddress(end_address)), dataflow_id))
+
+        self.trees = {key: IntervalTree(list(values)) for key, values in intervals.items()}
+
+    @classmethod
+    def build(cls):
+        """Compile the index of the data flows currently enabled, in two queries."""
+        dataflows = (
+            DataFlow.objects.filter(effective_status=choices.DataFlowInheritedStatusChoices.STATUS_ENABLED)
+            .annotate(
+                has_sources=m2m_exists(DataFlow, "sources"),
+                has_destinations=m2m_exists(DataFlow, "destinations"),
+            )
+            .values_list("pk", "protocol", "source_ports", "destination_ports", "has_sources", "has_destinations")
+        )
+        rules = (
+            DataFlowRule.objects.only_enabled()
+            .order_by()
+            .values_list("dataflow_id", "direction", "start_address", "end_address")
+            .distinct()
+        )
+        return cls(dataflows, rules)
+
+    def _search(self, direction, address):
+        tree = self.trees.get((direction, address.version))
+        matches = tree.search(int(address)) if tree is not None else set()
+        return matches | self.any_targets[direction]
+
+    def _candidates(self, source, destination):
+        """Return the data flows permitting traffic between the addresses, whatever the protocol and ports."""
+        Directions = choices.DataFlowRuleDirectionChoices
+
+        source = netaddr.IPAddress(source)
+        destination = netaddr.IPAddress(destination)
+        if source.version != destination.version:
+            return set(), source.version
+
+        candidates = self._search(Directions.DIRECTION_SOURCE, source)
+        if candidates:
+            candidates &= self._search(Directions.DIRECTION_DESTINATION, destination)
+
+        return candidates, source.version
+
+    def _filter(self, candidates, version, protocol, port, source_port):
+        return sorted(
+            pk
+            for pk in candidates
+            if _protocol_matches(self.protocols[pk], protocol, version)
+            and _port_matches(self.ports[pk][0], source_port)
+            and _port_matches(self.ports[pk][1], port)
+        )
+
+    def lookup(self, source, destination, protocol=None, port=None, source_port=None):
+        """
+        Return the sorted primary keys of the enabled data flows permitting the traffic.
+
+        The protocol is one of DataFlowProtocolChoices; without protocol, any protocol matches.
+        The port is the destination port, or the ICMP type; without port, any port matches.
+        """
+        return self._filter(*self._candidates(source, destination), protocol, port, source_port)
+
+    def lookup_many(self, connections):
+        """
+        Return the sorted primary keys of the data flows permitting each connection, in the same order.
+
+        The connections are (source, destination, protocol, port, source_port) tuples, as for lookup().
+        The address searches are done once per pair of addresses, which repeat a lot in connection logs.
+        """
+        candidates = {}
+        results = []
+        for source, destination, protocol, port, source_port in connections:
+            key = (source, destination)
+            if key not in candidates:
+                candidates[key] = self._candidates(source, destination)
+            results.append(self._filter(*candidates[key], protocol, port, source_port))
+
+        return results
+
+
+#
+# Compiled policy cache
+#
+
+# Last index used by this process, to skip the cache (and the unpickling) while the policy is unchanged
+_local_index = (None, None)
+
+
+def get_policy_generation():
+    """Return the generation of the data flows policy, which changes on every modification."""
+    generation = cache.get(POLICY_GENERATION_KEY)
+    if generation is None:
+        # Start above any previous generation, in case the counter was evicted
+        cache.add(POLICY_GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(POLICY_GENERATION_KEY)
+    return generation
+
+
+def bump_policy_generation():
+    """Invalidate the compiled data flows policy."""
+    try:
+        cache.incr(POLICY_GENERATION_KEY)
+    except ValueError:
+        get_policy_generation()
+
+
+def get_reachability_index():
+    """Return the ReachabilityIndex of the current policy, from the cache or compiled if needed."""
+    global _local_index
+
+    generation = get_policy_generation()
+    if _local_index[0] == generation:
+        return _local_index[1]
+
+    key = POLICY_INDEX_KEY.format(generation=generation)
+    index = cache.get(key)
+    if index is None:
+        index = ReachabilityIndex.build()
+        cache.set(key, index, timeout=get_plugin_config("netbox_data_flows", "policy_cache_timeout"))
+
+    _local_index = (generation, index)
+    return index
@@ -1,4 +1,7 @@
+from django.db.models import Prefetch
+
 from extras.managers import NetBoxTaggableManager
+from extras.models import Tag
 from netbox.models.features import TagsMixin
 
 try:
@@ -45,3 +48,18 @@ class AccessibleTagsMixin(TagsMixin):
 
     class Meta:
         abstract = True
+
+
+class InheritedTagsQuerySetMixin:
+    """
+    Prefetch the inherited tags of the fetched objects.
+
+    The inherited tags are materialized in the `effective_tags` many-to-many field of the model:
+    `prefetch_inherited_tags()` is a plain prefetch of it, in one query, stored in the `_inherited_tags`
+    attribute of each object.
+    """
+
+    def prefetch_inherited_tags(self):
+        return self.prefetch_related(
+            Prefetch("effective_tags", queryset=Tag.objects.order_by("weight", "name"), to_attr="_inherited_tags")
+        )
@@ -1,3 +1,9 @@
+from django.core.cache import cache
+from django.db.models import Value
+from django.http import Http404
+from django.shortcuts import render
+
+from netbox.plugins import get_plugin_config
 from netbox.views import generic
 from utilities.views import ViewTab, register_model_view
 
@@ -5,10 +11,13 @@ from ipam.models import IPAddress, IPRange, Prefix
 from ipam.tables import IPAddressTable, IPRangeTable, PrefixTable
 
 from netbox_data_flows import filtersets, forms, models, tables
+from netbox_data_flows.utils.reachability import get_policy_generation
 
 __all__ = (
     "DataFlowView",
     "DataFlowListView",
+    "DataFlowTargetView",
+    "DataFlowTargetTableView",
     "DataFlowEditView",
     "DataFlowDeleteView",
     "DataFlowBulkImportView",
@@ -19,7 +28,7 @@ __all__ = (
 
 @register_model_view(models.DataFlow, "list", path="", detail=False)
 class DataFlowListView(generic.ObjectListView):
-    queryset = models.DataFlow.objects.all()
+    queryset = models.DataFlow.objects.for_table()
     table = tables.DataFlowTable
     filterset = filtersets.DataFlowFilterSet
     filterset_form = forms.DataFlowFilterForm
@@ -39,8 +48,62 @@ class DataFlowView(generic.ObjectView):
         }
 
 
+# Targets of the data flows, for a generation of the data flows policy
+TARGETS_KEY = "netbox_data_flows:targets:{generation}:{pk}"
+
+TARGET_DIRECTIONS = ("sources", "destinations")
+
+# The targets of the object aliases: field name => (model, table)
+TARGET_TABLES = {
+    "prefixes": (Prefix, PrefixTable),
+    "ip_ranges": (IPRange, IPRangeTable),
+    "ip_addresses": (IPAddress, IPAddressTable),
+}
+
+
+def _get_target_pks(dataflow):
+    """
+    Return the primary keys of the prefixes, IP ranges and IP addresses of the sources and destinations of a
+    data flow, as {(direction, field name): set of primary keys}.
+
+    The six sets are fetched in a single query, from the many-to-many tables only, and cached until the data
+    flows policy changes, i.e. any data flow, object alias or IPAM object.
+    """
+    key = TARGETS_KEY.format(generation=get_policy_generation(), pk=dataflow.pk)
+    if (targets := cache.get(key)) is not None:
+        return targets
+
+    kinds = [(direction, field_name) for direction in TARGET_DIRECTIONS for field_name in TARGET_TABLES]
+    querysets = []
+    for i, (direction, field_name) in enumerate(kinds):
+        dataflow_field = models.DataFlow._meta.get_field(direction)
+        aliases = dataflow_field.remote_field.through.objects.filter(
+            **{dataflow_field.m2m_column_name(): dataflow.pk}
+        ).values(dataflow_field.m2m_reverse_name())
+
+        alias_field = models.ObjectAlias._meta.get_field(field_name)
+        querysets.append(
+            alias_field.remote_field.through.objects.filter(**{f"{alias_field.m2m_column_name()}__in": aliases})
+            .annotate(kind=Value(i))
+            .values_list("kind", alias_field.m2m_reverse_name())
+        )
+
+    targets = {kind: set() for kind in kinds}
+    for i, pk in querysets[0].union(*querysets[1:], all=True):
+        targets[kinds[i]].add(pk)
+
+    cache.set(key, targets, timeout=get_plugin_config("netbox_data_flows", "policy_cache_timeout"))
+    return targets
+
+
 @register_model_view(models.DataFlow, "targets")
 class DataFlowTargetView(generic.ObjectView):
+    """
+    List the prefixes, IP ranges and IP addresses of the sources and destinations of a data flow.
+
+    Each table is loaded with HTMX from DataFlowTargetTableView and paginated independently.
+    """
+
     template_name = "netbox_data_flows/dataflow_targets.html"
     queryset = models.DataFlow.objects.all()
 
@@ -50,40 +113,38 @@ class DataFlowTargetView(generic.ObjectView):
         hide_if_empty=False,
     )
 
-    def get_extra_context(self, request, instance):
-        # Get all unique sources and destinations
-        # They could be duplicated if several ObjectAliases refer to them
-        sources_prefixes = Prefix.objects.filter(data_flow_object_aliases__in=instance.sources.all()).distinct()
-        sources_ip_ranges = IPRange.objects.filter(data_flow_object_aliases__in=instance.sources.all()).distinct()
-        sources_ip_addresses = IPAddress.objects.filter(data_flow_object_aliases__in=instance.sources.all()).distinct()
-
-        destinations_prefixes = Prefix.objects.filter(
-            data_flow_object_aliases__in=instance.destinations.all()
-        ).distinct()
-        destinations_ip_ranges = IPRange.objects.filter(
-            data_flow_object_aliases__in=instance.destinations.all()
-        ).distinct()
-        destinations_ip_addresses = IPAddress.objects.filter(
-            data_flow_object_aliases__in=instance.destinations.all()
-        ).distinct()
-
-        # Prepare tables
-        sources_prefixes_table = PrefixTable(sources_prefixes, orderable=False)
-        sources_ip_ranges_table = IPRangeTable(sources_ip_ranges, orderable=False)
-        sources_ip_addresses_table = IPAddressTable(sources_ip_addresses, orderable=False)
-
-        destinations_prefixes_table = PrefixTable(destinations_prefixes, orderable=False)
-        destinations_ip_ranges_table = IPRangeTable(destinations_ip_ranges, orderable=False)
-        destinations_ip_addresses_table = IPAddressTable(destinations_ip_addresses, orderable=False)
 
-        return {
-            "sources_prefixes_table": sources_prefixes_table,
-            "sources_ip_ranges_table": sources_ip_ranges_table,
-            "sources_ip_addresses_table": sources_ip_addresses_table,
-            "destinations_prefixes_table": destinations_prefixes_table,
-            "destinations_ip_ranges_table": destinations_ip_ranges_table,
-            "destinations_ip_addresses_table": destinations_ip_addresses_table,
-        }
+@register_model_view(models.DataFlow, "targets_table", path="targets", detail=False)
+class DataFlowTargetTableView(generic.ObjectView):
+    """
+    Render one paginated table of the targets of a data flow, for DataFlowTargetView.
+
+    The data flow, the direction and the kind of targets are given by the `dataflow_id`, `direction` and
+    `field_name` query parameters, so that the table is embedded with the htmx_table template tag.
+    """
+
+    queryset = models.DataFlow.objects.all()
+
+    def get(self, request, **kwargs):
+        pk = request.GET.get("dataflow_id", "")
+        direction = request.GET.get("direction")
+        field_name = request.GET.get("field_name")
+        if not pk.isdigit() or direction not in TARGET_DIRECTIONS or field_name not in TARGET_TABLES:
+            raise Http404
+
+        instance = self.get_object(pk=pk)
+        model, table_class = TARGET_TABLES[field_name]
+
+        # The targets could be duplicated if several ObjectAliases refer to them, but not their primary keys
+        pks = _get_target_pks(instance)[direction, field_name]
+        table = table_class(model.objects.restrict(request.user, "view").filter(pk__in=pks), orderable=False)
+        table.embedded = True
+        table.htmx_url = request.path
+        table.configure(request)
+        if "pk" in table.base_columns:
+            table.columns.hide("pk")
+
+        return render(request, "htmx/table.html", {"table": table, "model": model})
 
 
 @register_model_view(models.DataFlow, "add", detail=False)
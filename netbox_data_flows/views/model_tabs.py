@@ -1,40 +1,83 @@
-from django.db.models import Count
+from django.core.cache import cache
+from django.db.models import F, Func, Subquery
 
+from netbox.plugins import get_plugin_config
 from netbox.views import generic
+from utilities.querydict import dict_to_querydict
 from utilities.views import ViewTab, register_model_view
 
 from dcim.models import Device
 from ipam.models import IPAddress, IPRange, Prefix
 from virtualization.models import VirtualMachine
 
-from netbox_data_flows import models, tables
+from netbox_data_flows import models
+from netbox_data_flows.utils.reachability import get_policy_generation
 
 __all__ = tuple()
 
 
-# NetBox models where we want to add a tab view
-MODELS = (Device, VirtualMachine, IPAddress, IPRange, Prefix)
+# NetBox models where we want to add a tab view, with the name of their filters:
+# the object alias filter, and the data flow filters prefixed with source_ and destination_
+MODELS = {
+    Device: "devices",
+    VirtualMachine: "virtual_machines",
+    IPAddress: "ip_addresses",
+    IPRange: "ip_ranges",
+    Prefix: "prefixes",
+}
 
 
-def _count_related_aliases_or_dataflows(obj):
-    aliases = models.ObjectAlias.objects.contains(obj).count()
-    if not aliases:
-        return 0  # cannot have a dataflow without an alias
+# Badge of the tab of an object, for a generation of the data flows policy
+TAB_BADGE_KEY = "netbox_data_flows:tab_badge:{generation}:{label}:{pk}"
+
 
-    dataflows = models.DataFlow.objects.sources_or_destinations(obj).count()
+def _count_related_aliases_or_dataflows(obj):
+    """
+    Return the number of data flows of the object, or 0 if it is not part of any object alias.
+
+    The count is cached until the data flows policy changes, i.e. any data flow, object alias or
+    IPAM object (including the IP addresses of the devices). Otherwise, it is computed in a single query:
+    the data flows are counted once, for the first object alias containing the object.
+    """
+    key = TAB_BADGE_KEY.format(generation=get_policy_generation(), label=obj._meta.label_lower, pk=obj.pk)
+    if (badge := cache.get(key)) is not None:
+        return badge
+
+    dataflows = (
+        models.DataFlow.objects.sources_or_destinations(obj)
+        .order_by()
+        .annotate(count=Func(F("pk"), function="COUNT"))
+        .values("count")
+    )
+    counts = (
+        models.ObjectAlias.objects.contains(obj)
+        .order_by()
+        .annotate(dataflows=Subquery(dataflows))
+        .values_list("dataflows", flat=True)[:1]
+    )
+    # cannot have a dataflow without an alias
     # return as string so "0" is considered non-empty
-    return str(dataflows)
+    badge = str(counts[0]) if counts else 0
+
+    cache.set(key, badge, timeout=get_plugin_config("netbox_data_flows", "policy_cache_timeout"))
+    return badge
 
 
 class DataFlowListTabViewBase(generic.ObjectView):
-    """Add a tab with ObjectAlias and DataFlows to built-in models."""
+    """
+    Add a tab with ObjectAlias and DataFlows to built-in models.
+
+    The tables are loaded with HTMX from the filtered list views, each paginated independently,
+    so that the tab itself does not run any of their queries.
+    """
 
-    def __init_subclass__(cls, /, model, **kwargs):
+    def __init_subclass__(cls, /, model, filter_name, **kwargs):
         """Create a subclass associated to a NetBox model."""
         super().__init_subclass__(**kwargs)
 
         # map the queryset to our NetBox model
         cls.queryset = model.objects.all()
+        cls.filter_name = filter_name
 
         # call the decorator to register the view
         register_model_view(
@@ -44,6 +87,7 @@ class DataFlowListTabViewBase(generic.ObjectView):
         )(cls)
 
     queryset = None
+    filter_name = None
     template_name = "netbox_data_flows/dataflow_tab.html"
 
     tab = ViewTab(
@@ -54,37 +98,22 @@ class DataFlowListTabViewBase(generic.ObjectView):
     )
 
     def get_extra_context(self, request, parent):
-        aliases_table = tables.ObjectAliasTable(
-            models.ObjectAlias.objects.annotate(
-                prefix_count=Count("prefixes", distinct=True),
-                ip_range_count=Count("ip_ranges", distinct=True),
-                ip_address_count=Count("ip_addresses", distinct=True),
-                dataflow_source_count=Count("dataflow_sources", distinct=True),
-                dataflow_destination_count=Count("dataflow_destinations", distinct=True),
-            )
-            .order_by(*models.ObjectAlias._meta.ordering)
-            .contains(parent)
-        )
-        aliases_table.configure(request)
-
-        dataflow_sources_table = tables.DataFlowTable(models.DataFlow.objects.sources(parent).all())
-        dataflow_sources_table.configure(request)
-
-        dataflow_destinations_table = tables.DataFlowTable(models.DataFlow.objects.destinations(parent).all())
-        dataflow_destinations_table.configure(request)
+        def url_params(filter_name):
+            return dict_to_querydict({filter_name: parent.pk, "return_url": request.path})
 
         return {
-            "aliases_table": aliases_table,
-            "dataflow_sources_table": dataflow_sources_table,
-            "dataflow_destinations_table": dataflow_destinations_table,
+            "aliases_params": url_params(self.filter_name),
+            "dataflow_sources_params": url_params(f"source_{self.filter_name}"),
+            "dataflow_destinations_params": url_params(f"destination_{self.filter_name}"),
         }
 
 
-for model in MODELS:
+for model, filter_name in MODELS.items():
     # create a subclass of DataFlowListTabViewBase per model
     type(
         f"{model.__name__}DataFlowTabView",
         (DataFlowListTabViewBase,),
         {},
         model=model,
+        filter_name=filter_name,
     )